@@ -1,7 +1,11 @@
 import streamlit as st
-import pandas as pd
-import random
+import numpy as np
 import os
+from game_dataset import GameDataset
+from hr_query import THEMES
+from hr_store import HOMERUNS_PATH, available_seasons
+from seasons import clip_folder
+from video_server import VideoServer
 
 # Function to calculate points based on guess accuracy
 def calculate_points(guess, actual):
@@ -16,54 +20,91 @@ def calculate_points(guess, actual):
     else:
         return 0
 
-# Load the data with caching
-@st.cache_data
-def load_data():
-    return pd.read_csv('2025_homeruns_running.csv')
+# One read-only copy of the playable home runs per process and season, shared by every session
+@st.cache_resource
+def load_dataset(season=None):
+    return GameDataset.load(seasons=[season] if season else None)
+
+@st.cache_resource
+def get_video_server(folders):
+    """One local clip server per process, shared by every session, over each season's clip folder (see downloading_videos.py)."""
+    return VideoServer(
+        ".",
+        host=os.environ.get("VIDEO_SERVER_HOST", "127.0.0.1"),
+        port=int(os.environ.get("VIDEO_SERVER_PORT", "0")),
+        public_url=os.environ.get("VIDEO_SERVER_URL"),
+        folders=folders,
+    ).start()
+
+def clip_source(row):
+    """Local clips go through the video server; anything else falls back to the stored URL."""
+    if row['clip_is_local'] and video_server.serves(row['clip']):
+        return video_server.url_for(row['clip'])
+    return row['clip']
+
+def prefetch_next_clip():
+    """Warms the server cache with the clip the next round will most likely deal."""
+    deck = dataset.deck(st.session_state.deck_seed, st.session_state.theme)
+    for card in deck[st.session_state.deck_pos:st.session_state.deck_pos + 5]:
+        if not st.session_state.used_batter_mask & (1 << int(dataset.batter_codes[card])):
+            if dataset.clip_is_local[card]:
+                video_server.prefetch(dataset.clips[card])
+            return
+
+def new_deck_seed():
+    """Seed of the shuffled deck for one game; the order itself is rebuilt from it when needed."""
+    return int(np.random.default_rng().integers(2 ** 63))
 
 # --- MODIFIED: Function to select a new batter with a valid video URL ---
 def select_new_batter():
-    # Use a loop to find a homerun with a valid video
-    max_attempts = 50 # Prevent infinite loops in case of no valid videos
-    for _ in range(max_attempts):
-        # Filter out batters already used and get a random sample
-        available_homeruns = df_combined[~df_combined['Name'].isin(st.session_state.used_batters)]
-        if available_homeruns.empty:
-            st.session_state.game_over = True
-            return None
-
-        # Select a random homerun
-        random_batter = available_homeruns.sample().iloc[0]
-        video_url = random_batter.get('video_url')
-
-        # Check if a video URL exists and is not 'Not Found'
-        if pd.notna(video_url) and video_url != 'Not Found' and video_url.strip() != '':
-            # Found a valid homerun, store it in session state and exit the loop
-            st.session_state.used_batters.add(random_batter['Name'])
-            st.session_state.current_batter = random_batter
-            return
-    
-    # If the loop finishes without finding a valid video, end the game
+    # Draw from the session's shuffled deck, skipping batters already used this game.
+    # used_batter_mask is an integer bitmap over batter codes, so each check is O(1).
+    # The session keeps only integers; rows are read from the shared dataset.
+    deck = dataset.deck(st.session_state.deck_seed, st.session_state.theme)
+    while st.session_state.deck_pos < len(deck):
+        card = int(deck[st.session_state.deck_pos])
+        st.session_state.deck_pos += 1
+        batter_bit = 1 << int(dataset.batter_codes[card])
+        if st.session_state.used_batter_mask & batter_bit:
+            continue
+        st.session_state.used_batter_mask |= batter_bit
+        st.session_state.current_card = card
+        return
+
+    # Every playable home run has been dealt or belongs to a batter already used
     st.session_state.game_over = True
-    st.error("No available home runs with valid videos found to continue the game.")
+    st.error(f"The deck is out of home runs: all {len(deck)} playable clips have been dealt or belong to batters already used this game.")
 
 
 # Function to reset the game
 def reset_game():
     st.session_state.total_points = 0
     st.session_state.round_num = 1
-    st.session_state.used_batters = set()
+    st.session_state.deck_seed = new_deck_seed()
+    st.session_state.theme = st.session_state.get("theme_choice") or None
+    st.session_state.deck_pos = 0
+    st.session_state.used_batter_mask = 0
     st.session_state.feedback_statements = []
-    st.session_state.current_batter = None
+    st.session_state.current_card = None
     st.session_state.game_over = False
 
+# Season picker (seasons stored in the partitioned table); picking one starts a new game
+seasons = available_seasons(HOMERUNS_PATH)
+st.sidebar.selectbox("Season", [None] + seasons[::-1], key="season_choice",
+                     on_change=reset_game, format_func=lambda season: "All seasons" if season is None else str(season))
+
 # Load data
-df_combined = load_data()
+dataset = load_dataset(st.session_state.get("season_choice"))
+video_server = get_video_server(tuple(clip_folder(season) for season in seasons))
 
 # Initialize session state variables
 if "total_points" not in st.session_state:
     reset_game()
 
+# Themed decks (see hr_query.THEMES); picking one starts a new game
+st.sidebar.selectbox("Deck", [None] + sorted(THEMES), key="theme_choice", on_change=reset_game,
+                     format_func=lambda theme: "All home runs" if theme is None else theme.replace("-", " ").title())
+
 rounds = 10  # Total number of rounds in the game
 
 # Main game logic
@@ -80,10 +121,10 @@ if st.session_state.round_num > rounds or st.session_state.game_over:
     st.stop()
 
 # If no current batter is selected, select one
-if st.session_state.current_batter is None:
+if st.session_state.current_card is None:
     select_new_batter()
     # Rerun if a batter was found to proceed with the round
-    if st.session_state.current_batter is not None:
+    if st.session_state.current_card is not None:
         st.experimental_rerun()
 
 # Check for game over state after attempting to select a new batter
@@ -99,17 +140,19 @@ if st.session_state.game_over:
     st.stop()
 
 # Get current batter details
-batter = st.session_state.current_batter
+batter = dataset.card(st.session_state.current_card)
 batter_name = batter['Name']
 launch_speed = batter['EV (MPH)']
 total_distance = batter['Dist (ft)'] # FIX: Corrected 'Dist (ft)]' to 'Dist (ft)'
 launch_angle = batter['LA (deg)']
 parks_30 = batter['X/30']
-video_url = batter['video_url'] # FIX: Ensure we're using the correct column name
 
 # Display the batter's name and video
 st.subheader(f"Round {st.session_state.round_num}/{rounds} - Batter: {batter_name}")
-st.video(video_url)
+st.video(clip_source(batter))
+
+# Start loading the next round's clip while the user is still guessing
+prefetch_next_clip()
 
 # User input for guessing
 with st.form(key=f"guess_form_{st.session_state.round_num}"):
@@ -141,8 +184,8 @@ if submit_button:
         # Increment the round number after processing the guess
         st.session_state.round_num += 1
 
-        # Clear current_batter to select a new one in the next iteration
-        st.session_state.current_batter = None
+        # Clear current_card to select a new one in the next iteration
+        st.session_state.current_card = None
 
         # Force a rerun to update the UI with the new round
         st.experimental_rerun()
@@ -1,89 +1,116 @@
 import pandas as pd
-import requests
-import json
-from datetime import datetime
-import time
-
-# Assuming you have the TEAM_ABBREV_TO_FULL mapping
-TEAM_ABBREV_TO_FULL = {
-    'BAL': 'Baltimore Orioles', 'BOS': 'Boston Red Sox', 'NYY': 'New York Yankees',
-    'TB': 'Tampa Bay Rays', 'TOR': 'Toronto Blue Jays', 'CWS': 'Chicago White Sox',
-    'CLE': 'Cleveland Guardians', 'DET': 'Detroit Tigers', 'KC': 'Kansas City Royals',
-    'MIN': 'Minnesota Twins', 'HOU': 'Houston Astros', 'LAA': 'Los Angeles Angels',
-    'ATH': 'Athletics',
-    'SEA': 'Seattle Mariners', 'TEX': 'Texas Rangers',
-    'ATL': 'Atlanta Braves', 'MIA': 'Miami Marlins', 'NYM': 'New York Mets',
-    'PHI': 'Philadelphia Phillies', 'WSH': 'Washington Nationals', 'CHC': 'Chicago Cubs',
-    'CIN': 'Cincinnati Reds', 'MIL': 'Milwaukee Brewers', 'PIT': 'Pittsburgh Pirates',
-    'STL': 'St. Louis Cardinals', 'AZ': 'Arizona Diamondbacks',
-    'COL': 'Colorado Rockies',
-    'LAD': 'Los Angeles Dodgers', 'SD': 'San Diego Padres', 'SF': 'San Francisco Giants'
-}
-
-def get_gamepk_from_schedule(df_schedule, hr_date_str, hr_team_full, vs_team_full):
+import numpy as np
+from hr_store import HOMERUNS_PATH, apply_schema, load_homeruns, save_homeruns
+from metrics import get_logger, get_metrics, timed_stage
+from seasons import load_schedule, load_schedules, seasons_in
+
+log = get_logger(__name__)
+
+def build_schedule_index(df_schedule):
     """
-    Retrieves the gamePk from the schedule DataFrame based on date and teams.
+    Builds a (date, unordered team pair) -> gamePk candidates index from the schedule.
+
+    Teams are the schedule's abbreviations as of each season, which are the
+    ones Savant uses, so relocated or renamed teams need no mapping.
+
+    Returns a DataFrame with columns date, team_a, team_b (team_a <= team_b)
+    and candidates (sorted tuple of int gamePks, more than one for doubleheaders).
     """
-    mask = (
-        (df_schedule['date'] == hr_date_str) &
-        (
-            ((df_schedule['homeTeam'] == hr_team_full) & (df_schedule['awayTeam'] == vs_team_full)) |
-            ((df_schedule['homeTeam'] == vs_team_full) & (df_schedule['awayTeam'] == hr_team_full))
-        )
+    home = df_schedule['homeAbbrev'].astype(str)
+    away = df_schedule['awayAbbrev'].astype(str)
+    pairs = pd.DataFrame({
+        'date': df_schedule['date'].astype(str),
+        'team_a': np.where(home <= away, home, away),
+        'team_b': np.where(home <= away, away, home),
+        'gamePk': df_schedule['gamePk'].astype('int64'),
+    })
+    return (
+        pairs.groupby(['date', 'team_a', 'team_b'], sort=False)['gamePk']
+        .agg(lambda pks: tuple(sorted(pks)))
+        .rename('candidates')
+        .reset_index()
     )
-    matches = df_schedule[mask]
-    if not matches.empty:
-        gamepks = matches['gamePk'].tolist()
-        return '|'.join(map(str, [int(pk) for pk in gamepks])) if len(gamepks) > 1 else str(int(gamepks[0]))
-    return None
 
-def populate_gamepk_if_empty_final(homeruns_csv='2025_homeruns_running.csv', schedule_csv='mlb_schedule_2025.csv'):
+def resolve_gamepks(df_hr, schedule_index):
     """
-    Checks for empty 'gamePk' cells and populates them using the schedule.
-    Ensures gamePk is saved as an integer string.
+    Resolves gamePk for every home run with one vectorized join against the schedule index.
+
+    Args:
+        df_hr (DataFrame): Home runs with Date (datetime), Team and Vs. columns.
+        schedule_index (DataFrame): Output of build_schedule_index.
+
+    Returns:
+        DataFrame: Indexed like df_hr with columns
+            gamePk (Int64, only set when exactly one game matches),
+            candidates (tuple of int gamePks, empty when nothing matches),
+            status ('resolved', 'ambiguous' for doubleheaders, or 'missing').
     """
-    try:
-        df_hr = pd.read_csv(homeruns_csv, parse_dates=['Date'])
-        df_schedule = pd.read_csv(schedule_csv)
+    team = df_hr['Team'].astype(str)
+    vs_team = df_hr['Vs.'].astype(str)
+    keys = pd.DataFrame({
+        'date': df_hr['Date'].dt.strftime('%Y-%m-%d'),
+        'team_a': np.where(team <= vs_team, team, vs_team),
+        'team_b': np.where(team <= vs_team, vs_team, team),
+    }, index=df_hr.index)
 
-        populated_count = 0
+    # Index keys are unique, so a left merge keeps df_hr's row order and count
+    merged = keys.merge(schedule_index, on=['date', 'team_a', 'team_b'], how='left').set_axis(keys.index)
+    candidates = merged['candidates'].apply(lambda pks: pks if isinstance(pks, tuple) else ())
+    n_candidates = candidates.str.len()
 
-        for index, row in df_hr.iterrows():
-            game_pks_str = row.get('gamePk')
-            hr_date = row['Date']
-            hr_team_abbr = row['Team']
-            vs_team_abbr = row['Vs.']
+    result = pd.DataFrame(index=df_hr.index)
+    result['gamePk'] = candidates.where(n_candidates == 1).str[0].astype('Int64')
+    result['candidates'] = candidates
+    result['status'] = np.select([n_candidates == 1, n_candidates > 1], ['resolved', 'ambiguous'], default='missing')
+    return result
+
+@timed_stage('gamepks')
+def populate_gamepk_if_empty_final(homeruns_csv=HOMERUNS_PATH, schedule_csv=None):
+    """
+    Checks for empty 'gamePk' cells and populates them using the schedule.
+
+    Without schedule_csv, the schedules of every season with empty rows are
+    used (seasons.load_schedule fetches the ones not on disk yet).
+
+    All empty rows are resolved in one join (see resolve_gamepks). Doubleheader
+    candidates go to gamePkCandidates, which the playId stage disambiguates
+    against the game feeds.
+    """
+    try:
+        df_hr = load_homeruns(homeruns_csv)
+        for column in ('gamePk', 'gamePkCandidates'):
+            if column not in df_hr.columns:
+                df_hr[column] = pd.NA
+        df_hr = apply_schema(df_hr)
 
-            if pd.isna(game_pks_str):
-                hr_date_str_schedule = hr_date.strftime('%Y-%m-%d')
-                hr_team_full = TEAM_ABBREV_TO_FULL.get(hr_team_abbr)
-                vs_team_full = TEAM_ABBREV_TO_FULL.get(vs_team_abbr)
+        empty = df_hr['gamePk'].isna() & df_hr['gamePkCandidates'].isna()
+        df_schedule = load_schedule(path=schedule_csv) if schedule_csv else load_schedules(seasons_in(df_hr[empty]))
+        resolution = resolve_gamepks(df_hr[empty], build_schedule_index(df_schedule))
 
-                correct_gamepk = get_gamepk_from_schedule(df_schedule, hr_date_str_schedule, hr_team_full, vs_team_full)
-                if correct_gamepk:
-                    df_hr.at[index, 'gamePk'] = correct_gamepk
-                    print(f"Populated empty gamePk for HR on {hr_date_str_schedule} ({hr_team_abbr} vs {vs_team_abbr}) with: {correct_gamepk}")
-                    populated_count += 1
-                else:
-                    print(f"Could not find gamePk in schedule for HR on {hr_date_str_schedule} ({hr_team_abbr} vs {vs_team_abbr}).")
+        resolved = resolution[resolution['status'] == 'resolved']
+        df_hr.loc[resolved.index, 'gamePk'] = resolved['gamePk']
+        ambiguous = resolution[resolution['status'] == 'ambiguous']
+        df_hr.loc[ambiguous.index, 'gamePkCandidates'] = ambiguous['candidates'].map(lambda pks: '|'.join(map(str, pks)))
 
-                time.sleep(0.05)
+        for index, row in df_hr.loc[resolution.index[resolution['status'] == 'missing']].iterrows():
+            log.warning("Could not find gamePk in schedule for HR on %s (%s vs %s).", f"{row['Date']:%Y-%m-%d}", row['Team'], row['Vs.'])
 
-        print(f"\nProcessed {len(df_hr)} home runs.")
-        print(f"Populated {populated_count} empty gamePk values.")
+        counts = resolution['status'].value_counts()
+        get_metrics().count('gamepks', rows=len(resolution))
+        log.info("Processed %d home runs.", len(df_hr))
+        log.info("Populated %d empty gamePk values (%d resolved, %d doubleheader candidates, %d not in schedule).",
+                 len(resolved) + len(ambiguous), len(resolved), len(ambiguous), counts.get('missing', 0))
 
-        df_hr['gamePk'] = df_hr['gamePk'].astype(str).str.replace('\.0$', '', regex=True) # Remove potential .0
-        df_hr.to_csv(homeruns_csv, index=False)
-        print(f"Updated {homeruns_csv} with populated gamePk values (ensured integer format).")
+        save_homeruns(df_hr, homeruns_csv, columns=['gamePk', 'gamePkCandidates'])
+        log.info("Updated %s with populated gamePk values.", homeruns_csv)
 
     except FileNotFoundError:
-        print(f"Error: The file {homeruns_csv} or {schedule_csv} was not found.")
+        log.error("The file %s or %s was not found.", homeruns_csv, schedule_csv or "a season schedule")
     except KeyError as e:
-        print(f"Error: Missing column in DataFrame: {e}")
+        log.error("Missing column in DataFrame: %s", e)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        log.exception("An unexpected error occurred: %s", e)
 
 if __name__ == "__main__":
-    # Make sure you have run the code to generate 'mlb_schedule.csv'
-    # or have your schedule data in that format.
+    # Schedules are fetched per season as needed (see seasons.py)
     populate_gamepk_if_empty_final()
@@ -1,159 +1,278 @@
 import pandas as pd
-import json
-import requests
-import time
-import unicodedata
-import re
+from collections import defaultdict
 from fuzzywuzzy import fuzz
+from feed_cache import FeedCache
+from feed_extract import extract_feeds
+from progress_journal import ProgressJournal, row_keys
+from hr_store import HOMERUNS_PATH, apply_schema, load_homeruns, save_homeruns
+from metrics import get_logger, get_metrics, timed_stage
+from player_registry import REGISTRY_PATH, PlayerRegistry, batter_key, normalize_and_split_name_v5
+from x30_model import spray_angle
 
-def normalize_and_split_name_v5(name):
-    """Handles 'Jr.', multi-word names, and normalizes, attempts to fix last name first with comma."""
-    name = name.strip().lower()
-    is_jr = False
-    if name.endswith(' jr'):
-        name = name[:-3].strip()
-        is_jr = True
-    elif name.endswith(', jr'):
-        name = name[:-4].strip()
-        is_jr = True
-
-    # Check if the name has a comma followed by a space, suggesting Last, First format
-    if ', ' in name:
-        parts = name.split(', ')
-        if len(parts) == 2:
-            last_name_part = parts[0].strip()
-            first_name_part = parts[1].strip()
-            normalized_first = "".join(c for c in unicodedata.normalize('NFD', first_name_part.lower()) if unicodedata.category(c) != 'Mn' and c.isalnum() or c.isspace())
-            normalized_last = "".join(c for c in unicodedata.normalize('NFD', last_name_part.lower()) if unicodedata.category(c) != 'Mn' and c.isalnum() or c.isspace())
-            return normalized_first, normalized_last, is_jr
-
-    name = unicodedata.normalize('NFD', name)
-    name = ''.join(c for c in name if unicodedata.category(c) != 'Mn')
-    name = re.sub(r'[^a-z\s]', '', name)
-    parts = name.strip().split()
-    first_name = parts[0] if parts else ""
-    last_name = " ".join(parts[1:]) if len(parts) > 1 else ""
-    return first_name, last_name, is_jr
-
-def add_playid_to_homeruns_v5(homeruns_csv='2025_homeruns_running.csv', fuzzy_threshold=80):
-    """Version using normalize_and_split_name_v5."""
-    try:
-        df_hr = pd.read_csv(homeruns_csv, encoding='utf-8')
-        if 'playId' not in df_hr.columns:
-            df_hr['playId'] = None
-        processed_game_pks = set()
-
-        for index, hr_row in df_hr.iterrows():
-            possible_game_pks_str = hr_row.get('gamePk')
-            if pd.isna(possible_game_pks_str):
+log = get_logger(__name__)
+
+# Tolerances a CSV row and a feed event must agree within to be paired
+PITCH_TOLERANCE = 2
+EV_TOLERANCE = 2
+DISTANCE_TOLERANCE = 10
+
+def extract_hr_events(game_feed_data):
+    """
+    Pulls the home run playEvents (the ones carrying hitData and a playId) out of a game feed.
+
+    Returns a list of dicts with the batter, atBatIndex, playId and pitch/hit metrics.
+    """
+    events = []
+    all_plays = game_feed_data.get('liveData', {}).get('plays', {}).get('allPlays', [])
+    for play in all_plays:
+        if play.get('result', {}).get('eventType') != 'home_run':
+            continue
+        batter = play.get('matchup', {}).get('batter', {})
+        batter_name = batter.get('fullName') or ''
+        for event in play.get('playEvents', []):
+            hit_data = event.get('hitData')
+            if not hit_data or not event.get('playId'):
                 continue
-            possible_game_pks = str(possible_game_pks_str).split('|')
+            events.append({
+                'atBatIndex': play.get('about', {}).get('atBatIndex'),
+                'batterId': batter.get('id'),
+                'batterName': batter_name,
+                'batterKey': batter_key(batter_name),
+                'playId': event['playId'],
+                'pitchSpeed': (event.get('pitchData') or {}).get('startSpeed'),
+                'launchSpeed': hit_data.get('launchSpeed'),
+                'totalDistance': hit_data.get('totalDistance'),
+                'launchAngle': hit_data.get('launchAngle'),
+                'sprayAngle': _spray_angle(hit_data.get('coordinates') or {}),
+            })
+    return events
+
+def _spray_angle(coordinates):
+    """Spray angle of a feed's hitData coordinates, or None when they are missing."""
+    if coordinates.get('coordX') is None or coordinates.get('coordY') is None:
+        return None
+    return round(float(spray_angle(coordinates['coordX'], coordinates['coordY'])), 1)
+
+def index_rows_by_game(df_hr):
+    """Maps each candidate gamePk (gamePk, or the '|' doubleheader candidates) to the row indices that reference it."""
+    rows_by_game = defaultdict(list)
+    game_pks = df_hr['gamePk'].astype('string')
+    if 'gamePkCandidates' in df_hr.columns:
+        game_pks = game_pks.fillna(df_hr['gamePkCandidates'])
+    for index, value in game_pks.dropna().items():
+        for game_pk in value.split('|'):
+            rows_by_game[game_pk].append(index)
+    return rows_by_game
+
+def _metric_cost(row_metrics, event):
+    """Normalized distance between a CSV row and a feed event, or None if any metric is out of tolerance."""
+    pitch_csv, ev_csv, distance_csv = row_metrics
+    cost = 0.0
+    for csv_value, feed_value, tolerance in (
+        (pitch_csv, event['pitchSpeed'], PITCH_TOLERANCE),
+        (ev_csv, event['launchSpeed'], EV_TOLERANCE),
+        (distance_csv, event['totalDistance'], DISTANCE_TOLERANCE),
+    ):
+        if feed_value is None:
+            continue
+        if pd.isna(csv_value):
+            return None
+        diff = abs(csv_value - float(feed_value))
+        if diff >= tolerance:
+            return None
+        cost += diff / tolerance
+    return cost
+
+def match_game_hrs(rows, events, fuzzy_threshold=80):
+    """
+    Pairs the candidate HR rows of one game with that game's feed HR events.
+
+    Args:
+        rows (dict): row index -> {'key': batter_key, 'name': str, 'batterId': MLBAM id or None,
+            'atBatIndex': feed atBatIndex or None, 'metrics': (pitch, ev, dist)}.
+        events (list): Output of extract_hr_events for the game.
+        fuzzy_threshold (int): fuzz.ratio score needed when batter keys differ.
+
+    Rows that know their atBatIndex (read from Savant's CSV export) are paired
+    with that play's event. Rows whose batter is in the PlayerRegistry are
+    paired with that batter's events by ID. Names are compared (exactly, then
+    fuzzily) for rows without an ID, or whose ID has no event in the game.
+    Every admissible (row, event) pair is scored by how closely pitch speed, EV
+    and distance agree, then pairs are assigned greedily from the best score
+    down with ties broken by row index and atBatIndex, so the result is
+    deterministic for doubleheaders and multi-HR games.
+
+    Returns:
+        dict: row index -> (event, cost, method) for every matched row.
+    """
+    events_by_id = defaultdict(list)
+    events_by_key = defaultdict(list)
+    events_by_at_bat = defaultdict(list)
+    for event_pos, event in enumerate(events):
+        events_by_id[event['batterId']].append(event_pos)
+        events_by_at_bat[event['atBatIndex']].append(event_pos)
+        events_by_key[event['batterKey']].append(event_pos)
+
+    candidates = []
+    for row_index, row in rows.items():
+        if row.get('atBatIndex') is not None:
+            method = 'atbat'
+            event_positions = events_by_at_bat.get(row['atBatIndex'], [])
+        else:
+            method, event_positions = 'registry', []
+            if row.get('batterId') is not None:
+                event_positions = events_by_id.get(row['batterId'], [])
+            if not event_positions:
+                # No registry ID, or one (tentative, stale or a same-name collision) with no HR in this game
+                method = 'exact'
+                event_positions = events_by_key.get(row['key'], [])
+        if not event_positions and method == 'exact':
+            # Fuzzy fallback only for rows whose batter has no exact key in this game
+            method = 'fuzzy'
+            event_positions = [
+                pos for pos, event in enumerate(events)
+                if event['batterKey'][1] == row['key'][1] and _fuzzy_name_match(row['name'], event['batterName'], fuzzy_threshold)
+            ]
+        for pos in event_positions:
+            cost = _metric_cost(row['metrics'], events[pos])
+            if cost is not None:
+                candidates.append((cost, row_index, events[pos]['atBatIndex'] or 0, pos, method))
+
+    matches = {}
+    used_events = set()
+    for cost, row_index, _, pos, method in sorted(candidates):
+        if row_index in matches or pos in used_events:
+            continue
+        matches[row_index] = (events[pos], cost, method)
+        used_events.add(pos)
+    return matches
 
-            for game_pk in possible_game_pks:
-                if game_pk in processed_game_pks:
+def _fuzzy_name_match(csv_name, feed_name, fuzzy_threshold):
+    csv_first, csv_last, _ = normalize_and_split_name_v5(csv_name)
+    feed_first, feed_last, _ = normalize_and_split_name_v5(feed_name)
+    feed_full = f"{feed_first} {feed_last}"
+    return fuzz.ratio(f"{csv_first} {csv_last}", feed_full) >= fuzzy_threshold or \
+        fuzz.ratio(f"{csv_last} {csv_first}", feed_full) >= fuzzy_threshold
+
+@timed_stage('playids')
+def add_playid_to_homeruns_v5(homeruns_csv=HOMERUNS_PATH, fuzzy_threshold=80, feed_cache_dir='feed_cache',
+                              offline=False, only_missing=True, report_csv='playid_match_report.csv',
+                              journal_path='progress/playids.jsonl', compact_every=200, registry_path=REGISTRY_PATH,
+                              decode_workers=None, fetch_workers=8):
+    """
+    Version using normalize_and_split_name_v5.
+
+    Rows are indexed by gamePk once and each game's feed HR events are indexed
+    by batter, then paired in one batch per game (see match_game_hrs). Game
+    feeds are read through the on-disk FeedCache, so reruns only download
+    feeds that are missing or were captured before the game went Final.
+    Feeds are decoded in decode_workers processes (feed_extract.extract_feeds),
+    which return only the home run events. A per-row match report is written to report_csv.
+
+    Batter identity goes through the PlayerRegistry at registry_path: feeds
+    are read first, names never seen before are resolved in one batch, and
+    rows are then paired with feed events by player ID.
+
+    Every match is journaled as it is made and folded into the CSV every
+    `compact_every` matches and on exit, so an interrupted run resumes from
+    the last match instead of starting over.
+    """
+    try:
+        feed_cache = FeedCache(feed_cache_dir, offline=offline)
+        registry = PlayerRegistry(registry_path)
+        df_hr = load_homeruns(homeruns_csv)
+        for column in ('playId', 'gamePkCandidates'):
+            if column not in df_hr.columns:
+                df_hr[column] = pd.NA
+        df_hr = apply_schema(df_hr)
+
+        journal = ProgressJournal(journal_path, compact_every, on_compact=lambda: save_homeruns(df_hr, homeruns_csv, columns=['playId', 'gamePk', 'gamePkCandidates']))
+        keys = row_keys(df_hr)
+        resumed = journal.apply(df_hr, keys)
+        if resumed:
+            log.info("Resumed %d playIds from %s", resumed, journal_path)
+
+        pending = df_hr[df_hr['playId'].isna()] if only_missing else df_hr
+        rows_by_game = index_rows_by_game(pending)
+        indexed = {index for indices in rows_by_game.values() for index in indices}
+        report = {
+            index: {'status': 'unmatched', 'reason': 'no metric/name match' if index in indexed else 'no gamePk'}
+            for index in pending.index
+        }
+        matched = set()
+
+        try:
+            # Read every needed feed first, so new names can be resolved in one batch.
+            # Feeds are decoded in worker processes, which send back only the HR events.
+            events_by_game = {}
+            for game_pk, state, events in extract_feeds(sorted(rows_by_game), feed_cache, extract_hr_events,
+                                                        decode_workers, fetch_workers):
+                if events is None:
+                    for index in rows_by_game[game_pk]:
+                        report[index]['reason'] = 'feed unavailable'
+                    continue
+                events_by_game[game_pk] = events
+                registry.observe(events)
+
+            candidates = defaultdict(set)
+            for game_pk, events in events_by_game.items():
+                batter_ids = {event['batterId'] for event in events if event['batterId'] is not None}
+                for index in rows_by_game[game_pk]:
+                    candidates[pending.at[index, 'Name']] |= batter_ids
+            resolved = registry.resolve(candidates, fuzzy_threshold)
+            log.info("Player registry: %d names known, %d new exact, %d new fuzzy, %d unresolved",
+                     len(registry), resolved['exact'], resolved['fuzzy'], resolved['unresolved'])
+
+            metrics = df_hr[['Pitch (MPH)', 'EV (MPH)', 'Dist (ft)']].astype('float64')
+            # Rows from the CSV export carry their batterId and atBatIndex
+            known_ids = pending['batterId'] if 'batterId' in pending.columns else pd.Series(pd.NA, index=pending.index)
+            at_bats = pending['atBatIndex'] if 'atBatIndex' in pending.columns else pd.Series(pd.NA, index=pending.index)
+            row_info = {
+                index: {'key': batter_key(name), 'name': name,
+                        'batterId': int(known_ids[index]) if pd.notna(known_ids[index]) else registry.id_for(name),
+                        'atBatIndex': int(at_bats[index]) if pd.notna(at_bats[index]) else None,
+                        'metrics': tuple(metrics.loc[index])}
+                for index, name in pending['Name'].items()
+            }
+
+            for game_pk, events in sorted(events_by_game.items()):
+                open_rows = {index: row_info[index] for index in rows_by_game[game_pk] if index not in matched}
+                if not open_rows:
                     continue
+                for index, (event, cost, method) in match_game_hrs(open_rows, events, fuzzy_threshold).items():
+                    # The matched feed also settles which doubleheader game the row belongs to
+                    df_hr.at[index, 'playId'] = event['playId']
+                    df_hr.at[index, 'gamePk'] = int(game_pk)
+                    df_hr.at[index, 'gamePkCandidates'] = pd.NA
+                    journal.record(keys[index], playId=event['playId'], gamePk=int(game_pk), gamePkCandidates=None)
+                    registry.learn(row_info[index]['name'], event['batterId'])
+                    matched.add(index)
+                    report[index] = {
+                        'status': 'matched', 'reason': '', 'method': method, 'cost': round(cost, 3),
+                        'matched_gamePk': game_pk, 'atBatIndex': event['atBatIndex'], 'batterId': event['batterId'],
+                    }
+        finally:
+            feed_cache.flush()
+            registry.save()
+            journal.compact()
+            journal.close()
+
+        df_report = pd.DataFrame.from_dict(report, orient='index')
+        df_report.insert(0, 'Name', df_hr.loc[df_report.index, 'Name'])
+        df_report.insert(1, 'gamePk', df_hr.loc[df_report.index, 'gamePk'])
+        df_report.insert(2, 'playId', df_hr.loc[df_report.index, 'playId'])
+        df_report.to_csv(report_csv, index_label='row')
 
-                game_feed_url = f"https://statsapi.mlb.com/api/v1.1/game/{game_pk}/feed/live"
-                print(f"Trying URL: {game_feed_url}")
-                try:
-                    response = requests.get(game_feed_url, timeout=10)
-                    response.raise_for_status()
-                    game_feed_data = response.json()
-                    processed_game_pks.add(game_pk)
-
-                    relevant_hr_indices = df_hr[df_hr['gamePk'].astype(str).str.contains(game_pk, na=False)].index.tolist()
-                    relevant_hr_data = df_hr.loc[relevant_hr_indices].to_dict('index')
-                    all_plays = game_feed_data.get('liveData', {}).get('plays', {}).get('allPlays', [])
-
-                    for play in all_plays:
-                        if play.get('result', {}).get('eventType') == 'home_run':
-                            batter_name_feed_raw = play.get('matchup', {}).get('batter', {}).get('fullName')
-                            feed_first_norm, feed_last_norm, is_jr_feed = normalize_and_split_name_v5(batter_name_feed_raw)
-
-                            for event in play.get('playEvents', []):
-                                potential_play_id = event.get('playId')
-
-                                for hr_index in relevant_hr_indices:
-                                    hr_row_match = relevant_hr_data[hr_index]
-                                    batter_name_csv_raw = hr_row_match['Name']
-                                    csv_first_norm, csv_last_norm, is_jr_csv = normalize_and_split_name_v5(batter_name_csv_raw)
-
-                                    name_match = False
-                                    if (csv_first_norm == feed_first_norm and csv_last_norm == feed_last_norm and is_jr_csv == is_jr_feed) or \
-                                       (csv_first_norm == feed_last_norm and csv_last_norm == feed_first_norm and is_jr_csv == is_jr_feed):
-                                        name_match = True
-                                        print(f"\nPotential Name Match (Strict)! CSV Norm: ({csv_first_norm}, {csv_last_norm}, Jr: {is_jr_csv}), Feed Norm: ({feed_first_norm}, {feed_last_norm}, Jr: {is_jr_feed}), CSV Raw: {batter_name_csv_raw}, Feed Raw: {batter_name_feed_raw}, AtBatIndex: {play.get('about', {}).get('atBatIndex')}, PlayEvent ID: {potential_play_id}")
-                                    elif fuzz.ratio(f"{csv_first_norm} {csv_last_norm}", f"{feed_first_norm} {feed_last_norm}") >= fuzzy_threshold or \
-                                         fuzz.ratio(f"{csv_last_norm} {csv_first_norm}", f"{feed_first_norm} {feed_last_norm}") >= fuzzy_threshold:
-                                        if is_jr_csv == is_jr_feed:
-                                            name_match = True
-                                            print(f"\nPotential Name Match (Fuzzy)! CSV Norm: ({csv_first_norm}, {csv_last_norm}, Jr: {is_jr_csv}), Feed Norm: ({feed_first_norm}, {feed_last_norm}, Jr: {is_jr_feed}), CSV Raw: {batter_name_csv_raw}, Feed Raw: {batter_name_feed_raw}, AtBatIndex: {play.get('about', {}).get('atBatIndex')}, PlayEvent ID: {potential_play_id}, Score: {fuzz.ratio(f'{csv_first_norm} {csv_last_norm}', f'{feed_first_norm} {feed_last_norm}')}")
-                                        else:
-                                            print(f"No Name Match (Fuzzy - Jr Mismatch) - CSV Norm: ({csv_first_norm}, {csv_last_norm}, Jr: {is_jr_csv}), Feed Norm: ({feed_first_norm}, {feed_last_norm}, Jr: {is_jr_feed}), CSV Raw: {batter_name_csv_raw}, Feed Raw: {batter_name_feed_raw}")
-                                    else:
-                                        print(f"No Name Match - CSV Norm: ({csv_first_norm}, {csv_last_norm}, Jr: {is_jr_csv}), Feed Norm: ({feed_first_norm}, {feed_last_norm}, Jr: {is_jr_feed}), CSV Raw: {batter_name_csv_raw}, Feed Raw: {batter_name_feed_raw}")
-
-                                    if name_match:
-                                        pitch_speed_feed = None
-                                        exit_velocity_feed = None
-                                        distance_feed = None
-                                        la_feed = None
-                                        found_hit_data_event = False
-
-                                        if event.get('pitchData'):
-                                            pitch_speed_feed = event['pitchData'].get('startSpeed')
-                                        hit_data = event.get('hitData', {})
-                                        if hit_data:
-                                            exit_velocity_feed = hit_data.get('launchSpeed')
-                                            distance_feed = hit_data.get('totalDistance')
-                                            la_feed = hit_data.get('launchAngle')
-                                            found_hit_data_event = True
-                                            print("  Found hitData in playEvent.")
-
-                                        try:
-                                            pitch_speed_csv = float(hr_row_match.get('Pitch (MPH)', 0))
-                                            ev_csv = float(hr_row_match.get('EV (MPH)', 0))
-                                            distance_csv = int(hr_row_match.get('Dist (ft)', 0))
-                                            la_csv = int(hr_row_match.get('LA (deg)',0))
-
-                                            print(f"  CSV: Pitch={pitch_speed_csv}, EV={ev_csv}, Dist={distance_csv}, LA={la_csv}")
-                                            print(f"  Feed: Pitch={pitch_speed_feed}, EV={exit_velocity_feed}, Dist={distance_feed}, LA={la_feed}")
-
-                                            speed_match = abs(pitch_speed_csv - float(pitch_speed_feed)) < 2 if pitch_speed_feed is not None else True
-                                            ev_match = abs(ev_csv - float(exit_velocity_feed)) < 2 if exit_velocity_feed is not None else True
-                                            distance_match = abs(distance_csv - float(distance_feed)) < 10 if distance_feed is not None else True
-
-                                            if speed_match and ev_match and distance_match and potential_play_id and found_hit_data_event:
-                                                df_hr.at[hr_index, 'playId'] = potential_play_id
-                                                print(f"  >>> MATCH FOUND! Added playId '{potential_play_id}' for {batter_name_csv_raw} in game {game_pk}")
-                                                break
-                                            else:
-                                                print(f"{speed_match=}, {ev_match=}, {distance_match=}, play_event_id={potential_play_id}, {found_hit_data_event=}")
-                                                print("  No metric match found for playEvent with pitchData.")
-
-                                        except ValueError:
-                                            print(f"  Warning: Could not convert HR metrics to numbers in CSV for {batter_name_csv_raw} in game {game_pk}")
-                                        except KeyError as e:
-                                            print(f"  Warning: Missing key in playEvent: {e}")
-                    if any(pd.notna(df_hr.loc[relevant_hr_indices, 'playId'])):
-                        break
-
-                except requests.exceptions.RequestException as e:
-                    print(f"Error fetching game feed for {game_pk}: {e}")
-                except json.JSONDecodeError:
-                    print(f"Error decoding JSON for game feed {game_pk}")
-                except Exception as e:
-                    print(f"An unexpected error occurred while processing game feed for {game_pk}: {e}")
-
-                time.sleep(0.1)
-
-        df_hr.to_csv(homeruns_csv, index=False)
-        print(f"Finished attempting to add playIds to {homeruns_csv}")
+        get_metrics().count('playids', rows=len(pending))
+        log.info("Matched %d of %d home runs across %d games.", len(matched), len(pending), len(rows_by_game))
+        if len(df_report):
+            log.info("Match outcomes:\n%s", df_report['reason'].replace('', 'matched').value_counts().to_string())
+        log.info("Finished attempting to add playIds to %s (report: %s)", homeruns_csv, report_csv)
 
     except FileNotFoundError:
-        print(f"Error: The file {homeruns_csv} was not found.")
+        log.error("The file %s was not found.", homeruns_csv)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        log.exception("An unexpected error occurred: %s", e)
 
 if __name__ == "__main__":
     add_playid_to_homeruns_v5()
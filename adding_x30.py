@@ -1,58 +1,112 @@
 import pandas as pd
-import requests
-import time
-from bs4 import BeautifulSoup
-from tqdm import tqdm
+from progress_journal import ProgressJournal
+from sporty_videos import fetch_sporty_page, parse_sporty_page
+from hr_store import HOMERUNS_PATH, load_homeruns, save_homeruns
+from metrics import get_logger, get_metrics, timed_stage
+from x30_model import TOLERANCE, estimate_x30, fill_spray_angles
 
-# Load CSV
-file_path = "2025_homeruns_running.csv"
-df = pd.read_csv(file_path)
-
-# Add new column if missing
-if "x/30 ballparks" not in df.columns:
-    df["x/30 ballparks"] = None
-
-# Baseball Savant URL template
-base_url = "https://baseballsavant.mlb.com/sporty-videos?playId={}"
-
-# Headers to mimic a real browser request
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
-}
+log = get_logger(__name__)
 
 # Function to scrape HR: x/30 parks
 def get_hr_park_count(play_id):
-    url = base_url.format(play_id)
-    
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+        return parse_sporty_page(fetch_sporty_page(play_id))["x30"]
+    except Exception as e:
+        log.warning("Error scraping %s: %s", play_id, e)
+        return None
 
-        # Extract the HR x/30 value using the span ID
-        hr_span = soup.find("span", id="hr-x-parks-listener")
+def _x30_columns(df):
+    """Adds the x/30 and x30_source columns if missing; values without a source were scraped."""
+    if "x/30 ballparks" not in df.columns:
+        df["x/30 ballparks"] = pd.Series(pd.NA, index=df.index, dtype="UInt8")
+    if "x30_source" not in df.columns:
+        df["x30_source"] = pd.Series(pd.NA, index=df.index, dtype="category")
+    df["x30_source"] = df["x30_source"].astype("category").cat.set_categories(["savant", "model"])
+    # Values without a source were scraped (by this stage or sporty_videos.py)
+    df.loc[df["x30_source"].isna() & df["x/30 ballparks"].notna(), "x30_source"] = "savant"
 
-        if hr_span:
-            return int(hr_span.text.split("/")[0].strip())  # Extract 'x' from 'x/30 parks'
+def fill_x30_from_model(df, tolerance=TOLERANCE, feed_cache_dir="feed_cache"):
+    """
+    Fills missing x/30 (rows with a playId) where the x30_model estimate is certain within tolerance parks.
 
-        return None  # If not found
-    except Exception as e:
-        print(f"Error scraping {play_id}: {e}")
-        return None
+    Spray angles are read from the cached game feeds first. Returns the index of the filled rows.
+    """
+    todo = df.index[df["x/30 ballparks"].isna() & df["playId"].notna()]
+    if todo.empty:
+        return todo
+    filled = fill_spray_angles(df, feed_cache_dir)
+    model = estimate_x30(df.loc[todo], tolerance=tolerance)
+    certain = model.index[model["certain"]]
+    df.loc[certain, "x/30 ballparks"] = model.loc[certain, "estimate"].astype("UInt8")
+    df.loc[certain, "x30_source"] = "model"
+    log.info("Model filled %d of %d missing x/30 values (%d spray angles from feeds)", len(certain), len(todo), filled)
+    return certain
 
-# Iterate and scrape data
-for i, row in tqdm(df.iterrows(), total=len(df)):
-    play_id = row["playId"]
-    
-    if pd.isna(df.at[i, "x/30 ballparks"]):
-        x_30_value = get_hr_park_count(play_id)
-        df.at[i, "x/30 ballparks"] = x_30_value
+def model_x30(homeruns_csv=HOMERUNS_PATH, tolerance=TOLERANCE, feed_cache_dir="feed_cache"):
+    """
+    Runs fill_x30_from_model over the table and saves it; returns how many rows were filled.
 
-    if i % 100 == 0:
-        print(f"Processed {i} home runs, last play_id: {play_id}, x/30: {x_30_value}")
+    The pipeline's x/30 stage runs this before the sporty-videos scrape, so
+    only the rows the model leaves uncertain are scraped.
+    """
+    df = load_homeruns(homeruns_csv)
+    _x30_columns(df)
+    certain = fill_x30_from_model(df, tolerance, feed_cache_dir)
+    if len(certain):
+        save_homeruns(df, homeruns_csv, columns=["x/30 ballparks", "x30_source", "Spray (deg)"])
+    return len(certain)
+
+@timed_stage("x30")
+def add_x30_to_homeruns(homeruns_csv=HOMERUNS_PATH, journal_path="progress/x30.jsonl", compact_every=100,
+                        use_model=True, tolerance=TOLERANCE, feed_cache_dir="feed_cache"):
+    """
+    Fills x/30 for every row that is still missing it.
+
+    With use_model, x30_model.py estimates every missing row first from its
+    EV, launch angle, distance and spray angle (read from the cached game
+    feeds). Rows whose estimate is certain within `tolerance` parks are filled
+    with it (x30_source 'model'); only the rest are scraped from Savant.
+
+    sporty_videos.extract_sporty_videos fills x/30 and the clip URL from the
+    same page in one pass and is the preferred stage; this one only reads x/30.
+
+    Each scraped value is journaled keyed by playId as soon as it is read, and
+    the journal is folded into the CSV every `compact_every` rows and on exit
+    (including Ctrl-C), so a restart resumes where the last run stopped.
+    """
+    df = load_homeruns(homeruns_csv)
+    _x30_columns(df)
+
+    columns = ["x/30 ballparks", "x30_source"] + (["Spray (deg)"] if use_model else [])
+    journal = ProgressJournal(journal_path, compact_every, on_compact=lambda: save_homeruns(df, homeruns_csv, columns=columns))
+    resumed = journal.apply(df, df["playId"])
+    if resumed:
+        log.info("Resumed %d x/30 values from %s", resumed, journal_path)
+    # Journaled values are scraped ones
+    df.loc[df["x30_source"].isna() & df["x/30 ballparks"].notna(), "x30_source"] = "savant"
+
+    if use_model and fill_x30_from_model(df, tolerance, feed_cache_dir).size:
+        save_homeruns(df, homeruns_csv, columns=columns)
+    todo = df[df["x/30 ballparks"].isna() & df["playId"].notna()]
+    x_30_value = None
+    try:
+        # Iterate and scrape data
+        for n, (i, row) in enumerate(todo.iterrows(), 1):
+            play_id = row["playId"]
+            x_30_value = get_hr_park_count(play_id)
+            if x_30_value is not None:
+                df.at[i, "x/30 ballparks"] = x_30_value
+                df.at[i, "x30_source"] = "savant"
+                journal.record(play_id, **{"x/30 ballparks": x_30_value})
 
-    time.sleep(2)  # Prevent getting blocked
+            get_metrics().count("x30", rows=1)
+            if n % 100 == 0:
+                log.info("Processed %d/%d home runs, last play_id: %s, x/30: %s", n, len(todo), play_id, x_30_value)
+    finally:
+        # Save updated CSV
+        journal.compact()
+        journal.close()
+    log.info("Scraping complete! Data saved.")
 
-# Save updated CSV
-df.to_csv("2025_homeruns_running.csv", index=False)
-print("Scraping complete! Data saved.")
+if __name__ == "__main__":
+    add_x30_to_homeruns()
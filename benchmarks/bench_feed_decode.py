@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adding_playIDs import extract_hr_events
+from feed_cache import FeedCache
+from feed_extract import extract_feeds, orjson
+from fixtures import synthetic_feed
+from hr_store import HOMERUNS_PATH, load_homeruns
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+def fill_cache(cache, df, games, filler_plays):
+    """Stores one synthetic feed per game (from the table's home runs) in cache; returns the gamePks and MB stored."""
+    known = df[df["gamePk"].notna() & df["playId"].notna()]
+    game_pks = sorted(known["gamePk"].unique())[:games]
+    raw_bytes = 0
+    for game_pk in game_pks:
+        raw = json.dumps(synthetic_feed(game_pk, known[known["gamePk"] == game_pk], filler_plays)).encode("utf-8")
+        raw_bytes += len(raw)
+        cache.put(game_pk, raw)
+    return [int(game_pk) for game_pk in game_pks], raw_bytes / 1e6
+
+def in_process(cache, game_pks):
+    """The previous path: every feed decoded in full with the stdlib on the calling thread."""
+    events = 0
+    for game_pk in game_pks:
+        events += len(extract_hr_events(cache.get(game_pk)))
+    return events
+
+def pooled(cache, game_pks, workers):
+    return sum(len(records) for _, _, records in extract_feeds(game_pks, cache, extract_hr_events, workers))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare in-process feed decoding with the feed_extract process pool.")
+    parser.add_argument("--table", default=HOMERUNS_PATH)
+    parser.add_argument("--games", type=int, default=60)
+    parser.add_argument("--filler-plays", type=int, default=1500, help="Ordinary plays per feed (1500 is about 1 MB).")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = FeedCache(tmp, offline=True)
+        game_pks, megabytes = fill_cache(cache, load_homeruns(args.table), args.games, args.filler_plays)
+        print(f"{len(game_pks)} feeds, {megabytes / len(game_pks):.2f} MB each, decoder: {'orjson' if orjson else 'json'}, "
+              f"{os.cpu_count()} cores")
+        print(f"{'mode':<16} {'feeds/s':>8} {'MB/s':>7} {'events':>7} {'peak MB':>8}")
+        rows = [("in-process json", lambda: in_process(cache, game_pks))]
+        rows += [(f"pool x{workers}", lambda workers=workers: pooled(cache, game_pks, workers)) for workers in args.workers]
+        for name, run in rows:
+            started = time.perf_counter()
+            events = run()
+            elapsed = time.perf_counter() - started
+            print(f"{name:<16} {len(game_pks) / elapsed:>8.1f} {megabytes / elapsed:>7.1f} {events:>7} {_peak_rss_mb():>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from game_dataset import GameDataset
+from hr_query import INDEX_COLUMNS, load_index
+from hr_store import HOMERUNS_PATH, export_csv, load_homeruns, save_homeruns
+
+def synthetic_decade(df, seasons, seed=0):
+    """The table repeated once per season: dates moved to that year, new gamePks and playIds."""
+    rng = np.random.default_rng(seed)
+    base = int(df["Date"].dt.year.mode()[0])
+    frames = []
+    for offset, season in enumerate(seasons):
+        part = df.copy()
+        part["Date"] = part["Date"] + pd.DateOffset(years=season - base)
+        if "gamePk" in part.columns:
+            part["gamePk"] = part["gamePk"] + offset * 1_000_000
+        if "playId" in part.columns:
+            known = part["playId"].notna()
+            part.loc[known, "playId"] = [str(uuid.UUID(bytes=rng.bytes(16))) for _ in range(int(known.sum()))]
+        frames.append(part)
+    return pd.concat(frames, ignore_index=True)
+
+def best_of(run, repeat):
+    """Fastest of `repeat` runs in ms, and the last result."""
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and query a synthetic decade of home runs from the partitioned store.")
+    parser.add_argument("--table", default=HOMERUNS_PATH, help="Table (one season) the decade is built from.")
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = load_homeruns(args.table)
+    last = int(df["Date"].dt.year.max())
+    seasons = list(range(last - args.seasons + 1, last + 1))
+    decade = synthetic_decade(df, seasons)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        one_csv, decade_csv, root = (os.path.join(tmp, name) for name in ("season.csv", "decade.csv", "homeruns"))
+        export_csv(df, one_csv)
+        export_csv(decade, decade_csv)
+        started = time.perf_counter()
+        save_homeruns(decade, root)
+        write_ms = (time.perf_counter() - started) * 1000
+        resave_ms, _ = best_of(lambda: save_homeruns(decade, root), 1)
+
+        print(f"{len(df)} rows per season, {len(decade)} rows over {len(seasons)} seasons "
+              f"({seasons[0]}-{seasons[-1]}); partitioned write {write_ms:.0f} ms, unchanged resave {resave_ms:.0f} ms")
+        print(f"{'load':<40} {'rows':>7} {'ms':>8}")
+        loads = [
+            ("one season, legacy CSV", lambda: load_homeruns(one_csv)),
+            ("decade, single CSV", lambda: load_homeruns(decade_csv)),
+            ("decade, partitioned", lambda: load_homeruns(root)),
+            ("one season, partitioned", lambda: load_homeruns(root, seasons=[last])),
+            ("one month, partitioned", lambda: load_homeruns(root, date_from=f"{last}-06-01", date_to=f"{last}-06-30")),
+            ("decade, partitioned, index columns", lambda: load_homeruns(root, columns=INDEX_COLUMNS)),
+            ("decade, GameDataset", lambda: GameDataset.load(root)),
+        ]
+        for name, run in loads:
+            ms, result = best_of(run, args.repeat)
+            print(f"{name:<40} {len(result):>7} {ms:>8.1f}")
+
+        index_path = os.path.join(tmp, "hr_index.pkl")
+        print(f"\n{'index':<40} {'rows':>7} {'ms':>8}")
+        indexes = [
+            ("one season CSV, snapshot", lambda: load_index(one_csv, os.path.join(tmp, "season_index.pkl"))),
+            ("decade, built", lambda: load_index(root, None)),
+            ("decade, snapshot", lambda: load_index(root, index_path)),
+            ("one season of the decade, snapshot", lambda: load_index(root, index_path, seasons=[last])),
+        ]
+        for name, run in indexes:
+            run()  # writes the snapshot the timed runs read
+            ms, index = best_of(run, 1 if name.endswith("built") else args.repeat)
+            print(f"{name:<40} {len(index):>7} {ms:>8.1f}")
+
+        index = load_index(root, index_path)
+        batter = df["Name"].mode()[0]
+        print(f"\n{'query (decade index)':<40} {'rows':>7} {'ms':>8}")
+        queries = [
+            (f"batter={batter}", lambda: index.positions(batter=batter)),
+            (f"batter, season={last}", lambda: index.positions(batter=batter, season=last)),
+            ("park=COL", lambda: index.positions(park="COL")),
+            (f"dates in June {last}", lambda: index.positions(date_from=f"{last}-06-01", date_to=f"{last}-06-30")),
+            ("summary by season", lambda: index.summary(("season",))),
+            ("summary by batter, season filter", lambda: index.summary(("batter",), season=last)),
+        ]
+        for name, run in queries:
+            ms, result = best_of(run, args.repeat)
+            print(f"{name:<40} {len(result):>7} {ms:>8.2f}")
+
+if __name__ == "__main__":
+    main()
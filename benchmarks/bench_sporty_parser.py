@@ -0,0 +1,42 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sporty_videos import parse_sporty_page, parse_sporty_page_bs4
+from fixtures import SPORTY_FIXTURES_DIR, load_sporty_fixtures, synthetic_sporty_fixtures
+
+def time_parser(parser, pages, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            parser(page)
+    return (time.perf_counter() - started) / (repeat * len(pages))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the targeted sporty-videos parser with the BeautifulSoup path.")
+    parser.add_argument("--fixtures", default=SPORTY_FIXTURES_DIR, help="Directory of saved sporty-videos pages")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_sporty_fixtures(args.fixtures)
+    source = f"{len(pages)} recorded pages from {args.fixtures}"
+    if not pages:
+        pages = synthetic_sporty_fixtures()
+        source = f"{len(pages)} synthetic pages (no recordings in {args.fixtures})"
+    pages = list(pages.values())
+
+    mismatches = sum(parse_sporty_page(page) != parse_sporty_page_bs4(page) for page in pages)
+    bs4_time = time_parser(parse_sporty_page_bs4, pages, args.repeat)
+    fast_time = time_parser(parse_sporty_page, pages, args.repeat)
+    mean_kb = sum(len(page) for page in pages) / len(pages) / 1024
+
+    print(f"Fixtures: {source}, mean {mean_kb:.0f} KB/page")
+    print(f"BeautifulSoup html.parser: {bs4_time * 1000:8.2f} ms/page")
+    print(f"Targeted parser:           {fast_time * 1000:8.3f} ms/page ({bs4_time / fast_time:.0f}x faster)")
+    print(f"Result mismatches: {mismatches}")
+
+if __name__ == "__main__":
+    main()
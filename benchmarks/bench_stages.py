@@ -0,0 +1,238 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from hr_store import HOMERUNS_PATH, load_homeruns, save_homeruns
+from metrics import get_metrics
+from seasons import DEFAULT_SEASON, schedule_path
+from fixtures import FixtureSet
+from mock_server import MockApiServer
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+BENCHMARKS = ["scrape", "windows", "export", "feeds", "gamepks", "playids", "x30", "download"]
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+def _point_stages_at(templates, rps, workdir):
+    """Redirects the stages' URL constants to the mock server and lifts the per-host rate limit for it."""
+    import building_database
+    import feed_cache
+    import metrics
+    import savant_csv
+    import sporty_videos
+    from http_client import get_client
+
+    building_database.SAVANT_SEARCH_URL = templates["search"]
+    savant_csv.SAVANT_CSV_URL = templates["csv"]
+    feed_cache.GAME_FEED_URL = templates["feed"]
+    sporty_videos.SPORTY_VIDEOS_URL = templates["sporty"]
+    get_client().host_rates["127.0.0.1"] = rps
+    metrics.METRICS_DIR = os.path.join(workdir, "metrics")
+    metrics.configure_logging("WARNING")
+
+def _bench_scrape(config):
+    from building_database import build_search_url, scrape_baseball_savant_table
+
+    all_data = []
+    for day in config["dates"]:
+        all_data = scrape_baseball_savant_table(build_search_url(date.fromisoformat(day)), all_data, {"User-Agent": "bench"})
+    return len(all_data), float(len(all_data) == config["rows"])
+
+def _bench_windows(config):
+    import building_database
+
+    building_database.SAVANT_ROW_CAP = config["row_cap"]
+    first, last = date.fromisoformat(config["dates"][0]), date.fromisoformat(config["dates"][-1])
+    all_data, _ = building_database.scrape_adaptive(first, last, {"User-Agent": "bench"}, config["subset_schedule"],
+                                                    row_cap=config["row_cap"])
+    return len(all_data), float(len(all_data) == config["rows"])
+
+def _bench_export(config):
+    import building_database
+    from savant_csv import rows_to_table, scrape_csv_window
+
+    first, last = date.fromisoformat(config["dates"][0]), date.fromisoformat(config["dates"][-1])
+    rows, _ = building_database.scrape_adaptive(first, last, {"User-Agent": "bench"}, config["subset_schedule"],
+                                                row_cap=config["row_cap"], fetch_window=scrape_csv_window)
+    df = rows_to_table(rows)
+    expected = set(zip(config["expected_gamePk"], config["expected_EV"]))
+    found = set(zip(df["gamePk"].astype(int), df["EV (MPH)"].round(1)))
+    return len(df), len(expected & found) / max(len(expected), 1)
+
+def _bench_feeds(config):
+    from feed_ingest import build_homeruns_from_feeds
+
+    df = build_homeruns_from_feeds(config["expected_gamePk_set"], feed_cache_dir=os.path.join(config["workdir"], "feed_cache"),
+                                   max_workers=config["workers"])
+    expected = set(config["expected_playId"])
+    return len(df), len(expected & set(df["playId"].dropna())) / max(len(expected), 1)
+
+def _bench_gamepks(config):
+    from adding_gamePks import populate_gamepk_if_empty_final
+
+    populate_gamepk_if_empty_final(config["table"], config["schedule"])
+    df = load_homeruns(config["table"])
+    return len(df), float((df["gamePk"] == pd.Series(config["expected_gamePk"], dtype="Int64")).fillna(False).mean())
+
+def _bench_playids(config):
+    from adding_playIDs import add_playid_to_homeruns_v5
+
+    workdir = config["workdir"]
+    add_playid_to_homeruns_v5(config["table"], feed_cache_dir=os.path.join(workdir, "feed_cache"),
+                              report_csv=os.path.join(workdir, "playid_match_report.csv"),
+                              journal_path=os.path.join(workdir, "progress", "playids.jsonl"),
+                              registry_path=os.path.join(workdir, "player_registry.json"))
+    df = load_homeruns(config["table"])
+    return len(df), float((df["playId"] == pd.Series(config["expected_playId"], dtype="string")).fillna(False).mean())
+
+def _bench_x30(config):
+    from adding_x30 import get_hr_park_count
+
+    values = [get_hr_park_count(play_id) for play_id in config["expected_playId"]]
+    return len(values), sum(v == e for v, e in zip(values, config["expected_x30"])) / max(len(values), 1)
+
+def _bench_download(config):
+    from downloading_videos import download_videos
+
+    workdir = config["workdir"]
+    download_videos(config["table"], output_folder=os.path.join(workdir, "clips"),
+                    journal_path=os.path.join(workdir, "progress", "videos.jsonl"), max_workers=config["workers"])
+    df = load_homeruns(config["table"])
+    return int(df["video_path"].notna().sum()), float(df["video_path"].notna().mean())
+
+def run_benchmark(name, config):
+    """Runs one stage benchmark in this (fresh) process and returns its measurements."""
+    _point_stages_at(config["templates"], config["rps"], config["workdir"])
+    bench = globals()[f"_bench_{name}"]
+    baseline = _peak_rss_mb()
+    wall, cpu = time.perf_counter(), time.process_time()
+    rows, correct = bench(config)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return {"rows": rows, "seconds": round(wall, 3), "cpu_seconds": round(cpu, 3),
+            "mb_read": round(sum(get_metrics().bytes.values()) / 1e6, 2),
+            "rows_per_sec": round(rows / wall, 2) if wall else None,
+            "peak_rss_mb": round(_peak_rss_mb(), 1), "rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+            "correct": round(correct, 4)}
+
+def select_games(df, games):
+    """All home runs of the first `games` games (by gamePk) that have a playId, so every feed is complete."""
+    known = df[df["gamePk"].notna() & df["playId"].notna()]
+    game_pks = sorted(known["gamePk"].unique())[:games]
+    return known[known["gamePk"].isin(game_pks)].reset_index(drop=True)
+
+def prepare(name, subset, workdir, base_config):
+    """Writes the stage's input table (its output columns cleared) and returns the benchmark config."""
+    config = dict(base_config, workdir=workdir, table=os.path.join(workdir, "homeruns.csv"),
+                  subset_schedule=os.path.join(workdir, "schedule.csv"))
+    schedule = pd.read_csv(base_config["schedule"])
+    schedule[schedule["gamePk"].isin(subset["gamePk"].astype(int))].to_csv(config["subset_schedule"], index=False)
+    table = subset.copy()
+    if name == "gamepks":
+        table["gamePk"] = pd.NA
+    elif name == "playids":
+        table["playId"] = pd.NA
+    elif name == "download":
+        table = table.drop(columns=["video_url", "video_path"], errors="ignore")
+    save_homeruns(table, config["table"])
+    return config
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(path=RESULTS_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def previous_result(history, name, params):
+    for entry in reversed(history):
+        if entry["benchmark"] == name and entry["params"] == params:
+            return entry
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage offline against a local mock of Savant and statsapi.")
+    parser.add_argument("benchmarks", nargs="*", default=BENCHMARKS, help=f"Subset of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--table", default=HOMERUNS_PATH, help="Home run table the fixtures are built from.")
+    parser.add_argument("--schedule", default=os.path.join(ROOT, schedule_path(DEFAULT_SEASON)))
+    parser.add_argument("--games", type=int, default=40, help="Number of games (and their home runs) to replay.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every mock response.")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Up to this many extra seconds per response.")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with each 429.")
+    parser.add_argument("--rps", type=float, default=200.0, help="Client rate limit for the mock host.")
+    parser.add_argument("--row-cap", type=int, default=100, help="Search row cap of the mock (and the windows benchmark).")
+    parser.add_argument("--workers", type=int, default=8, help="Download workers.")
+    parser.add_argument("--padding-kb", type=int, default=150, help="Filler per synthetic HTML page.")
+    parser.add_argument("--clip-kb", type=int, default=512, help="Size of each synthetic clip.")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON-lines history the results are appended to.")
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    subset = select_games(load_homeruns(args.table), args.games)
+    fixtures = FixtureSet(subset, padding_kb=args.padding_kb, clip_kb=args.clip_kb)
+    server = MockApiServer(fixtures, latency=args.latency, jitter=args.jitter,
+                           throttle_rate=args.throttle, retry_after=args.retry_after, search_row_cap=args.row_cap).start()
+    params = {key: getattr(args, key) for key in ("games", "latency", "jitter", "throttle", "rps", "workers", "padding_kb", "clip_kb", "row_cap")}
+    base_config = {
+        "templates": server.url_templates(), "rps": args.rps, "workers": args.workers, "row_cap": args.row_cap,
+        "schedule": os.path.abspath(args.schedule), "dates": fixtures.dates, "rows": len(subset),
+        "expected_gamePk": [int(pk) for pk in subset["gamePk"]],
+        "expected_gamePk_set": sorted({int(pk) for pk in subset["gamePk"]}),
+        "expected_EV": [round(float(ev), 1) for ev in subset["EV (MPH)"]],
+        "expected_playId": list(subset["playId"]),
+        "expected_x30": [None if pd.isna(x) else int(x) for x in subset["x/30 ballparks"]],
+    }
+    print(f"Replaying {len(subset)} home runs from {subset['gamePk'].nunique()} games over {len(fixtures.dates)} days "
+          f"(latency {args.latency}+{args.jitter}s, {args.throttle:.0%} throttled)")
+
+    history = load_history(args.results)
+    commit = _git_commit()
+    context = multiprocessing.get_context("spawn")  # a fresh interpreter per stage keeps peak RSS per benchmark
+    print(f"{'benchmark':<10} {'rows':>6} {'seconds':>8} {'rows/s':>9} {'cpu s':>7} {'MB read':>8} {'peak MB':>8} "
+          f"{'correct':>8} {'vs last':>8}")
+    with open(args.results, "a", encoding="utf-8") as out:
+        for name in args.benchmarks:
+            with tempfile.TemporaryDirectory() as workdir:
+                config = prepare(name, subset, workdir, base_config)
+                # An executor worker (unlike a Pool worker) may start its own process pool, as the feed stages do
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    result = pool.submit(run_benchmark, name, config).result()
+            last = previous_result(history, name, params)
+            change = ""
+            if last and last["rows_per_sec"] and result["rows_per_sec"]:
+                change = f"{result['rows_per_sec'] / last['rows_per_sec'] - 1:+.0%}"
+            print(f"{name:<10} {result['rows']:>6} {result['seconds']:>8.2f} {result['rows_per_sec'] or 0:>9.1f} "
+                  f"{result['cpu_seconds']:>7.2f} {result['mb_read']:>8.2f} {result['peak_rss_mb']:>8.1f} {result['correct']:>8.1%} {change:>8}")
+            entry = dict(result, benchmark=name, params=params, commit=commit, timestamp=time.time())
+            out.write(json.dumps(entry) + "\n")
+            out.flush()
+    print(f"Mock server handled {server.stats['requests']} requests ({server.stats['throttled']} throttled); "
+          f"results appended to {args.results}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import uuid
+import zlib
+
+import pandas as pd
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SPORTY_FIXTURES_DIR = os.path.join(FIXTURES_DIR, "sporty_videos")
+SEARCH_FIXTURES_DIR = os.path.join(FIXTURES_DIR, "search")
+FEED_FIXTURES_DIR = os.path.join(FIXTURES_DIR, "feeds")
+
+# Savant search result columns, in page order
+SEARCH_COLUMNS = ['Rk', 'Name', 'Team', 'Result', 'Date', 'Vs.', 'Pitch (MPH)', 'EV (MPH)', 'LA (deg)', 'Dist (ft)']
+# Columns of the Savant CSV export that savant_csv.py does not read, filled with plausible numbers
+CSV_EXPORT_FILLER = ['release_pos_x', 'release_pos_z', 'description', 'spin_dir', 'zone', 'des', 'game_type', 'type',
+                     'hit_location', 'bb_type', 'game_year', 'pfx_x', 'pfx_z', 'on_3b', 'on_2b', 'on_1b', 'umpire',
+                     'sv_id', 'vx0', 'vy0', 'vz0', 'ax', 'ay', 'az', 'sz_top', 'sz_bot', 'effective_speed',
+                     'release_extension', 'fielder_2', 'fielder_3', 'fielder_4', 'fielder_5', 'fielder_6', 'fielder_7',
+                     'fielder_8', 'fielder_9', 'release_pos_y', 'estimated_ba_using_speedangle',
+                     'estimated_woba_using_speedangle', 'woba_value', 'woba_denom', 'babip_value', 'iso_value',
+                     'launch_speed_angle', 'pitch_number', 'pitch_name', 'home_score', 'away_score', 'bat_score',
+                     'fld_score', 'post_away_score', 'post_home_score', 'post_bat_score', 'post_fld_score',
+                     'if_fielding_alignment', 'of_fielding_alignment', 'spin_axis', 'delta_home_win_exp',
+                     'delta_run_exp', 'bat_speed', 'swing_length']
+
+def load_sporty_fixtures(fixture_dir=SPORTY_FIXTURES_DIR):
+    """Returns {playId: html} for every saved sporty-videos page (record with extract_sporty_videos(fixture_dir=...))."""
+    pages = {}
+    if not os.path.isdir(fixture_dir):
+        return pages
+    for name in sorted(os.listdir(fixture_dir)):
+        if name.endswith(".html"):
+            with open(os.path.join(fixture_dir, name), "r", encoding="utf-8") as f:
+                pages[name[:-len(".html")]] = f.read()
+    return pages
+
+def _filler(rng, padding_kb):
+    filler = []
+    size = 0
+    while size < padding_kb * 1024:
+        block = rng.choice([
+            '<script type="text/javascript">var cfg = {"id": %d, "flags": [%s]};</script>\n'
+            % (rng.randrange(10 ** 6), ", ".join(str(rng.randrange(100)) for _ in range(20))),
+            '<div class="nav-item"><a href="/leaderboard/%d">Leaderboard %d</a><span class="badge">%d</span></div>\n'
+            % (rng.randrange(1000), rng.randrange(1000), rng.randrange(50)),
+            "<tr>" + "".join(f'<td class="c{i}">{rng.random():.3f}</td>' for i in range(12)) + "</tr>\n",
+        ])
+        filler.append(block)
+        size += len(block)
+    return filler
+
+def synthetic_sporty_page(play_id, x30, padding_kb=120, seed=0, clip_url=None):
+    """
+    Builds a stand-in sporty-videos page with the same landmarks the scrapers look for.
+
+    Real pages are mostly navigation, inline scripts and player tables around a
+    handful of relevant tags; padding_kb of similar filler keeps parse cost
+    comparable when no recorded pages are available.
+    """
+    rng = random.Random(seed)
+    filler = _filler(rng, padding_kb)
+    half = len(filler) // 2
+    clip = clip_url or f"https://sporty-clips.mlb.com/{uuid.UUID(int=rng.getrandbits(128))}.mp4"
+    return (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Home Run | Baseball Savant</title>\n"
+        + "".join(filler[:half])
+        + "</head><body><div id=\"content\"><table>\n"
+        + "".join(filler[half:])
+        + "</table>\n"
+        + f'<div class="hr-parks"><span id="hr-x-parks-listener">{x30}/30 parks</span></div>\n'
+        + f'<div class="video-box"><video id="sporty" controls preload="none"><source src="{clip}" type="video/mp4"></video></div>\n'
+        + f'<div data-play-id="{play_id}"></div></div></body></html>\n'
+    )
+
+def synthetic_sporty_fixtures(count=50, padding_kb=120):
+    rng = random.Random(42)
+    pages = {}
+    for i in range(count):
+        play_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        pages[play_id] = synthetic_sporty_page(play_id, rng.randint(0, 30), padding_kb, seed=i)
+    return pages
+
+def synthetic_search_page(rows, padding_kb=150, seed=0):
+    """
+    Stand-in Savant search results page for one day.
+
+    Args:
+        rows (DataFrame): Home runs of the day with the SEARCH_COLUMNS.
+    """
+    rng = random.Random(seed)
+    filler = _filler(rng, padding_kb)
+    head = "".join(f"<th>{column}</th>" for column in SEARCH_COLUMNS)
+    body = []
+    for values in rows[SEARCH_COLUMNS].itertuples(index=False):
+        body.append("<tr>" + "".join(f"<td>{value}</td>" for value in values) + "</tr>\n")
+        body.append("<tr>" + "<td></td>" * len(SEARCH_COLUMNS) + "</tr>\n")  # the blank spacer rows real pages have
+    return (
+        "<!DOCTYPE html>\n<html><head><title>Statcast Search | Baseball Savant</title>\n"
+        + "".join(filler)
+        + "</head><body><table id=\"search_results\"><thead><tr>" + head + "</tr></thead><tbody>\n"
+        + "".join(body)
+        + "</tbody></table></body></html>\n"
+    )
+
+def _batter_id(name):
+    return 600000 + zlib.crc32(str(name).encode("utf-8")) % 99999
+
+def _hr_at_bats(rows, filler_plays, seed):
+    """atBatIndex of each home run row in synthetic_feed(..., rows, filler_plays, seed), in row order."""
+    return sorted(random.Random(seed).sample(range(filler_plays + len(rows)), len(rows)))
+
+def synthetic_search_csv(games, seed=0):
+    """
+    Stand-in Savant CSV export (type=details) for a date window.
+
+    Args:
+        games (list): (rows, atBatIndexes) per game, rows being its home runs
+            with the table columns and gamePk, as laid out in synthetic_feed.
+    """
+    from savant_csv import CSV_SCHEMA
+
+    rng = random.Random(seed)
+    header = list(CSV_SCHEMA) + CSV_EXPORT_FILLER
+    out = io.StringIO()
+    out.write("\ufeff")  # the export starts with a byte order mark
+    writer = csv.writer(out, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(header)
+    for rows, at_bats in games:
+        home, away = sorted([str(rows.iloc[0]["Team"]), str(rows.iloc[0]["Vs."])])
+        for row, at_bat in zip(rows.to_dict("records"), at_bats):
+            values = {
+                'game_date': pd.Timestamp(row["Date"]).strftime("%Y-%m-%d"), 'game_pk': int(row["gamePk"]),
+                'at_bat_number': at_bat + 1, 'events': 'home_run', 'player_name': str(row["Name"]),
+                'batter': _batter_id(row["Name"]), 'pitcher': 500000 + rng.randrange(99999),
+                'home_team': home, 'away_team': away, 'inning': rng.randint(1, 9),
+                'inning_topbot': 'Bot' if str(row["Team"]) == home else 'Top',
+                'balls': rng.randint(0, 3), 'strikes': rng.randint(0, 2), 'outs_when_up': rng.randint(0, 2),
+                'stand': rng.choice("LR"), 'p_throws': rng.choice("LR"), 'pitch_type': rng.choice(["FF", "SI", "SL", "CH"]),
+                'release_speed': row["Pitch (MPH)"], 'release_spin_rate': rng.randint(1800, 2700),
+                'plate_x': round(rng.uniform(-1, 1), 2), 'plate_z': round(rng.uniform(1.5, 3.5), 2),
+                'launch_speed': row["EV (MPH)"], 'launch_angle': row["LA (deg)"], 'hit_distance_sc': row["Dist (ft)"],
+                'hc_x': round(rng.uniform(30, 220), 2), 'hc_y': round(rng.uniform(20, 80), 2),
+            }
+            values = ["" if pd.isna(v) else v for v in values.values()]
+            writer.writerow(values + [round(rng.uniform(-10, 10), 4) for _ in CSV_EXPORT_FILLER])
+    return out.getvalue()
+
+def _feed_name(name):
+    last, _, first = str(name).partition(", ")
+    return f"{first} {last}".strip()
+
+def synthetic_feed(game_pk, rows, filler_plays=75, seed=0):
+    """
+    Stand-in statsapi feed/live document for one game.
+
+    Each home run row becomes a home_run play whose last playEvent carries the
+    row's pitch speed, exit velocity, launch angle, distance and playId, among
+    filler_plays ordinary plays so documents are of realistic size. gameData
+    carries the teams, date and home run batters, so feed_ingest.py can build
+    the rows back from the feed alone.
+    """
+    rng = random.Random(seed)
+    plays = []
+    first = rows.iloc[0] if len(rows) else None
+    home, away = sorted([str(first["Team"]), str(first["Vs."])]) if first is not None else ("HOME", "AWAY")
+    players = {}
+    hr_at = _hr_at_bats(rows, filler_plays, seed)
+    hr_rows = iter(rows.to_dict("records"))
+    for at_bat in range(filler_plays + len(rows)):
+        pitches = [{
+            "isPitch": True, "type": "pitch",
+            "pitchData": {"startSpeed": round(rng.uniform(80, 100), 1), "endSpeed": round(rng.uniform(75, 92), 1),
+                          "coordinates": {"pX": rng.uniform(-1, 1), "pZ": rng.uniform(1, 4)}},
+            "details": {"description": rng.choice(["Ball", "Called Strike", "Foul", "Swinging Strike"])},
+        } for _ in range(rng.randint(1, 6))]
+        if at_bat in hr_at:
+            row = next(hr_rows)
+            pitches[-1]["pitchData"]["startSpeed"] = float(row["Pitch (MPH)"])
+            pitches[-1]["playId"] = str(row["playId"])
+            pitches[-1]["hitData"] = {"launchSpeed": float(row["EV (MPH)"]), "launchAngle": float(row["LA (deg)"]),
+                                      "totalDistance": float(row["Dist (ft)"]),
+                                      "coordinates": {"coordX": round(rng.uniform(30, 220), 2), "coordY": round(rng.uniform(20, 80), 2)}}
+            batter_id = _batter_id(row["Name"])
+            event_type, batter = "home_run", {"id": batter_id, "fullName": _feed_name(row["Name"])}
+            players[f"ID{batter_id}"] = {"id": batter_id, "fullName": batter["fullName"], "lastFirstName": str(row["Name"])}
+            half_inning = "bottom" if str(row["Team"]) == home else "top"
+        else:
+            event_type = rng.choice(["strikeout", "field_out", "single", "walk", "double"])
+            batter = {"id": 600000 + rng.randrange(99999), "fullName": f"Player {rng.randrange(1000)}"}
+            half_inning = rng.choice(["top", "bottom"])
+        plays.append({"result": {"eventType": event_type}, "about": {"atBatIndex": at_bat, "halfInning": half_inning},
+                      "matchup": {"batter": batter}, "playEvents": pitches})
+    game_date = pd.Timestamp(first["Date"]).strftime("%Y-%m-%d") if first is not None else None
+    return {"gamePk": int(game_pk),
+            "gameData": {"game": {"pk": int(game_pk)}, "status": {"abstractGameState": "Final"},
+                         "datetime": {"officialDate": game_date},
+                         "teams": {"home": {"abbreviation": home}, "away": {"abbreviation": away}},
+                         "players": players},
+            "liveData": {"plays": {"allPlays": plays}}}
+
+def synthetic_clip(play_id, size_kb=512):
+    """Deterministic bytes standing in for a clip (content is never decoded by the download stage)."""
+    seed = uuid.UUID(str(play_id)).bytes if len(str(play_id)) == 36 else str(play_id).encode("utf-8")
+    block = (seed * (4096 // len(seed) + 1))[:4096]
+    return block * (size_kb * 1024 // 4096)
+
+def load_recorded(directory, suffix):
+    """Returns {name: bytes} for the recordings in directory whose file names end with suffix."""
+    recorded = {}
+    if not os.path.isdir(directory):
+        return recorded
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(suffix):
+            opener = gzip.open if name.endswith(".gz") else open
+            with opener(os.path.join(directory, name), "rb") as f:
+                recorded[name[:-len(suffix)]] = f.read()
+    return recorded
+
+class FixtureSet:
+    """
+    Everything the mock server replays, built from a slice of the home run table.
+
+    Recordings under FIXTURES_DIR (search/<date>.html, feeds/<gamePk>.json.gz,
+    sporty_videos/<playId>.html) take precedence; anything not recorded is
+    synthesized from the table rows, so the stages find the same home runs
+    they would find live.
+    """
+    def __init__(self, df, padding_kb=150, filler_plays=75, clip_kb=512):
+        self.df = df
+        self.padding_kb = padding_kb
+        self.filler_plays = filler_plays
+        self.clip_kb = clip_kb
+        self.dates = sorted(df["Date"].dt.strftime("%Y-%m-%d").unique())
+        self.recorded_search = {k: v.decode("utf-8") for k, v in load_recorded(SEARCH_FIXTURES_DIR, ".html").items()}
+        self.recorded_feeds = load_recorded(FEED_FIXTURES_DIR, ".json.gz")
+        self.recorded_sporty = load_sporty_fixtures()
+        self._cache = {}
+
+    def _memo(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def search_page(self, day, end=None, row_cap=None):
+        """Results page for the inclusive window day..end (one day by default), truncated to row_cap rows."""
+        end = end or day
+        if day == end and day in self.recorded_search:
+            return self.recorded_search[day]
+        def build():
+            dates = self.df["Date"].dt.strftime("%Y-%m-%d")
+            rows = self.df[(dates >= day) & (dates <= end)].copy()
+            rows["Date"] = rows["Date"].dt.strftime("%Y-%m-%d")
+            return synthetic_search_page(rows.head(row_cap) if row_cap else rows, self.padding_kb, seed=len(rows))
+        return self._memo(("search", day, end, row_cap), build)
+
+    def search_csv(self, day, end=None, row_cap=None):
+        """CSV export for the inclusive window day..end, truncated to row_cap home runs."""
+        end = end or day
+        def build():
+            dates = self.df["Date"].dt.strftime("%Y-%m-%d")
+            window = self.df[(dates >= day) & (dates <= end)]
+            games, remaining = [], row_cap if row_cap else len(window)
+            for game_pk in window["gamePk"].unique():
+                rows = self.df[self.df["gamePk"] == game_pk]  # the feed's rows, so atBatIndex agrees with it
+                at_bats = _hr_at_bats(rows, self.filler_plays, int(game_pk))
+                keep = [i for i, index in enumerate(rows.index) if index in window.index][:remaining]
+                if keep:
+                    games.append((rows.iloc[keep], [at_bats[i] for i in keep]))
+                    remaining -= len(keep)
+            return synthetic_search_csv(games, seed=len(window)).encode("utf-8")
+        return self._memo(("csv", day, end, row_cap), build)
+
+    def feed(self, game_pk):
+        """Feed JSON as bytes, or None for an unknown game."""
+        if str(game_pk) in self.recorded_feeds:
+            return self.recorded_feeds[str(game_pk)]
+        rows = self.df[self.df["gamePk"] == int(game_pk)]
+        if rows.empty:
+            return None
+        return self._memo(("feed", game_pk),
+                          lambda: json.dumps(synthetic_feed(game_pk, rows, self.filler_plays, seed=int(game_pk))).encode("utf-8"))
+
+    def sporty_page(self, play_id, clip_url):
+        if play_id in self.recorded_sporty:
+            return self.recorded_sporty[play_id]
+        rows = self.df[self.df["playId"] == play_id]
+        if rows.empty:
+            return None
+        x30 = rows["x/30 ballparks"].iloc[0]
+        return self._memo(("sporty", play_id),
+                          lambda: synthetic_sporty_page(play_id, 0 if pd.isna(x30) else int(x30),
+                                                        self.padding_kb, seed=len(play_id), clip_url=clip_url))
+
+    def clip(self, play_id):
+        return self._memo(("clip", play_id), lambda: synthetic_clip(play_id, self.clip_kb))
@@ -0,0 +1,126 @@
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+_FEED_PATH_RE = re.compile(r"^/api/v1\.1/game/(\d+)/feed/live$")
+_CLIP_PATH_RE = re.compile(r"^/clips/([\w-]+)\.mp4$")
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)$")
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    """Replays a FixtureSet under the Savant, statsapi and clip URL layouts."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.count("requests")
+        latency = server.latency + random.uniform(0, server.jitter)
+        if latency:
+            time.sleep(latency)
+        if server.throttle_rate and random.random() < server.throttle_rate:
+            server.count("throttled")
+            self._send(429, b"", headers={"Retry-After": str(server.retry_after)})
+            return
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        fixtures = server.fixtures
+        if url.path == "/statcast_search/csv":
+            day = query.get("game_date_gt", [""])[0]
+            end = query.get("game_date_lt", [day])[0]
+            self._send(200, fixtures.search_csv(day, end, server.search_row_cap), "text/csv; charset=utf-8")
+        elif url.path == "/statcast_search":
+            day = query.get("game_date_gt", [""])[0]
+            end = query.get("game_date_lt", [day])[0]
+            page = fixtures.search_page(day, end, server.search_row_cap)
+            self._send(200, page.encode("utf-8"), "text/html; charset=utf-8")
+        elif url.path == "/sporty-videos":
+            play_id = query.get("playId", [""])[0]
+            page = fixtures.sporty_page(play_id, f"{server.base_url}/clips/{play_id}.mp4")
+            if page is None:
+                self._send(404, b"")
+            else:
+                self._send(200, page.encode("utf-8"), "text/html; charset=utf-8")
+        elif _FEED_PATH_RE.match(url.path):
+            feed = fixtures.feed(_FEED_PATH_RE.match(url.path).group(1))
+            if feed is None:
+                self._send(404, b"")
+            else:
+                self._send(200, feed, "application/json")
+        elif _CLIP_PATH_RE.match(url.path):
+            self._send_clip(fixtures.clip(_CLIP_PATH_RE.match(url.path).group(1)))
+        else:
+            self._send(404, b"")
+
+    def _send_clip(self, data):
+        match = _RANGE_RE.match(self.headers.get("Range", ""))
+        if not match:
+            self._send(200, data, "video/mp4")
+            return
+        start = int(match.group(1))
+        end = min(int(match.group(2)), len(data) - 1) if match.group(2) else len(data) - 1
+        if start >= len(data):
+            self._send(416, b"", headers={"Content-Range": f"bytes */{len(data)}"})
+            return
+        self._send(206, data[start:end + 1], "video/mp4", {"Content-Range": f"bytes {start}-{end}/{len(data)}"})
+
+    def _send(self, status, body, content_type="text/plain", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class MockApiServer(ThreadingHTTPServer):
+    """
+    Local stand-in for baseballsavant.mlb.com, statsapi.mlb.com and the clip CDN.
+
+    Every response is delayed by `latency` plus up to `jitter` seconds, and a
+    `throttle_rate` fraction of requests is answered with 429 and a
+    Retry-After of `retry_after` seconds, so backoff and the adaptive rate
+    limiter are exercised the way the live hosts exercise them. Search results
+    are truncated at `search_row_cap` rows, like Savant's own cap.
+    """
+    daemon_threads = True
+
+    def __init__(self, fixtures, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, throttle_rate=0.0, retry_after=1,
+                 search_row_cap=None):
+        super().__init__((host, port), MockApiHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.search_row_cap = search_row_cap
+        self.base_url = f"http://{host}:{self.server_address[1]}"
+        self.stats = {"requests": 0, "throttled": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="mock-api", daemon=True).start()
+        return self
+
+    def url_templates(self):
+        """Replacements for the stages' URL constants, pointing at this server."""
+        return {
+            "search": (f"{self.base_url}/statcast_search?hfAB=home%5C.%5C.run%7C&hfGT=R%7C"
+                       "&hfSea={season}%7C&game_date_gt={start}&game_date_lt={end}"),
+            "csv": (f"{self.base_url}/statcast_search/csv?all=true&hfAB=home%5C.%5C.run%7C&hfGT=R%7C"
+                    "&hfSea={season}%7C&game_date_gt={start}&game_date_lt={end}&type=details"),
+            "feed": f"{self.base_url}/api/v1.1/game/{{}}/feed/live",
+            "sporty": f"{self.base_url}/sporty-videos?playId={{}}",
+        }
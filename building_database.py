@@ -2,32 +2,61 @@ import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import time
+import asyncio
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
-from functools import wraps
-
-def retry(max_retries=3, delay=2):
-    """Retry decorator to handle connection errors."""
-    def retry_decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except requests.exceptions.RequestException as e:
-                    print(f"Attempt {attempt + 1} failed: {e}")
-                    if attempt < max_retries - 1:
-                        time.sleep(delay)
-                    else:
-                        raise
-        return wrapper
-    return retry_decorator
-
-@retry(max_retries=3, delay=2)
+from urllib.parse import urlsplit
+from http_client import get_client, parse_retry_after, backoff_delay
+from hr_store import HOMERUNS_PATH, save_homeruns
+from metrics import get_logger, get_metrics, timed_stage
+from savant_csv import rows_to_table, scrape_csv_window
+from seasons import DEFAULT_SEASON, fetch_schedule, season_dates
+
+log = get_logger(__name__)
+
+# Baseball Savant home run search, one query per date window of one season
+SAVANT_SEARCH_URL = (
+    "https://baseballsavant.mlb.com/statcast_search?hfPT=&hfAB=home%5C.%5C.run%7C&hfGT=R%7C&hfPR=&hfZ=&hfStadium=&hfBBL=&hfNewZones=&hfPull=&hfC=&hfSea={season}%7C&hfSit=&player_type=batter&hfOuts=&hfOpponent=&pitcher_throws=&batter_stands=&hfSA=&game_date_gt={start}&game_date_lt={end}&hfMo=&hfTeam=&home_road=&hfRO=&position=&hfInfield=&hfOutfield=&hfInn=&hfBBT=&hfFlag=&metric_1=&group_by=name-event&min_pitches=0&min_results=0&min_pas=0&sort_col=pitches&player_event_sort=api_h_launch_speed&sort_order=desc&chk_event_release_speed=on&chk_event_launch_speed=on&chk_event_launch_angle=on&chk_event_hit_distance_sc=on#results"
+)
+
+# Savant truncates a search at this many rows; a window that comes back this full is split
+SAVANT_ROW_CAP = 25000
+# Columns of a search result row; the page repeats its header row inside the table body
+SEARCH_COLUMNS = ['Rk', 'Name', 'Team', 'Result', 'Date', 'Vs.', 'Pitch (MPH)', 'EV (MPH)', 'LA (deg)', 'Dist (ft)']
+DATE_CELL = SEARCH_COLUMNS.index('Date')
+
 def fetch_webpage(url, headers):
-    """Fetch webpage content with retries."""
-    response = requests.get(url, headers=headers, timeout=10)
-    response.raise_for_status()  # Raise HTTPError for bad responses
-    return response
+    """Fetch webpage content through the shared client (rate limited, with retries)."""
+    return get_client().get(url, headers=headers, timeout=10)
+
+def build_search_url(start_date, end_date=None):
+    """Builds the Savant search URL for a date (or inclusive date window) of the season start_date falls in."""
+    end_date = end_date or start_date
+    return SAVANT_SEARCH_URL.format(season=start_date.year, start=start_date.strftime("%Y-%m-%d"),
+                                    end=end_date.strftime("%Y-%m-%d"))
+
+def parse_search_results(html):
+    """
+    Extracts the non-blank rows of the #search_results table.
+
+    Returns None if the table is missing from the page.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find("table", {"id": "search_results"})  # Adjust ID or class based on inspection
+    if not table:
+        return None
+
+    rows = []
+    for tr in table.find("tbody").find_all("tr"):
+        cells = [td.text.strip() for td in tr.find_all("td")]
+
+        # Skip blank rows
+        if all(cell == '' for cell in cells):
+            continue
+
+        rows.append(cells)
+    return rows
 
 def scrape_baseball_savant_table(url, all_data, headers):
     """
@@ -39,84 +68,307 @@ def scrape_baseball_savant_table(url, all_data, headers):
     """
     try:
         # Fetch the webpage content
-        print(f"Fetching webpage content for {url}...")
+        log.debug("Fetching webpage content for %s...", url)
         response = fetch_webpage(url, headers)
-        print("Page fetched successfully. Parsing content...")
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Locate the table containing home run data
-        table = soup.find("table", {"id": "search_results"})  # Adjust ID or class based on inspection
-        if not table:
-            print("Table not found on the page.")
+        log.debug("Page fetched successfully. Parsing content...")
+        rows = parse_search_results(response.text)
+        if rows is None:
+            log.warning("Table not found on the page %s.", url)
             return all_data
-        
-        print("Table found. Extracting data...")
-        
-        # Extract rows from the table body
-        rows = []
-        for tr in table.find("tbody").find_all("tr"):
-            cells = [td.text.strip() for td in tr.find_all("td")]
-            
-            # Skip blank rows
-            if all(cell == '' for cell in cells):
-                continue
-            
-            rows.append(cells)
-        
+
         # Append rows to all_data list
         all_data.extend(rows)
         
         return all_data
 
     except requests.exceptions.RequestException as e:
-        print(f"Failed to scrape data due to connection error: {e}")
+        log.error("Failed to scrape data due to connection error: %s", e)
         return all_data
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        log.exception("An unexpected error occurred: %s", e)
         return all_data
 
-def main():
-    # Date range
-    start_date = date(2025, 3, 27)
-    end_date = date(2025, 8, 27)
-    delta = end_date - start_date
+def scheduled_game_counts(start_date, end_date, schedule_csv=None):
+    """
+    {date: games scheduled} for the dates in [start_date, end_date] that have games, in date order.
+
+    Reads the schedule of start_date's season unless schedule_csv is given.
+    """
+    schedule = pd.read_csv(schedule_csv or fetch_schedule(start_date.year), usecols=["date"])
+    dates = pd.to_datetime(schedule["date"]).dt.date
+    dates = dates[(dates >= start_date) & (dates <= end_date)]
+    return dict(sorted(dates.value_counts().items()))
+
+def _row_date(row):
+    if isinstance(row, dict):  # a savant_csv row, already typed
+        return row.get('Date')
+    try:
+        return pd.to_datetime(row[DATE_CELL], format="mixed").date()
+    except (IndexError, ValueError, TypeError):
+        return None  # a repeated header row or a malformed row
+
+def check_window(rows, game_counts, row_cap=SAVANT_ROW_CAP, min_games=4):
+    """
+    Completeness check for one window's search result rows.
+
+    Args:
+        rows (list): Parsed result rows (HTML cells or savant_csv rows) for the window.
+        game_counts (dict): {date: games scheduled} for the window's game dates.
+        row_cap (int): Savant's row limit; a result this large may be truncated.
+        min_games (int): Dates with at least this many games are expected to have
+            at least one home run; an empty one means the result is incomplete.
+
+    Returns:
+        tuple: (status, detail) with status 'ok', 'capped' or 'incomplete'.
+    """
+    if len(rows) >= row_cap:
+        return "capped", f"{len(rows)} rows reached the {row_cap} row cap"
+    dates = [_row_date(row) for row in rows]
+    outside = sum(1 for day in dates if day is not None and day not in game_counts)
+    if outside:
+        return "incomplete", f"{outside} rows dated outside the window's game dates"
+    seen = set(dates)
+    empty = [day for day, games in game_counts.items() if games >= min_games and day not in seen]
+    if empty:
+        return "incomplete", f"no rows for {len(empty)} dates with games ({', '.join(map(str, empty[:3]))})"
+    return "ok", ""
+
+def _scrape_html_window(start_date, end_date, headers):
+    return scrape_baseball_savant_table(build_search_url(start_date, end_date), [], headers)
+
+def search_rows_to_table(rows):
+    """The home run table of HTML search result rows, without repeated header rows or malformed rows."""
+    rows = [row for row in rows if len(row) == len(SEARCH_COLUMNS) and _row_date(row) is not None]
+    return pd.DataFrame(rows, columns=SEARCH_COLUMNS)
+
+def scrape_adaptive(start_date, end_date, headers, schedule_csv=None, initial_days=3, max_days=31,
+                    row_cap=SAVANT_ROW_CAP, target_fill=0.5, fetch_window=None):
+    """
+    Scrapes [start_date, end_date] with multi-day search windows sized to the data.
+
+    Only dates with scheduled games are requested. A window spans a run of
+    consecutive game dates; after each accepted window the next one is sized
+    so its expected rows (at the rate seen so far) fill target_fill of the row
+    cap, at most doubling and never above max_days game dates. A window that
+    reaches the cap, or fails check_window, is halved and requested again. A
+    single date is accepted with a warning when it still looks incomplete.
+
+    fetch_window(start, end, headers) returns a window's rows; by default the
+    HTML search page is scraped (savant_csv.scrape_csv_window reads the CSV export).
+
+    Returns:
+        tuple: (rows in date order, one dict per requested window)
+    """
+    fetch_window = fetch_window or _scrape_html_window
+    game_counts = scheduled_game_counts(start_date, end_date, schedule_csv)
+    dates = list(game_counts)
+    all_data, windows = [], []
+    position, size = 0, initial_days
+    rows_seen, dates_seen = 0, 0
+    while position < len(dates):
+        window = dates[position:position + size]
+        rows = fetch_window(window[0], window[-1], headers)
+        status, detail = check_window(rows, {day: game_counts[day] for day in window}, row_cap)
+        windows.append({"start": str(window[0]), "end": str(window[-1]), "dates": len(window),
+                        "rows": len(rows), "status": status, "detail": detail})
+        if status != "ok" and len(window) > 1:
+            log.info("Window %s..%s %s (%s); halving", window[0], window[-1], status, detail)
+            size = max(1, len(window) // 2)
+            continue
+        if status != "ok":
+            log.warning("Accepting %s with a failed completeness check: %s", window[0], detail)
+
+        all_data.extend(rows)
+        position += len(window)
+        rows_seen += len(rows)
+        dates_seen += len(window)
+        rate = max(rows_seen / dates_seen, 1.0)
+        size = int(min(max_days, 2 * len(window), max(1, row_cap * target_fill // rate)))
+
+    daily = (end_date - start_date).days + 1
+    log.info("Scraped %d rows with %d requests over %d game dates (%d calendar days); %d windows retried",
+             len(all_data), len(windows), len(dates), daily, sum(w["status"] != "ok" for w in windows))
+    return all_data, windows
+
+async def fetch_webpage_async(session, url, headers, limiter, max_retries=3):
+    """
+    Async counterpart of fetch_webpage.
+
+    Paced by the shared client's token bucket for the host, so 429/Retry-After
+    responses slow down the sync and async paths alike.
+    """
+    host = urlsplit(url).hostname
+    metrics = get_metrics()
+    for attempt in range(max_retries):
+        delay = limiter.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        started = time.perf_counter()
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status in (429, 503):
+                    limiter.penalize(parse_retry_after(response.headers.get("Retry-After")))
+                response.raise_for_status()
+                limiter.reward()
+                body = await response.read()
+                metrics.record_request(host, time.perf_counter() - started, response.status, len(body), retry=attempt > 0)
+                return body.decode(response.get_encoding())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = e.status if isinstance(e, aiohttp.ClientResponseError) else type(e).__name__
+            metrics.record_request(host, time.perf_counter() - started, status, retry=attempt > 0)
+            log.warning("Attempt %d failed: %s", attempt + 1, e)
+            if attempt < max_retries - 1:
+                await asyncio.sleep(backoff_delay(attempt))
+            else:
+                raise
+
+async def _scrape_day(session, semaphore, limiter, current_date, headers):
+    """Fetches and parses one day's search page, returning its rows."""
+    url = build_search_url(current_date)
+    async with semaphore:
+        try:
+            html = await fetch_webpage_async(session, url, headers, limiter)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.error("Failed to scrape %s due to connection error: %s", current_date, e)
+            return []
+
+    # BeautifulSoup is CPU bound, keep it off the event loop
+    rows = await asyncio.get_running_loop().run_in_executor(None, parse_search_results, html)
+    if rows is None:
+        log.warning("Table not found on the page for %s.", current_date)
+        return []
+    return rows
+
+async def scrape_date_range_async(start_date, end_date, headers, concurrency=8, requests_per_second=4.0, days=None):
+    """
+    Scrapes every day between start_date and end_date (inclusive) concurrently.
+
+    Args:
+        start_date (date): First day to scrape.
+        end_date (date): Last day to scrape.
+        headers (dict): Request headers.
+        concurrency (int): Maximum number of requests in flight.
+        requests_per_second (float): Starting and maximum request rate against Savant;
+            the shared limiter drops below it when Savant throttles. None keeps its current rate.
+        days (list): The dates to scrape, e.g. only those with games; None scrapes every day, an empty list nothing.
+
+    Returns:
+        list: Scraped rows in date order, in the same layout as scrape_baseball_savant_table.
+    """
+    if days is None:
+        days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = get_client().limiter_for(SAVANT_SEARCH_URL)
+    if requests_per_second:
+        limiter.set_rate(requests_per_second)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        results = await asyncio.gather(*(_scrape_day(session, semaphore, limiter, day, headers) for day in days))
+    elapsed = time.perf_counter() - started
+
+    # Keep date order so all_data matches the sequential scrape
+    all_data = []
+    for rows in results:
+        all_data.extend(rows)
+
+    log.info("Scraped %d days / %d rows in %.1fs (%.2f days/sec, %.1f rows/sec)",
+             len(days), len(all_data), elapsed, len(days) / elapsed, len(all_data) / elapsed)
+    return all_data
+
+@timed_stage("scrape")
+def main(concurrency=None, requests_per_second=None, homeruns_path=HOMERUNS_PATH, adaptive=True,
+         schedule_csv=None, export=True, season=DEFAULT_SEASON, start_date=None, end_date=None):
+    """
+    Scrapes a season's home runs into homeruns_path.
+
+    The range runs from the season's first to its last scheduled game
+    (seasons.season_dates) unless start_date/end_date narrow it. The season's
+    schedule is fetched from statsapi the first time it is needed.
+
+    By default the range is covered with adaptive multi-day windows over the
+    dates that have games (scrape_adaptive), one after another since each
+    window is sized from the last. With adaptive=False each game date is
+    requested on its own, concurrently when concurrency is set.
+    requests_per_second sets the shared Savant rate limiter for every mode.
+
+    With export, every window is streamed from Savant's CSV export
+    (savant_csv.py), whose rows already carry gamePk, batterId, atBatIndex and
+    pitch-level fields; export=False scrapes the HTML results table instead.
+    """
+    # Date range: the season's scheduled games, optionally narrowed
+    schedule_csv = schedule_csv or fetch_schedule(season)
+    first, last = season_dates(season, schedule_csv)
+    start_date = max(start_date or first, first)
+    end_date = min(end_date or last, last)
 
     # Set up headers to mimic a browser request
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
     }
     
+    if requests_per_second:
+        get_client().limiter_for(SAVANT_SEARCH_URL).set_rate(requests_per_second)
+
     # List to store all data
     all_data = []
+    game_dates = list(scheduled_game_counts(start_date, end_date, schedule_csv))
+    fetch_window = scrape_csv_window if export else _scrape_html_window
+
+    if adaptive:
+        if concurrency:
+            log.warning("concurrency=%d is ignored: adaptive windows are requested one after another", concurrency)
+        all_data, _ = scrape_adaptive(start_date, end_date, headers, schedule_csv, fetch_window=fetch_window)
+    elif concurrency and not export:
+        # Concurrent mode: bounded in-flight requests paced by the shared rate limiter
+        all_data = asyncio.run(scrape_date_range_async(start_date, end_date, headers, concurrency, requests_per_second,
+                                                       days=game_dates))
+    elif concurrency:
+        # The CSV export streams through the shared (thread-safe) client; concurrency threads, paced by its limiter
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for rows in pool.map(lambda day: fetch_window(day, day, headers), game_dates):
+                all_data.extend(rows)
+        elapsed = time.perf_counter() - started
+        log.info("Scraped %d days / %d rows in %.1fs (%.2f days/sec, %.1f rows/sec)",
+                 len(game_dates), len(all_data), elapsed, len(game_dates) / elapsed, len(all_data) / elapsed)
+    else:
+        for current_date in game_dates:
+            # Scrape data for the current date (paced by the shared client's rate limiter)
+            all_data.extend(fetch_window(current_date, current_date, headers))
     
-    for i in range(delta.days + 1):
-        current_date = start_date + timedelta(days=i)
-        date_str = current_date.strftime("%Y-%m-%d")
-        
-        # Construct URL for the current date
-        baseball_savant_url = (
-            "https://baseballsavant.mlb.com/statcast_search?hfPT=&hfAB=home%5C.%5C.run%7C&hfGT=R%7C&hfPR=&hfZ=&hfStadium=&hfBBL=&hfNewZones=&hfPull=&hfC=&hfSea=2025%7C&hfSit=&player_type=batter&hfOuts=&hfOpponent=&pitcher_throws=&batter_stands=&hfSA=&game_date_gt=" + date_str + "&game_date_lt=" + date_str + "&hfMo=&hfTeam=&home_road=&hfRO=&position=&hfInfield=&hfOutfield=&hfInn=&hfBBT=&hfFlag=&metric_1=&group_by=name-event&min_pitches=0&min_results=0&min_pas=0&sort_col=pitches&player_event_sort=api_h_launch_speed&sort_order=desc&chk_event_release_speed=on&chk_event_launch_speed=on&chk_event_launch_angle=on&chk_event_hit_distance_sc=on#results"
-        )
-        
-        # Scrape data for the current date
-        all_data = scrape_baseball_savant_table(baseball_savant_url, all_data, headers)
-        
-        # Add a delay to avoid rate-limiting
-        time.sleep(1)
-    
-    # Convert all_data to DataFrame
+    # Convert all_data to DataFrame with the fixed columns of its source
     if all_data:
-        # Extract headers from the first row
-        headers = all_data[0]
-        
-        # Create DataFrame using the extracted headers
-        df = pd.DataFrame(all_data[1:], columns=headers)
+        df = rows_to_table(all_data) if export else search_rows_to_table(all_data)
 
-        # Save DataFrame to CSV
-        df.to_csv("2025_homeruns_running.csv", index=False)
-        print("All data successfully saved to all_home_runs_data.csv")
+        # Save DataFrame (typed; format follows the HOMERUNS_PATH extension)
+        save_homeruns(df, homeruns_path)
+        get_metrics().count("scrape", rows=len(df))
+        log.info("All data successfully saved to %s", homeruns_path)
     else:
-        print("No data was scraped.")
+        log.warning("No data was scraped.")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the home run list from Baseball Savant searches.")
+    parser.add_argument("--season", type=int, default=DEFAULT_SEASON)
+    parser.add_argument("--from", dest="start_date", type=date.fromisoformat, default=None,
+                        help="First date, YYYY-MM-DD (default: the season's first game).")
+    parser.add_argument("--to", dest="end_date", type=date.fromisoformat, default=None,
+                        help="Last date, YYYY-MM-DD (default: the season's last game).")
+    parser.add_argument("--daily", action="store_true",
+                        help="One request per game date instead of adaptive multi-day windows.")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="With --daily, scrape dates concurrently with this many requests in flight.")
+    parser.add_argument("--rps", type=float, default=None,
+                        help="Max requests per second against Savant (default: the shared client's rate).")
+    parser.add_argument("--html", action="store_true",
+                        help="Scrape the HTML results table instead of streaming the CSV export.")
+    args = parser.parse_args()
+    if args.concurrency and not args.daily:
+        parser.error("--concurrency needs --daily: adaptive windows are sized one after another")
+    main(concurrency=args.concurrency, requests_per_second=args.rps, adaptive=not args.daily, export=not args.html,
+         season=args.season, start_date=args.start_date, end_date=args.end_date)
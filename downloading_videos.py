@@ -1,39 +1,196 @@
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from progress_journal import ProgressJournal
+from http_client import backoff_delay, get_client
+from sporty_videos import fetch_sporty_page, parse_sporty_page
+from hr_store import HOMERUNS_PATH, load_homeruns, save_homeruns
+from metrics import get_logger, get_metrics, timed_stage
+from seasons import DEFAULT_SEASON, clip_folder
 
-# Load your CSV
-df = pd.read_csv("2025_homeruns_running.csv")
+log = get_logger(__name__)
 
-# Output folder for videos
-output_folder = "2025_homeruns"
-os.makedirs(output_folder, exist_ok=True)
+# Output folder for videos of the default season; other seasons use clip_folder(season)
+output_folder = clip_folder(DEFAULT_SEASON)
 
-# Base URL format
-base_url = "https://baseballsavant.mlb.com/sporty-videos?playId={}"
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_NAME = "manifest.json"
 
 def get_video_url(play_id):
-    url = base_url.format(play_id)
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
-
     # Look for the first .mp4 video link
-    video_tag = soup.find("video")
-    if video_tag and video_tag.find("source"):
-        return video_tag.find("source")["src"]
+    return parse_sporty_page(fetch_sporty_page(play_id))["video_url"]
+
+def load_manifest(folder):
+    """Returns {playId: {path, bytes, sha256, url}} for clips already downloaded into folder."""
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST_NAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+def is_complete(entry, verify_checksum=False):
+    """True if the manifest entry's file is on disk with the recorded size (and checksum, if asked)."""
+    if not entry or not os.path.exists(entry["path"]) or os.path.getsize(entry["path"]) != entry["bytes"]:
+        return False
+    return not verify_checksum or _sha256_file(entry["path"]) == entry["sha256"]
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stream_to_file(session, video_url, filename, timeout=30):
+    """
+    Streams video_url to filename in chunks, resuming a previous .part file with an HTTP Range request.
+
+    Returns:
+        tuple: (total file bytes, bytes transferred by this call, sha256 of the file).
+    """
+    part = f"{filename}.part"
+    digest = hashlib.sha256()
+    offset = 0
+    if os.path.exists(part):
+        offset = os.path.getsize(part)
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+    request_headers = {"Range": f"bytes={offset}-"} if offset else {}
+    try:
+        response = session.get(video_url, headers=request_headers, stream=True, timeout=timeout)
+    except requests.exceptions.HTTPError as e:
+        if not (offset and e.response is not None and e.response.status_code == 416):
+            raise
+        response = None  # Range starts at EOF: the part file already holds the whole clip
+
+    transferred = 0
+    if response is not None:
+        with response:
+            if offset and response.status_code != 206:
+                # Server ignored the Range header; start over
+                offset = 0
+                digest = hashlib.sha256()
+            with open(part, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    transferred += len(chunk)
+        get_metrics().add_bytes(urlsplit(video_url).hostname, transferred)
+
+    os.replace(part, filename)
+    return os.path.getsize(filename), transferred, digest.hexdigest()
+
+def download_clip(play_id, output_folder, video_url=None, max_retries=3):
+    """
+    Downloads one clip, retrying transient failures. Returns a manifest entry or None.
+
+    video_url comes from the table when the sporty-videos stage already found
+    it; otherwise (or if the stored URL stops working) the page is fetched.
+    """
+    session = get_client()
+    filename = os.path.join(output_folder, f"{play_id}.mp4")
+    for attempt in range(max_retries):
+        try:
+            video_url = video_url or get_video_url(play_id)
+            if not video_url:
+                log.warning("No video found for playId %s", play_id)
+                return None
+            size, transferred, sha256 = stream_to_file(session, video_url, filename)
+            return {"path": filename, "bytes": size, "sha256": sha256, "url": video_url, "transferred": transferred}
+        except requests.exceptions.RequestException as e:
+            log.warning("Attempt %d failed for playId %s: %s", attempt + 1, play_id, e)
+            if isinstance(e, requests.exceptions.HTTPError):
+                video_url = None  # stale clip URL, look it up again
+            if attempt < max_retries - 1:
+                time.sleep(backoff_delay(attempt))
     return None
 
-# Loop through playIds and download videos
-for i, row in df.iterrows():
-    play_id = row["playId"]
-    video_url = get_video_url(play_id)
-
-    if video_url:
-        print(f"Downloading video for playId {play_id}...")
-        video_data = requests.get(video_url).content
-        filename = os.path.join(output_folder, f"{i+1}_{play_id}.mp4")
-        with open(filename, "wb") as f:
-            f.write(video_data)
-    else:
-        print(f"⚠️ No video found for playId {play_id}")
+@timed_stage("download")
+def download_videos(homeruns_csv=HOMERUNS_PATH, output_folder=None, season=DEFAULT_SEASON,
+                    journal_path="progress/videos.jsonl", compact_every=50, max_workers=8, verify_checksum=False):
+    """
+    Downloads the clip for every home run that has no complete file yet, using a pool of workers.
+
+    Clips are streamed to {playId}.mp4 in chunks and partial files are resumed
+    with HTTP Range. manifest.json in the output folder records each clip's
+    path, size and SHA-256 keyed by playId, so completed clips are skipped on
+    rerun regardless of row order. Finished downloads are also journaled and
+    folded into the table's video_path column. The output folder defaults to
+    the season's clip_folder.
+    """
+    output_folder = output_folder or clip_folder(season)
+    # Load your CSV
+    df = load_homeruns(homeruns_csv)
+    os.makedirs(output_folder, exist_ok=True)
+    if "video_path" not in df.columns:
+        df["video_path"] = pd.Series(pd.NA, index=df.index, dtype="string")
+
+    journal = ProgressJournal(journal_path, compact_every, on_compact=lambda: save_homeruns(df, homeruns_csv, columns=["video_path"]))
+    resumed = journal.apply(df, df["playId"])
+    if resumed:
+        log.info("Resumed %d video paths from %s", resumed, journal_path)
+
+    known_urls = df["video_url"] if "video_url" in df.columns else pd.Series(pd.NA, index=df.index)
+    manifest = load_manifest(output_folder)
+    rows = df[df["playId"].notna()]
+    todo = {}
+    for i, play_id in rows["playId"].items():
+        entry = manifest.get(play_id)
+        if is_complete(entry, verify_checksum):
+            if pd.isna(df.at[i, "video_path"]):
+                df.at[i, "video_path"] = entry["path"]
+                journal.record(play_id, video_path=entry["path"])
+            continue
+        todo[play_id] = i
+    log.info("%d clips already complete, %d to download with %d workers", len(rows) - len(todo), len(todo), max_workers)
+
+    started = time.perf_counter()
+    transferred = 0
+    completed = 0
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        # Loop through playIds and download videos
+        futures = {
+            pool.submit(download_clip, play_id, output_folder, None if pd.isna(known_urls[i]) else known_urls[i]): play_id
+            for play_id, i in todo.items()
+        }
+        for future in as_completed(futures):
+            play_id = futures[future]
+            entry = future.result()
+            if entry is None:
+                continue
+            transferred += entry.pop("transferred")
+            manifest[play_id] = entry
+            df.at[todo[play_id], "video_path"] = entry["path"]
+            journal.record(play_id, video_path=entry["path"])
+            completed += 1
+            get_metrics().count("download", rows=1, nbytes=entry["bytes"])
+            if completed % compact_every == 0:
+                save_manifest(output_folder, manifest)
+                elapsed = time.perf_counter() - started
+                log.info("%d/%d clips, %.1f MB/s", completed, len(todo), transferred / 1e6 / elapsed)
+    finally:
+        # On Ctrl-C drop queued clips; in-flight ones keep their .part files for resume
+        pool.shutdown(wait=True, cancel_futures=True)
+        save_manifest(output_folder, manifest)
+        journal.compact()
+        journal.close()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    log.info("Downloaded %d clips (%.1f MB) in %.1fs, %.1f MB/s", completed, transferred / 1e6, elapsed, transferred / 1e6 / elapsed)
+
+if __name__ == "__main__":
+    download_videos()
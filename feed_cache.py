@@ -0,0 +1,205 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from http_client import get_client
+from metrics import get_logger
+from progress_journal import ProgressJournal
+
+log = get_logger(__name__)
+
+GAME_FEED_URL = "https://statsapi.mlb.com/api/v1.1/game/{}/feed/live"
+
+# Stores between index.json rewrites; each store is journaled in between, so a crash loses none
+INDEX_SAVE_EVERY = 100
+
+class FeedCache:
+    """
+    Compressed, content-addressed on-disk store for MLB Stats API game feeds.
+
+    Feeds are stored gzipped under objects/ and named by the SHA-256 of their
+    JSON bytes, so identical payloads are only kept once. index.json maps each
+    gamePk to its object, game state and size. Feeds for Final games are never
+    fetched again; feeds captured while a game was still in progress are
+    refreshed on the next fetch.
+
+    The stored byte total and the number of gamePks pointing at each object are
+    kept in memory, so a store is O(1) apart from eviction. Each store is
+    appended to index.journal right away, and folded into a rewrite of
+    index.json every INDEX_SAVE_EVERY stores and on flush(); a restart after a
+    crash replays the journal, so no stored feed is fetched again.
+    """
+    def __init__(self, cache_dir="feed_cache", max_bytes=2 * 1024 ** 3, offline=False):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        self.offline = offline
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._journal = ProgressJournal(os.path.join(cache_dir, "index.journal"), INDEX_SAVE_EVERY,
+                                        on_compact=self._write_index)
+        self.index = self._load_index()
+        self.index.update(self._journal.load())
+        self._refs = {}
+        self._bytes = 0
+        for entry in self.index.values():
+            self._hold(entry)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            log.warning("%s is corrupt, starting with an empty feed cache index.", self.index_path)
+            return {}
+
+    def _write_index(self):
+        _atomic_write(self.index_path, json.dumps(self.index).encode("utf-8"))
+
+    def _save_index(self):
+        """Rewrites index.json and empties the journal it now covers."""
+        self._journal.compact()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.json.gz")
+
+    def is_final(self, game_pk):
+        entry = self.index.get(str(game_pk))
+        return bool(entry) and entry["state"] == "Final"
+
+    def total_bytes(self):
+        return self._bytes
+
+    def _hold(self, entry):
+        """Counts one more gamePk pointing at entry's object."""
+        digest = entry["sha256"]
+        self._refs[digest] = self._refs.get(digest, 0) + 1
+        if self._refs[digest] == 1:
+            self._bytes += entry["bytes"]
+
+    def _drop(self, game_pk):
+        """Removes game_pk from the index; returns True if that deleted its object."""
+        entry = self.index.pop(game_pk)
+        digest = entry["sha256"]
+        self._refs[digest] -= 1
+        if self._refs[digest]:
+            return False
+        del self._refs[digest]
+        self._bytes -= entry["bytes"]
+        try:
+            os.remove(self._object_path(digest))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def get(self, game_pk):
+        """Returns the cached feed for game_pk, or None if it is not on disk."""
+        game_pk = str(game_pk)
+        entry = self.index.get(game_pk)
+        if not entry:
+            return None
+        try:
+            with gzip.open(self._object_path(entry["sha256"]), "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            self._drop(game_pk)
+            self._save_index()
+            return None
+        entry["last_used"] = time.time()
+        return json.loads(raw)
+
+    def path_for(self, game_pk):
+        """Path of the gzipped feed for game_pk, or None if it is not on disk (readers decompress it themselves)."""
+        entry = self.index.get(str(game_pk))
+        if not entry:
+            return None
+        path = self._object_path(entry["sha256"])
+        if not os.path.exists(path):
+            self._drop(str(game_pk))
+            self._save_index()
+            return None
+        entry["last_used"] = time.time()
+        return path
+
+    def put(self, game_pk, raw):
+        """Stores raw feed bytes for game_pk and returns the parsed feed."""
+        feed = json.loads(raw)
+        self.store(game_pk, raw, feed.get("gameData", {}).get("status", {}).get("abstractGameState", "Unknown"))
+        return feed
+
+    def store(self, game_pk, raw, state, compressed=None):
+        """
+        Stores raw feed bytes whose game state is already known, without parsing them.
+
+        compressed, when given, is gzip of raw made elsewhere (e.g. in a worker process).
+        """
+        game_pk = str(game_pk)
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, compressed or gzip.compress(raw, compresslevel=6))
+
+        entry = {
+            "sha256": digest,
+            "state": state,
+            "bytes": os.path.getsize(path),
+            "fetched_at": time.time(),
+            "last_used": time.time(),
+        }
+        self._hold(entry)
+        if game_pk in self.index:
+            self._drop(game_pk)
+        self.index[game_pk] = entry
+        self._journal.record(game_pk, **entry)
+        self.evict()
+
+    def fetch(self, game_pk, session=None, timeout=10):
+        """
+        Returns the feed for game_pk, going to the network only when needed.
+
+        Final feeds are always served from disk. In offline mode whatever is on
+        disk is returned (possibly None) and nothing is downloaded.
+        """
+        game_pk = str(game_pk)
+        if self.is_final(game_pk) or (self.offline and game_pk in self.index):
+            feed = self.get(game_pk)
+            if feed is not None:
+                return feed
+        if self.offline:
+            return None
+
+        response = (session or get_client()).get(GAME_FEED_URL.format(game_pk), timeout=timeout)
+        return self.put(game_pk, response.content)
+
+    def evict(self):
+        """Drops feeds until the store fits in max_bytes: in-progress feeds first, then least recently used."""
+        if self._bytes <= self.max_bytes:
+            return
+        order = sorted(self.index.items(), key=lambda item: (item[1]["state"] == "Final", item[1]["last_used"]))
+        for game_pk, _ in order:
+            if self._bytes <= self.max_bytes:
+                break
+            self._drop(game_pk)
+        self._save_index()
+
+    def flush(self):
+        """Persists the index, with pending stores and last-used times, so it and the eviction order survive restarts."""
+        self._save_index()
+
+def _atomic_write(path, data):
+    """Writes data to path via a temp file so a crash never leaves a partial file."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,130 @@
+import gzip
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import requests
+
+from feed_cache import GAME_FEED_URL
+from http_client import get_client
+from metrics import get_logger
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib decoder is 2-4x slower on feed documents
+    orjson = None
+
+log = get_logger(__name__)
+
+def loads(data):
+    """Decodes JSON bytes with orjson when it is installed, else the stdlib."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def _game_state(feed):
+    return feed.get("gameData", {}).get("status", {}).get("abstractGameState", "Unknown")
+
+def _extract_cached(path, extractor):
+    """Worker: decodes a gzipped cached feed and returns (state, records, None)."""
+    with gzip.open(path, "rb") as f:
+        feed = loads(f.read())
+    return _game_state(feed), extractor(feed), None
+
+def _extract_raw(raw, extractor):
+    """Worker: decodes a downloaded feed and returns (state, records, gzip of raw for the cache)."""
+    feed = loads(raw)
+    return _game_state(feed), extractor(feed), gzip.compress(raw, compresslevel=6)
+
+def extract_feeds(game_pks, feed_cache, extractor, max_workers=None, fetch_workers=8):
+    """
+    Yields (gamePk, state, records) for each game, decoding feeds in a process pool.
+
+    The full feed document is only ever decoded inside a worker process, which
+    runs extractor (a module-level function, e.g. adding_playIDs.extract_hr_events)
+    on it and sends back just its compact records plus the game state. The
+    parent never holds a parsed feed. Feeds already on disk are handed to the
+    workers by path. The others are downloaded on fetch_workers threads, paced
+    by the shared client, and passed to the workers as raw bytes. The workers
+    gzip them for the FeedCache, which the parent writes. At most 2 * max_workers
+    downloaded feeds wait for a worker at any time, so memory stays flat
+    however many games there are.
+
+    Games whose feed could not be fetched or decoded are yielded as (gamePk, None, None).
+    """
+    max_workers = max_workers or os.cpu_count() or 2
+    client = get_client()
+    cached, missing = [], []
+    for game_pk in game_pks:
+        path = feed_cache.path_for(game_pk) if feed_cache.is_final(game_pk) or feed_cache.offline else None
+        if path:
+            cached.append((game_pk, path))
+        elif feed_cache.offline:
+            yield game_pk, None, None
+        else:
+            missing.append(game_pk)
+    if missing:
+        log.info("Fetching %d game feeds with %d threads, decoding %d with %d processes",
+                 len(missing), fetch_workers, len(missing) + len(cached), max_workers)
+
+    started, decoded_bytes = time.perf_counter(), 0
+    processes = ProcessPoolExecutor(max_workers=max_workers)
+    threads = ThreadPoolExecutor(max_workers=fetch_workers)
+    pending = {}  # future -> (gamePk, "download" | raw bytes awaiting decode | None for cached)
+    downloads = iter(missing)
+    deferred = 0
+    backlog_limit = 2 * max_workers
+
+    def start_download():
+        game_pk = next(downloads, None)
+        if game_pk is not None:
+            pending[threads.submit(client.get, GAME_FEED_URL.format(game_pk), timeout=10)] = (game_pk, "download")
+
+    def raw_backlog():
+        return sum(1 for _, raw in pending.values() if isinstance(raw, bytes))
+
+    try:
+        for game_pk, path in cached:
+            pending[processes.submit(_extract_cached, path, extractor)] = (game_pk, None)
+        for _ in range(fetch_workers):
+            start_download()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                game_pk, raw = pending.pop(future)
+                if isinstance(raw, str):  # a finished download
+                    try:
+                        content = future.result().content
+                    except requests.exceptions.RequestException as e:
+                        log.warning("Error fetching game feed for %s: %s", game_pk, e)
+                        start_download()
+                        yield game_pk, None, None
+                        continue
+                    pending[processes.submit(_extract_raw, content, extractor)] = (game_pk, content)
+                    if raw_backlog() < backlog_limit:
+                        start_download()
+                    else:
+                        deferred += 1
+                    continue
+
+                if raw is not None and deferred:
+                    deferred -= 1
+                    start_download()
+                try:
+                    state, records, compressed = future.result()
+                except (ValueError, OSError, EOFError) as e:  # orjson and json decode errors are ValueErrors
+                    log.warning("Error decoding game feed %s: %s", game_pk, e)
+                    yield game_pk, None, None
+                    continue
+                if raw is not None:
+                    decoded_bytes += len(raw)
+                    feed_cache.store(game_pk, raw, state, compressed)
+                yield game_pk, state, records
+    finally:
+        threads.shutdown(wait=False, cancel_futures=True)
+        processes.shutdown(wait=True, cancel_futures=True)
+        feed_cache.flush()
+
+    elapsed = time.perf_counter() - started
+    log.info("Decoded %d feeds (%.1f MB downloaded) in %.1fs, %.1f feeds/sec", len(cached) + len(missing),
+             decoded_bytes / 1e6, elapsed, (len(cached) + len(missing)) / elapsed if elapsed else 0.0)
@@ -0,0 +1,204 @@
+import time
+
+import pandas as pd
+
+from feed_cache import FeedCache
+from feed_extract import extract_feeds
+from hr_store import HOMERUNS_PATH, load_homeruns, save_homeruns
+from metrics import get_logger, get_metrics, timed_stage
+from player_registry import batter_key
+from seasons import DEFAULT_SEASON, fetch_schedule
+from x30_model import spray_angle
+
+log = get_logger(__name__)
+
+FEED_HOMERUNS_PATH = "homeruns_feeds"  # partitioned by season/month, like hr_store.HOMERUNS_PATH
+DIFF_REPORT_PATH = "feed_diff_report.csv"
+
+# Columns of a feed-built row, in the layout of the Savant search table plus the IDs the feed carries
+FEED_COLUMNS = ['Rk', 'Name', 'Team', 'Result', 'Date', 'Vs.', 'Pitch (MPH)', 'EV (MPH)', 'LA (deg)', 'Dist (ft)',
+                'gamePk', 'playId', 'batterId', 'Spray (deg)']
+# Columns compared by the diff report, with the tolerance numeric ones must agree within
+DIFF_COLUMNS = {'Name': None, 'Team': None, 'Vs.': None, 'Date': None, 'gamePk': None,
+                'Pitch (MPH)': 0.05, 'EV (MPH)': 0.05, 'LA (deg)': 0.5, 'Dist (ft)': 0.5}
+
+def extract_hr_rows(game_feed_data):
+    """
+    One home run table row per home run play of a game feed.
+
+    The row is built from the play's last pitch: its playId and hitData, the
+    batter's "Last, First" name from gameData.players and the batting team
+    from the half inning, so no name matching or schedule join is needed.
+    Plays Statcast did not track still get a row, with empty metrics.
+    """
+    game_data = game_feed_data.get('gameData', {})
+    teams = game_data.get('teams', {})
+    away = (teams.get('away') or {}).get('abbreviation')
+    home = (teams.get('home') or {}).get('abbreviation')
+    players = game_data.get('players', {})
+    game_pk = game_data.get('game', {}).get('pk') or game_feed_data.get('gamePk')
+    game_date = game_data.get('datetime', {}).get('officialDate')
+
+    rows = []
+    for play in game_feed_data.get('liveData', {}).get('plays', {}).get('allPlays', []):
+        if play.get('result', {}).get('eventType') != 'home_run':
+            continue
+        batter = play.get('matchup', {}).get('batter', {})
+        player = players.get(f"ID{batter.get('id')}", {})
+        pitches = [event for event in play.get('playEvents', []) if event.get('isPitch') or event.get('hitData')]
+        last = pitches[-1] if pitches else {}
+        hit_data = last.get('hitData') or {}
+        coordinates = hit_data.get('coordinates') or {}
+        top = play.get('about', {}).get('halfInning') == 'top'
+        rows.append({
+            'Name': player.get('lastFirstName') or batter.get('fullName'),
+            'Team': away if top else home,
+            'Result': 'Home Run',
+            'Date': game_date,
+            'Vs.': home if top else away,
+            'Pitch (MPH)': (last.get('pitchData') or {}).get('startSpeed'),
+            'EV (MPH)': hit_data.get('launchSpeed'),
+            'LA (deg)': hit_data.get('launchAngle'),
+            'Dist (ft)': hit_data.get('totalDistance'),
+            'gamePk': game_pk,
+            'playId': last.get('playId'),
+            'batterId': batter.get('id'),
+            'Spray (deg)': round(float(spray_angle(coordinates['coordX'], coordinates['coordY'])), 1)
+                           if coordinates.get('coordX') is not None and coordinates.get('coordY') is not None else None,
+        })
+    return rows
+
+def schedule_game_pks(schedule_csv=None, start_date=None, end_date=None, season=DEFAULT_SEASON):
+    """gamePks of the schedule (the season's unless schedule_csv is given), optionally limited to an inclusive date range."""
+    schedule = pd.read_csv(schedule_csv or fetch_schedule(season), usecols=['gamePk', 'date'])
+    dates = pd.to_datetime(schedule['date'])
+    keep = pd.Series(True, index=schedule.index)
+    if start_date is not None:
+        keep &= dates >= pd.Timestamp(start_date)
+    if end_date is not None:
+        keep &= dates <= pd.Timestamp(end_date)
+    return sorted(schedule.loc[keep, 'gamePk'].astype(int).unique().tolist())
+
+def build_homeruns_from_feeds(game_pks, feed_cache_dir='feed_cache', offline=False, max_workers=8, decode_workers=None):
+    """
+    The home run table for the given games, built from their feeds alone.
+
+    Feeds are downloaded on max_workers threads and decoded in a pool of
+    decode_workers processes (see feed_extract.extract_feeds). Rows are ordered
+    like the Savant search (by date, hardest hit first) and Rk counts within
+    each date. Only games that are Final contribute rows.
+    """
+    feed_cache = FeedCache(feed_cache_dir, offline=offline)
+    rows, final, started = [], 0, time.perf_counter()
+    for game_pk, state, records in extract_feeds(game_pks, feed_cache, extract_hr_rows, decode_workers, max_workers):
+        if state != 'Final':
+            continue
+        final += 1
+        rows.extend(records)
+    log.info("Read %d final games of %d in %.1fs: %d home runs", final, len(game_pks), time.perf_counter() - started, len(rows))
+
+    df = pd.DataFrame(rows, columns=FEED_COLUMNS)
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values(['Date', 'EV (MPH)', 'playId'], ascending=[True, False, True], na_position='last').reset_index(drop=True)
+    df['Rk'] = df.groupby('Date').cumcount() + 1
+    return df
+
+def diff_report(df_feed, df_csv):
+    """
+    Row-by-row comparison of a feed-built table with an existing table, joined on playId.
+
+    Returns:
+        DataFrame: One row per playId with status 'match', 'mismatch' (and the
+        differing columns), 'feed_only' or 'csv_only'. CSV rows without a
+        playId (and untracked feed rows) are reported under their row number.
+    """
+    feed = df_feed[df_feed['playId'].notna()].drop_duplicates('playId').set_index('playId')
+    csv = df_csv[df_csv['playId'].notna()].drop_duplicates('playId').set_index('playId')
+    report = []
+    for play_id in feed.index.union(csv.index):
+        in_feed, in_csv = play_id in feed.index, play_id in csv.index
+        if not (in_feed and in_csv):
+            report.append({'playId': play_id, 'status': 'feed_only' if in_feed else 'csv_only', 'differences': ''})
+            continue
+        a, b = feed.loc[play_id], csv.loc[play_id]
+        differences = []
+        for column, tolerance in DIFF_COLUMNS.items():
+            x, y = a.get(column), b.get(column)
+            if pd.isna(x) and pd.isna(y):
+                continue
+            if pd.isna(x) or pd.isna(y):
+                differences.append(column)
+            elif column == 'Name':
+                if batter_key(str(x)) != batter_key(str(y)):
+                    differences.append(column)
+            elif column == 'Date':
+                if pd.Timestamp(x).date() != pd.Timestamp(y).date():
+                    differences.append(column)
+            elif tolerance is None:
+                if str(x) != str(y):
+                    differences.append(column)
+            elif abs(float(x) - float(y)) > tolerance:
+                differences.append(column)
+        report.append({'playId': play_id, 'status': 'mismatch' if differences else 'match',
+                       'differences': '|'.join(differences)})
+    for index in df_feed.index[df_feed['playId'].isna()]:
+        report.append({'playId': pd.NA, 'status': 'feed_only', 'differences': f'no playId (row {index})'})
+    for index in df_csv.index[df_csv['playId'].isna()]:
+        report.append({'playId': pd.NA, 'status': 'csv_only', 'differences': f'no playId (row {index})'})
+    return pd.DataFrame(report, columns=['playId', 'status', 'differences'])
+
+@timed_stage("feeds")
+def main(schedule_csv=None, homeruns_path=FEED_HOMERUNS_PATH, start_date=None, end_date=None,
+         feed_cache_dir='feed_cache', offline=False, max_workers=8, compare_path=None, report_path=DIFF_REPORT_PATH,
+         decode_workers=None, season=DEFAULT_SEASON):
+    """
+    Feed-first ingestion: builds the home run table from the schedule's game feeds.
+
+    schedule_csv defaults to the season's schedule, fetched if it is not on disk.
+
+    Each row carries gamePk, playId and batterId from the feed itself, so the
+    gamePk and playId stages have nothing left to do. With compare_path, a
+    diff report against that table is written to report_path.
+    """
+    game_pks = schedule_game_pks(schedule_csv, start_date, end_date, season)
+    df = build_homeruns_from_feeds(game_pks, feed_cache_dir, offline, max_workers, decode_workers)
+    if df.empty:
+        log.warning("No home runs were read from %d scheduled games.", len(game_pks))
+        return None
+    save_homeruns(df, homeruns_path)
+    get_metrics().count("feeds", rows=len(df))
+    log.info("Saved %d home runs to %s", len(df), homeruns_path)
+
+    if compare_path:
+        report = diff_report(df, load_homeruns(compare_path, date_from=df['Date'].min(), date_to=df['Date'].max()))
+        report.to_csv(report_path, index=False)
+        counts = report['status'].value_counts()
+        log.info("Diff against %s (%s):\n%s", compare_path, report_path, counts.to_string())
+        mismatched = report.loc[report['status'] == 'mismatch', 'differences'].str.split('|').explode()
+        if len(mismatched):
+            log.info("Mismatched columns:\n%s", mismatched.value_counts().to_string())
+    return df
+
+if __name__ == "__main__":
+    import argparse
+
+    from metrics import configure_logging
+
+    parser = argparse.ArgumentParser(description="Build the home run table directly from MLB game feeds.")
+    parser.add_argument("--season", type=int, default=DEFAULT_SEASON)
+    parser.add_argument("--schedule", default=None, help="Schedule CSV (default: the season's, fetched if missing).")
+    parser.add_argument("--out", default=FEED_HOMERUNS_PATH, help="Table to write (any hr_store format).")
+    parser.add_argument("--from", dest="start_date", default=None, help="First date, YYYY-MM-DD.")
+    parser.add_argument("--to", dest="end_date", default=None, help="Last date, YYYY-MM-DD.")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent feed downloads.")
+    parser.add_argument("--decode-workers", type=int, default=None, help="Processes decoding feeds (default: one per core).")
+    parser.add_argument("--feed-cache", default="feed_cache")
+    parser.add_argument("--offline", action="store_true", help="Only use feeds already in the cache.")
+    parser.add_argument("--compare", default=None, help=f"Existing table to diff against (e.g. {HOMERUNS_PATH}).")
+    parser.add_argument("--report", default=DIFF_REPORT_PATH)
+    parser.add_argument("--log-level", default=None)
+    args = parser.parse_args()
+
+    configure_logging(args.log_level)
+    main(args.schedule, args.out, args.start_date, args.end_date, args.feed_cache, args.offline, args.workers,
+         args.compare, args.report, args.decode_workers, args.season)
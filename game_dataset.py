@@ -0,0 +1,113 @@
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+
+from hr_query import THEMES
+from hr_store import HOMERUNS_PATH, load_homeruns
+
+# Decks kept for games in progress (one per seed and theme); older ones are shuffled again if asked for
+DECK_CACHE_SIZE = 256
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+def _valid_clip(values):
+    values = values.astype('string').str.strip()
+    return values.notna() & (values != '') & (values != 'Not Found')
+
+class GameDataset:
+    """
+    Read-only, column-oriented table of the playable home runs, shared by every game session.
+
+    Only rows with a clip and a known X/30 are kept, one numpy array per field:
+    X/30 as uint8, EV/LA/distance as float32, batter as an int32 code into
+    batter_names, and one clip reference per row (a local file when one
+    exists, otherwise the stored URL). The arrays are flagged read-only, so
+    every session reads the same memory; a session only needs integers (its
+    deck seed, its position in the deck and the card being played).
+    """
+    def __init__(self, df):
+        x30 = df['X/30'] if 'X/30' in df.columns else df['x/30 ballparks']
+        clips = pd.Series(pd.NA, index=df.index, dtype='string')
+        is_local = np.zeros(len(df), dtype=bool)
+        # The compact rendition when transcode_videos.py made one, then the downloaded clip, then the URL
+        for column in ('rendition_path', 'video_path'):
+            if column in df.columns:
+                paths = df[column].astype('string')
+                exists = paths.map(os.path.isfile, na_action='ignore').fillna(False).astype(bool)
+                take = exists & clips.isna()
+                clips[take] = paths[take]
+                is_local |= take.to_numpy()
+        if 'video_url' in df.columns:
+            urls = df['video_url'].astype('string')
+            take = clips.isna() & _valid_clip(urls)
+            clips[take] = urls[take]
+        playable = np.flatnonzero((clips.notna() & x30.notna()).to_numpy())
+
+        names = pd.Categorical(df['Name'].astype('string').iloc[playable])
+        self.batter_codes = _read_only(names.codes.astype(np.int32))
+        self.batter_names = _read_only(np.asarray(names.categories, dtype=object))
+        self.x30 = _read_only(x30.iloc[playable].astype('uint8').to_numpy())
+        self.exit_velocity = _read_only(df['EV (MPH)'].iloc[playable].to_numpy(dtype=np.float32, na_value=np.nan))
+        self.launch_angle = _read_only(df['LA (deg)'].iloc[playable].to_numpy(dtype=np.float32, na_value=np.nan))
+        self.distance = _read_only(df['Dist (ft)'].iloc[playable].to_numpy(dtype=np.float32, na_value=np.nan))
+        self.clips = _read_only(clips.iloc[playable].to_numpy(dtype=object))
+        self.clip_is_local = _read_only(is_local[playable])
+        self._themes = {}
+        # Decks of the games in progress; every rerun of a session reads its deck from here
+        self._decks = functools.lru_cache(maxsize=DECK_CACHE_SIZE)(self._shuffle)
+
+    @classmethod
+    def load(cls, path=HOMERUNS_PATH, seasons=None):
+        """The dataset of the table at path, reading only the columns it uses (and only `seasons`, if given)."""
+        columns = ['Name', 'EV (MPH)', 'LA (deg)', 'Dist (ft)', 'x/30 ballparks',
+                   'video_url', 'video_path', 'rendition_path']
+        return cls(load_homeruns(path, columns=columns, seasons=seasons))
+
+    def __len__(self):
+        return len(self.x30)
+
+    def nbytes(self):
+        """Approximate memory held by the arrays, including the clip and name strings."""
+        arrays = (self.batter_codes, self.x30, self.exit_velocity, self.launch_angle, self.distance,
+                  self.clips, self.clip_is_local, self.batter_names)
+        strings = sum(len(value) for value in self.clips if isinstance(value, str)) + \
+            sum(len(value) for value in self.batter_names)
+        return sum(array.nbytes for array in arrays) + strings
+
+    def theme_cards(self, theme):
+        """Read-only card numbers of a hr_query.THEMES deck, computed once and shared like the columns."""
+        if theme not in self._themes:
+            mask = THEMES[theme](self.x30, self.exit_velocity, self.launch_angle, self.distance)
+            self._themes[theme] = _read_only(np.flatnonzero(mask).astype(np.int32))
+        return self._themes[theme]
+
+    def deck(self, seed, theme=None):
+        """
+        The read-only shuffled card order for a game, derived from the seed instead of stored per session.
+
+        Decks are cached per (seed, theme), so reruns index into the same array
+        instead of shuffling again.
+        """
+        return self._decks(seed, theme)
+
+    def _shuffle(self, seed, theme):
+        if theme is None:
+            return _read_only(np.random.default_rng(seed).permutation(len(self)).astype(np.int32))
+        cards = self.theme_cards(theme)
+        return _read_only(cards[np.random.default_rng(seed).permutation(len(cards))])
+
+    def card(self, card):
+        """One home run as plain Python values."""
+        return {
+            'Name': self.batter_names[self.batter_codes[card]],
+            'EV (MPH)': round(float(self.exit_velocity[card]), 1),
+            'LA (deg)': round(float(self.launch_angle[card]), 1),
+            'Dist (ft)': round(float(self.distance[card]), 1),
+            'X/30': int(self.x30[card]),
+            'clip': self.clips[card],
+            'clip_is_local': bool(self.clip_is_local[card]),
+        }
@@ -0,0 +1,368 @@
+import os
+import pickle
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from hr_store import HOMERUNS_PATH, load_homeruns
+from progress_journal import SOURCE_KEY_COLUMNS, row_keys
+from seasons import schedule_path
+
+INDEX_PATH = "progress/hr_index.pkl"
+
+# Indexed dimensions: name -> table column (park, season and month are derived)
+DIMENSIONS = {"batter": "Name", "team": "Team", "opponent": "Vs.", "park": "park", "season": "season", "month": "month",
+              "gamePk": "gamePk"}
+# Dimensions whose values are integers
+INTEGER_DIMENSIONS = ("season", "gamePk")
+# Groupings kept pre-aggregated; other groupings are computed from the indexes on demand
+AGGREGATES = [("batter",), ("team",), ("opponent",), ("park",), ("season",), ("month",), ("park", "month")]
+# Columns later stages fill in on existing rows; they are part of each row's index key, so a filled-in row is re-indexed
+ENRICHED_COLUMNS = ["gamePk", "playId", "x/30 ballparks"]
+# Table columns the index reads
+INDEX_COLUMNS = list(dict.fromkeys(SOURCE_KEY_COLUMNS + ENRICHED_COLUMNS))
+
+# Histogram resolution for percentiles: Savant reports EV to 0.1 mph and distance to the foot, so these are exact
+EV_BIN = 0.1
+EV_BINS = 1301      # 0-130 mph
+DIST_BINS = 601     # 0-600 ft
+
+# Themed decks for the game: name -> mask over the x/30, EV, LA and distance arrays
+THEMES = {
+    "no-doubters": lambda x30, ev, la, dist: x30 == 30,
+    "wall-scrapers": lambda x30, ev, la, dist: x30 <= 5,
+    "moonshots": lambda x30, ev, la, dist: dist >= 440,
+    "lasers": lambda x30, ev, la, dist: (la <= 22) & (ev >= 105),
+    "rainbows": lambda x30, ev, la, dist: la >= 35,
+}
+
+def _park_by_game(schedule_csv):
+    """gamePk -> home team abbreviation (the park), from a schedule CSV; empty if it is missing or has no abbreviations."""
+    if not os.path.exists(schedule_csv):
+        return {}
+    try:
+        schedule = pd.read_csv(schedule_csv, usecols=["gamePk", "homeAbbrev"])
+    except ValueError:
+        return {}
+    return dict(zip(schedule["gamePk"].astype("int64"), schedule["homeAbbrev"]))
+
+class Summary:
+    """Incrementally updated count, X/30 histogram and EV/distance histograms for one group."""
+    __slots__ = ("count", "x30", "ev", "dist")
+
+    def __init__(self):
+        self.count = 0
+        self.x30 = np.zeros(31, dtype=np.int32)
+        self.ev = np.zeros(EV_BINS, dtype=np.int32)
+        self.dist = np.zeros(DIST_BINS, dtype=np.int32)
+
+    def add(self, x30, ev, dist):
+        """Adds rows given as arrays (X/30 may hold 255 for unknown; EV/distance NaN for unknown)."""
+        self.count += len(x30)
+        known = x30 <= 30
+        np.add.at(self.x30, x30[known], 1)
+        ev = ev[~np.isnan(ev)]
+        np.add.at(self.ev, np.clip(np.rint(ev / EV_BIN), 0, EV_BINS - 1).astype(np.int32), 1)
+        dist = dist[~np.isnan(dist)]
+        np.add.at(self.dist, np.clip(np.rint(dist), 0, DIST_BINS - 1).astype(np.int32), 1)
+
+    @staticmethod
+    def _percentiles(histogram, percentiles, scale):
+        cumulative = np.cumsum(histogram)
+        total = cumulative[-1]
+        if not total:
+            return [None] * len(percentiles)
+        positions = np.searchsorted(cumulative, np.asarray(percentiles) / 100 * total)
+        return [round(float(position * scale), 1) for position in positions]
+
+    def as_dict(self, percentiles=(10, 50, 90)):
+        known_x30 = int(self.x30.sum())
+        result = {"count": self.count,
+                  "x30_mean": round(float(self.x30 @ np.arange(31)) / known_x30, 2) if known_x30 else None}
+        for q, value in zip(percentiles, self._percentiles(self.ev, percentiles, EV_BIN)):
+            result[f"ev_p{q}"] = value
+        for q, value in zip(percentiles, self._percentiles(self.dist, percentiles, 1)):
+            result[f"dist_p{q}"] = value
+        result["x30_hist"] = self.x30.tolist()
+        return result
+
+class HomeRunIndex:
+    """
+    In-memory query engine over the home run table.
+
+    Columns are kept as numpy arrays (X/30 as uint8 with 255 for unknown,
+    metrics as float32, dates as datetime64[D]). Each dimension in DIMENSIONS
+    has a secondary index from value to sorted row positions, so a lookup is a
+    dict hit and filters combine by intersecting small sorted arrays; date
+    ranges use a binary search over a sorted date order. The groupings in
+    AGGREGATES keep a running Summary. add_rows() appends new rows and updates
+    indexes and summaries in place, without a rebuild.
+
+    Parks come from schedule_csv when given, else from the schedule CSV of
+    each season as its first rows arrive (seasons.schedule_path; nothing is
+    downloaded, rows of a season without a schedule on disk have no park).
+    """
+    def __init__(self, schedule_csv=None):
+        self.schedule_csv = schedule_csv
+        self.park_by_game = _park_by_game(schedule_csv) if schedule_csv else {}
+        self.park_seasons = set()
+        self.keys = {}
+        self.columns = {name: [] for name in ("Name", "Team", "Vs.", "park", "season", "month", "gamePk", "playId")}
+        self.date = np.empty(0, dtype="datetime64[D]")
+        self.x30 = np.empty(0, dtype=np.uint8)
+        self.ev = np.empty(0, dtype=np.float32)
+        self.la = np.empty(0, dtype=np.float32)
+        self.dist = np.empty(0, dtype=np.float32)
+        self.indexes = {dimension: {} for dimension in DIMENSIONS}
+        self.summaries = {grouping: defaultdict(Summary) for grouping in AGGREGATES}
+        self._date_order = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.x30)
+
+    def __getstate__(self):
+        # Each dimension's index is pickled as one array (values, positions, bounds) instead of one per value
+        state = dict(self.__dict__)
+        state["indexes"] = {}
+        for dimension, index in self.indexes.items():
+            rows = list(index.values())
+            bounds = np.cumsum([0] + [len(positions) for positions in rows])
+            state["indexes"][dimension] = (list(index), np.concatenate(rows) if rows else np.empty(0, dtype=np.int32), bounds)
+        return state
+
+    def __setstate__(self, state):
+        packed = state.pop("indexes")
+        self.__dict__.update(state)
+        self.indexes = {dimension: dict(zip(values, np.split(positions, bounds[1:-1])))
+                        for dimension, (values, positions, bounds) in packed.items()}
+
+    def add_rows(self, df, keys=None):
+        """Appends rows (hr_store schema) not indexed yet; returns how many were added. keys: index_keys(df), if known."""
+        keys = (index_keys(df) if keys is None else keys).to_numpy(dtype=object)
+        new = np.fromiter((key not in self.keys for key in keys), dtype=bool, count=len(keys))
+        df, keys = df[new], keys[new]
+        if df.empty:
+            return 0
+        start = len(self)
+        positions = np.arange(start, start + len(df), dtype=np.int32)
+        self.keys.update(zip(keys, positions.tolist()))
+
+        timestamps = pd.to_datetime(df["Date"])
+        dates = timestamps.to_numpy().astype("datetime64[D]")
+        seasons = timestamps.dt.year.tolist()
+        if self.schedule_csv is None:
+            for season in set(seasons) - self.park_seasons:
+                self.park_by_game.update(_park_by_game(schedule_path(season)))
+                self.park_seasons.add(season)
+        game_pks = df["gamePk"].astype("Int64") if "gamePk" in df.columns else pd.Series(pd.NA, index=df.index, dtype="Int64")
+        values = {
+            "Name": df["Name"].astype(str).tolist(),
+            "Team": df["Team"].astype(str).tolist(),
+            "Vs.": df["Vs."].astype(str).tolist(),
+            "park": [None if pd.isna(pk) else self.park_by_game.get(int(pk)) for pk in game_pks],
+            "season": seasons,
+            "month": timestamps.dt.strftime("%Y-%m").tolist(),
+            "gamePk": [None if pd.isna(pk) else int(pk) for pk in game_pks],
+            "playId": df["playId"].astype("string").tolist() if "playId" in df.columns else [None] * len(df),
+        }
+        for column, new_values in values.items():
+            self.columns[column].extend(new_values)
+
+        x30 = df["x/30 ballparks"].astype("float64").fillna(255).to_numpy().astype(np.uint8) \
+            if "x/30 ballparks" in df.columns else np.full(len(df), 255, dtype=np.uint8)
+        ev = df["EV (MPH)"].to_numpy(dtype=np.float32, na_value=np.nan)
+        dist = df["Dist (ft)"].to_numpy(dtype=np.float32, na_value=np.nan)
+        self.date = np.concatenate([self.date, dates])
+        self.x30 = np.concatenate([self.x30, x30])
+        self.ev = np.concatenate([self.ev, ev])
+        self.la = np.concatenate([self.la, df["LA (deg)"].to_numpy(dtype=np.float32, na_value=np.nan)])
+        self.dist = np.concatenate([self.dist, dist])
+        self._date_order = np.argsort(self.date, kind="stable").astype(np.int32)
+
+        for dimension, column in DIMENSIONS.items():
+            groups = defaultdict(list)
+            for position, value in zip(positions.tolist(), values[column]):
+                if value is not None:
+                    groups[value].append(position)
+            index = self.indexes[dimension]
+            for value, rows in groups.items():
+                index[value] = np.concatenate([index.get(value, np.empty(0, dtype=np.int32)), np.asarray(rows, dtype=np.int32)])
+
+        for grouping, summaries in self.summaries.items():
+            groups = defaultdict(list)
+            for i, group in enumerate(zip(*(values[DIMENSIONS[dimension]] for dimension in grouping))):
+                if None not in group:
+                    groups[group if len(group) > 1 else group[0]].append(i)
+            for group, rows in groups.items():
+                rows = np.asarray(rows)
+                summaries[group].add(x30[rows], ev[rows], dist[rows])
+        return len(df)
+
+    def positions(self, date_from=None, date_to=None, x30_min=None, x30_max=None, ev_min=None, dist_min=None,
+                  theme=None, **dimensions):
+        """
+        Row positions matching every filter, in table order.
+
+        Args:
+            **dimensions: Exact values for any of DIMENSIONS, e.g. batter="Judge, Aaron", park="COL".
+            date_from, date_to: Inclusive date bounds ('YYYY-MM-DD' or date-like).
+            x30_min, x30_max, ev_min, dist_min: Numeric bounds.
+            theme (str): Name of a THEMES deck.
+        """
+        result = None
+        for dimension, value in dimensions.items():
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension {dimension!r}; expected one of {', '.join(DIMENSIONS)}")
+            if value is None:
+                continue
+            rows = self.indexes[dimension].get(int(value) if dimension in INTEGER_DIMENSIONS else value,
+                                               np.empty(0, dtype=np.int32))
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        if date_from is not None or date_to is not None:
+            sorted_dates = self.date[self._date_order]
+            lo = np.searchsorted(sorted_dates, np.datetime64(date_from, "D"), "left") if date_from is not None else 0
+            hi = np.searchsorted(sorted_dates, np.datetime64(date_to, "D"), "right") if date_to is not None else len(self)
+            rows = np.sort(self._date_order[lo:hi])
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        if result is None:
+            result = np.arange(len(self), dtype=np.int32)
+
+        mask = np.ones(len(result), dtype=bool)
+        if x30_min is not None:
+            mask &= (self.x30[result] >= x30_min) & (self.x30[result] <= 30)
+        if x30_max is not None:
+            mask &= self.x30[result] <= x30_max
+        if ev_min is not None:
+            mask &= self.ev[result] >= ev_min
+        if dist_min is not None:
+            mask &= self.dist[result] >= dist_min
+        if theme is not None:
+            known = self.x30[result] <= 30
+            mask &= known & THEMES[theme](self.x30[result], self.ev[result], self.la[result], self.dist[result])
+        return result[mask]
+
+    def rows(self, positions):
+        """The given rows as a DataFrame."""
+        x30 = pd.array(self.x30[positions], dtype="UInt8")
+        x30[self.x30[positions] > 30] = pd.NA
+        return pd.DataFrame({
+            "Date": self.date[positions],
+            **{column: [self.columns[column][i] for i in positions] for column in ("Name", "Team", "Vs.", "park", "gamePk", "playId")},
+            "EV (MPH)": self.ev[positions].astype(np.float64).round(1),
+            "LA (deg)": self.la[positions].astype(np.float64).round(1),
+            "Dist (ft)": self.dist[positions].astype(np.float64).round(1),
+            "x/30 ballparks": x30,
+        })
+
+    def find(self, **filters):
+        return self.rows(self.positions(**filters))
+
+    def summary(self, by=("batter",), **filters):
+        """
+        {group: Summary.as_dict()} for a grouping.
+
+        Unfiltered summaries of an AGGREGATES grouping come straight from the
+        running totals; anything else is aggregated from the matching rows.
+        """
+        by = tuple(by)
+        if not any(value is not None for value in filters.values()) and by in self.summaries:
+            return {group: summary.as_dict() for group, summary in self.summaries[by].items()}
+        summaries = defaultdict(Summary)
+        groups = defaultdict(list)
+        for position in self.positions(**filters).tolist():
+            group = tuple(self.columns[DIMENSIONS[dimension]][position] for dimension in by)
+            if None not in group:
+                groups[group if len(group) > 1 else group[0]].append(position)
+        for group, rows in groups.items():
+            rows = np.asarray(rows)
+            summaries[group].add(self.x30[rows], self.ev[rows], self.dist[rows])
+        return {group: summary.as_dict() for group, summary in summaries.items()}
+
+    def deck(self, theme, seed=None):
+        """Shuffled playIds of a themed deck, for the game."""
+        positions = self.positions(theme=theme)
+        positions = positions[[self.columns["playId"][i] is not None for i in positions]] if len(positions) else positions
+        order = np.random.default_rng(seed).permutation(len(positions))
+        return [self.columns["playId"][i] for i in positions[order]]
+
+def index_keys(df):
+    """row_keys(df) extended with a digest of the row's ENRICHED_COLUMNS, so the key changes when they are filled in."""
+    enriched = [column for column in ENRICHED_COLUMNS if column in df.columns]
+    if not enriched:
+        return row_keys(df)
+    digests = pd.util.hash_pandas_object(df[enriched], index=False).to_numpy()
+    return row_keys(df) + pd.Series([f":{digest:016x}" for digest in digests.tolist()], index=df.index)
+
+def load_index(path=HOMERUNS_PATH, index_path=INDEX_PATH, schedule_csv=None, seasons=None):
+    """
+    The HomeRunIndex for the table at path, brought up to date incrementally.
+
+    Only INDEX_COLUMNS are read, and with seasons only those seasons'
+    partitions; such an index gets its own snapshot (hr_index_2024_2025.pkl).
+    A snapshot is kept at index_path. Rows that are new in the table are added
+    to it; if rows were removed or edited (their key is gone, which includes
+    gamePk, playId or x/30 being filled in later), or the snapshot predates the
+    current DIMENSIONS, it is rebuilt.
+    """
+    df = load_homeruns(path, columns=INDEX_COLUMNS, seasons=seasons)
+    if index_path and seasons:
+        root, ext = os.path.splitext(index_path)
+        index_path = f"{root}_{'_'.join(str(season) for season in sorted(set(seasons)))}{ext}"
+    keys = index_keys(df)
+    index = None
+    if index_path and os.path.exists(index_path):
+        with open(index_path, "rb") as f:
+            index = pickle.load(f)
+        if set(index.indexes) != set(DIMENSIONS) or not index.keys.keys() <= set(keys.tolist()):
+            index = None
+    if index is None:
+        index = HomeRunIndex(schedule_csv)
+    if index.add_rows(df, keys) and index_path:
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        with open(f"{index_path}.tmp", "wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{index_path}.tmp", index_path)
+    return index
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Query the home run table through its secondary indexes.")
+    parser.add_argument("command", choices=["find", "summary", "deck"])
+    parser.add_argument("--path", default=HOMERUNS_PATH)
+    parser.add_argument("--seasons", type=int, nargs="*", default=None, help="Only index these seasons' partitions.")
+    for dimension in DIMENSIONS:
+        parser.add_argument(f"--{dimension}", default=None)
+    parser.add_argument("--from", dest="date_from", default=None, help="First date, YYYY-MM-DD.")
+    parser.add_argument("--to", dest="date_to", default=None, help="Last date, YYYY-MM-DD.")
+    parser.add_argument("--x30-min", type=int, default=None)
+    parser.add_argument("--x30-max", type=int, default=None)
+    parser.add_argument("--ev-min", type=float, default=None)
+    parser.add_argument("--dist-min", type=float, default=None)
+    parser.add_argument("--theme", choices=sorted(THEMES), default=None)
+    parser.add_argument("--by", action="append", choices=list(DIMENSIONS), help="Grouping for summary (repeatable).")
+    parser.add_argument("--limit", type=int, default=25)
+    args = parser.parse_args()
+
+    index = load_index(args.path, seasons=args.seasons)
+    filters = {key: getattr(args, key) for key in ("date_from", "date_to", "x30_min", "x30_max", "ev_min", "dist_min", "theme")}
+    filters.update({dimension: getattr(args, dimension) for dimension in DIMENSIONS})
+    started = time.perf_counter()
+    if args.command == "find":
+        result = index.find(**filters)
+        elapsed = time.perf_counter() - started
+        print(result.head(args.limit).to_string(index=False))
+        print(f"{len(result)} home runs in {elapsed * 1e6:.0f} µs")
+    elif args.command == "summary":
+        result = pd.DataFrame.from_dict(index.summary(args.by or ["batter"], **filters), orient="index")
+        elapsed = time.perf_counter() - started
+        result = result.drop(columns="x30_hist").sort_values("count", ascending=False)
+        print(result.head(args.limit).to_string())
+        print(f"{len(result)} groups in {elapsed * 1e6:.0f} µs")
+    else:
+        deck = index.deck(args.theme or "no-doubters")
+        elapsed = time.perf_counter() - started
+        print("\n".join(deck[:args.limit]))
+        print(f"{len(deck)} cards in {elapsed * 1e6:.0f} µs")
@@ -0,0 +1,491 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet support is optional
+    pa = None
+    pq = None
+
+from metrics import get_logger
+
+log = get_logger(__name__)
+
+# Default home run table: a directory with one file per season, split into months. Point HOMERUNS_PATH
+# at a .csv, .parquet or .sqlite file to use a single-file backend instead.
+HOMERUNS_PATH = os.environ.get("HOMERUNS_PATH", "homeruns")
+
+# The tracked CSV the partitioned table is built from the first time it is read (see migrate_legacy_csv)
+LEGACY_CSV_PATH = "2025_homeruns_running.csv"
+
+# In-memory dtypes for the home run table. Columns not listed here are passed through untouched.
+SCHEMA = {
+    'Rk': 'Int16',
+    'Name': 'category',
+    'Team': 'category',
+    'Result': 'category',
+    'Date': 'datetime64[ns]',
+    'Vs.': 'category',
+    'Pitch (MPH)': 'float32',
+    'EV (MPH)': 'float32',
+    'LA (deg)': 'float32',
+    'Dist (ft)': 'float32',
+    'Spray (deg)': 'float32',      # from the feed's hit coordinates, negative toward left field
+    'gamePk': 'Int64',
+    'gamePkCandidates': 'string',  # '|'-joined doubleheader candidates while gamePk is unresolved
+    'playId': 'string',            # stored as 16-byte binary UUIDs in Parquet and SQLite
+    'batterId': 'Int64',           # MLBAM id, filled by feed-first ingestion (feed_ingest.py) and the CSV export
+    'atBatIndex': 'Int16',         # the play's 0-based index in the game feed (savant_csv.py)
+    'pitcherId': 'Int64',
+    'Pitch Type': 'category',
+    'Spin (RPM)': 'float32',
+    'Plate X (ft)': 'float32',
+    'Plate Z (ft)': 'float32',
+    'Inning': 'UInt8',
+    'Balls': 'UInt8',
+    'Strikes': 'UInt8',
+    'Outs': 'UInt8',
+    'Stands': 'category',
+    'Throws': 'category',
+    'x/30 ballparks': 'UInt8',
+    'x30_source': 'category',      # 'savant' (scraped) or 'model' (x30_model.py estimate)
+    'video_url': 'string',
+    'video_title': 'string',
+    'video_path': 'string',
+    'rendition_path': 'string',    # low-bitrate trimmed clip from transcode_videos.py
+    'poster_path': 'string',
+}
+
+SQLITE_TABLE = "homeruns"
+
+# Partitioned layout: <root>/season=YYYY.parquet with one row group per month, and a manifest
+# holding a content digest per season file and month
+_SEASON_FILE_RE = re.compile(r"^season=(\d{4})\.parquet$")
+PARTITION_MANIFEST = "_manifest.json"
+
+def apply_schema(df):
+    """Coerces a raw home run table to SCHEMA, splitting legacy '|' gamePk values into gamePkCandidates."""
+    df = df.copy()
+    if 'gamePk' in df.columns and not pd.api.types.is_integer_dtype(df['gamePk']):
+        raw = df['gamePk'].astype('string').str.replace(r'\.0$', '', regex=True)
+        ambiguous = raw.str.contains('|', regex=False).fillna(False)
+        if ambiguous.any():
+            candidates = df['gamePkCandidates'].astype('string') if 'gamePkCandidates' in df.columns else pd.Series(pd.NA, index=df.index, dtype='string')
+            df['gamePkCandidates'] = candidates.mask(ambiguous, raw)
+            raw = raw.mask(ambiguous)
+        df['gamePk'] = raw
+
+    for column, dtype in SCHEMA.items():
+        if column not in df.columns or df[column].dtype == dtype:  # Parquet and partitions mostly arrive typed
+            continue
+        if dtype == 'datetime64[ns]':
+            df[column] = pd.to_datetime(df[column], format='mixed')
+        elif dtype in ('float32', 'Int16', 'Int64', 'UInt8'):
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+def load_homeruns(path=HOMERUNS_PATH, columns=None, seasons=None, date_from=None, date_to=None):
+    """
+    Loads the home run table from CSV, Parquet, SQLite or a partitioned directory with typed columns.
+
+    Args:
+        path (str): .csv, .parquet or .sqlite/.db file, or a partitioned directory.
+        columns (list): Optional subset of columns to read (Parquet, SQLite and
+            partitions only read those). Columns the table lacks are skipped.
+        seasons (list): Only rows of these seasons.
+        date_from, date_to: Only rows dated within this inclusive range.
+
+    A partitioned table only opens the files of the requested seasons, and
+    Parquet files only read the months (row groups) within the dates. Filtered loads are for reading: saving one to a
+    single-file backend replaces the whole file with the filtered rows.
+    """
+    kind = _storage_kind(path)
+    filtered = bool(seasons) or date_from is not None or date_to is not None
+    requested = list(columns) if columns is not None else None
+    if requested is not None and filtered and 'Date' not in requested:
+        columns = requested + ['Date']
+    if kind == 'partitioned' and not os.path.isdir(path):
+        if not migrate_legacy_csv(path) and os.path.exists(LEGACY_CSV_PATH):
+            # No pyarrow to build the partitions with: read the CSV they would hold
+            kind, path = 'csv', LEGACY_CSV_PATH
+    if kind == 'partitioned':
+        df = _load_partitions(path, columns, seasons, date_from, date_to)
+    elif kind == 'parquet':
+        _require_pyarrow()
+        df = _arrow_to_pandas(_read_parquet(path, columns, date_from, date_to))
+    elif kind == 'sqlite':
+        with sqlite3.connect(path) as conn:
+            if columns is not None:
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({SQLITE_TABLE})")}
+                columns = [column for column in columns if column in existing]
+            select = ", ".join(["row_id"] + [_quote(c) for c in columns]) if columns is not None else "*"
+            df = pd.read_sql_query(f"SELECT {select} FROM {SQLITE_TABLE} ORDER BY row_id", conn, index_col='row_id')
+        df.index.name = None
+        if 'playId' in df.columns:
+            df['playId'] = _bytes_to_uuids(df['playId'])
+    else:
+        wanted = set(columns) if columns is not None else None
+        df = pd.read_csv(path, usecols=(lambda column: column in wanted) if wanted is not None else None,
+                         encoding='utf-8')
+
+    df = apply_schema(df)
+    if (seasons or date_from is not None or date_to is not None) and 'Date' in df.columns:
+        keep = pd.Series(True, index=df.index)
+        if seasons:
+            keep &= df['Date'].dt.year.isin([int(season) for season in seasons])
+        if date_from is not None:
+            keep &= df['Date'] >= pd.Timestamp(date_from)
+        if date_to is not None:
+            keep &= df['Date'] <= pd.Timestamp(date_to)
+        df = df[keep].reset_index(drop=True)
+    if requested is not None:
+        df = df[[column for column in requested if column in df.columns]]
+    return df
+
+def save_homeruns(df, path=HOMERUNS_PATH, columns=None):
+    """
+    Saves the home run table in the format implied by the extension.
+
+    Args:
+        df (DataFrame): The table (coerced to SCHEMA before writing).
+        path (str): .csv, .parquet or .sqlite/.db file, or a partitioned directory.
+        columns (list): Hint that only these columns changed. SQLite then updates
+            just those columns in place; CSV and Parquet always rewrite the file.
+            A partitioned table rewrites only the seasons with a changed month,
+            whatever the hint, and leaves months that are not in df untouched.
+    """
+    kind = _storage_kind(path)
+    df = apply_schema(df)
+    if kind == 'partitioned':
+        _save_partitions(df, path)
+    elif kind == 'parquet':
+        _require_pyarrow()
+        _write_parquet(df, path)
+        if _SEASON_FILE_RE.match(os.path.basename(path)):
+            _refresh_partition_manifest(path, df)
+    elif kind == 'sqlite':
+        if columns and _sqlite_update_columns(df, path, columns):
+            return
+        _atomic(path, lambda tmp: _sqlite_write(df, tmp))
+    else:
+        export_csv(df, path)
+
+def export_csv(df, path):
+    """Writes the legacy CSV layout ('|'-joined gamePk for doubleheaders, plain floats)."""
+    out = df.copy()
+    if 'gamePkCandidates' in out.columns:
+        out['gamePk'] = out['gamePk'].astype('string').fillna(out['gamePkCandidates'])
+        out = out.drop(columns='gamePkCandidates')
+    if 'Date' in out.columns and pd.api.types.is_datetime64_any_dtype(out['Date']):
+        out['Date'] = out['Date'].dt.strftime('%Y-%m-%d')
+    _atomic(path, lambda tmp: out.to_csv(tmp, index=False, float_format='%.6g'))
+
+def _sqlite_write(df, path):
+    out = _with_binary_playids(df)
+    if 'Date' in out.columns:
+        out['Date'] = out['Date'].dt.strftime('%Y-%m-%d')
+    for column in out.columns:
+        if isinstance(out[column].dtype, pd.CategoricalDtype):
+            out[column] = out[column].astype(object)
+    out.index.name = 'row_id'
+    with sqlite3.connect(path) as conn:
+        out.to_sql(SQLITE_TABLE, conn, if_exists='replace', index=True, dtype={'row_id': 'INTEGER PRIMARY KEY'})
+
+def _sqlite_update_columns(df, path, columns):
+    """Updates only `columns` in an existing SQLite table; returns False if a full write is needed."""
+    if not os.path.exists(path):
+        return False
+    with sqlite3.connect(path) as conn:
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({SQLITE_TABLE})")}
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {SQLITE_TABLE}").fetchone()
+        if count != len(df) or not set(columns) <= existing:
+            return False
+        values = _with_binary_playids(df[list(columns)])
+        params = [
+            tuple(None if pd.isna(v) else (v.item() if isinstance(v, np.generic) else v) for v in row) + (int(index),)
+            for index, row in zip(values.index, values.itertuples(index=False))
+        ]
+        assignments = ", ".join(f"{_quote(c)} = ?" for c in columns)
+        conn.executemany(f"UPDATE {SQLITE_TABLE} SET {assignments} WHERE row_id = ?", params)
+    return True
+
+def _with_binary_playids(df):
+    if 'playId' not in df.columns:
+        return df
+    out = df.copy()
+    out['playId'] = out['playId'].astype(object).map(lambda s: uuid.UUID(s).bytes, na_action='ignore')
+    return out
+
+def _bytes_to_uuid(value):
+    return str(uuid.UUID(bytes=value)) if isinstance(value, (bytes, bytearray)) else value
+
+_UUID_HEX_POSITIONS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+
+def _uuid_strings(buffer):
+    """Canonical UUID strings of a buffer of concatenated 16-byte UUIDs, as an object array."""
+    hexed = np.frombuffer(buffer.hex().encode('ascii'), dtype='S1').reshape(-1, 32)
+    chars = np.full((len(hexed), 36), b'-', dtype='S1')
+    chars[:, _UUID_HEX_POSITIONS] = hexed
+    return chars.view('S36')[:, 0].astype('U36').astype(object)
+
+def _bytes_to_uuids(values):
+    """_bytes_to_uuid over a Series, vectorized when every value is 16 bytes (SQLite)."""
+    present = values.notna()
+    raw = values[present]
+    try:
+        buffer = b''.join(raw)
+    except TypeError:  # already strings
+        return values.map(_bytes_to_uuid, na_action='ignore')
+    if len(buffer) != 16 * len(raw):
+        return values.map(_bytes_to_uuid, na_action='ignore')
+    out = np.full(len(values), None, dtype=object)
+    out[present.to_numpy()] = _uuid_strings(buffer)
+    return pd.Series(out, index=values.index)
+
+def _arrow_playids(column):
+    """
+    UUID strings of a binary playId column, read straight from its Arrow buffers.
+
+    Returns None unless every value is null or 16 bytes; the caller then converts
+    the column value by value.
+    """
+    array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if not pa.types.is_binary(array.type):
+        return None
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int32)[array.offset:array.offset + len(array) + 1]
+    valid = array.is_valid().to_numpy(zero_copy_only=False)
+    lengths = np.diff(offsets)
+    if not ((lengths[valid] == 16).all() and (lengths[~valid] == 0).all()):
+        return None
+    out = np.full(len(array), None, dtype=object)
+    if valid.any():
+        out[valid] = _uuid_strings(array.buffers()[2].to_pybytes()[offsets[0]:offsets[-1]])
+    return out
+
+def _arrow_to_pandas(table):
+    """A Parquet table as a DataFrame, with binary playIds turned into UUID strings."""
+    if 'playId' not in table.column_names:
+        return table.to_pandas()
+    play_ids = _arrow_playids(table.column('playId'))
+    if play_ids is None:
+        df = table.to_pandas()
+        df['playId'] = _bytes_to_uuids(df['playId'])
+        return df
+    position = table.column_names.index('playId')
+    df = table.remove_column(position).to_pandas()
+    df.insert(position, 'playId', play_ids)
+    return df
+
+def migrate_legacy_csv(path=HOMERUNS_PATH, csv_path=LEGACY_CSV_PATH):
+    """
+    Builds a missing partitioned table at path from the legacy CSV; returns True if it did.
+
+    The partitions are generated, not committed, so a fresh checkout gets them
+    on the first read. Nothing happens if the table exists, the CSV is missing
+    or pyarrow is not installed.
+    """
+    if _storage_kind(path) != 'partitioned' or os.path.isdir(path) or not os.path.exists(csv_path) or pa is None:
+        return False
+    log.info("Building %s from %s", path, csv_path)
+    _save_partitions(apply_schema(pd.read_csv(csv_path, encoding='utf-8')), path)
+    return True
+
+def season_table(path, season):
+    """The part of the table at path holding one season: its season file if partitioned, else path itself."""
+    return partition_path(path, season) if _storage_kind(path) == 'partitioned' else path
+
+def partition_path(root, season):
+    """The Parquet file holding one season of a partitioned table at root."""
+    return os.path.join(root, f"season={int(season)}.parquet")
+
+def list_partitions(root):
+    """{season: file} for every season stored under root."""
+    if not os.path.isdir(root):
+        return {}
+    partitions = {}
+    for name in sorted(os.listdir(root)):
+        match = _SEASON_FILE_RE.match(name)
+        if match:
+            partitions[int(match.group(1))] = os.path.join(root, name)
+    return partitions
+
+def available_seasons(path=HOMERUNS_PATH):
+    """Seasons stored in a partitioned table (empty for single-file backends or a missing table)."""
+    if _storage_kind(path) != 'partitioned':
+        return []
+    migrate_legacy_csv(path)
+    return sorted(list_partitions(path))
+
+def _row_groups_within(parquet, date_from, date_to):
+    """Row groups (months) whose Date statistics overlap [date_from, date_to]; None for all of them."""
+    date = parquet.schema_arrow.get_field_index('Date')
+    if (date_from is None and date_to is None) or date < 0:
+        return None
+    first = pd.Timestamp(date_from) if date_from is not None else None
+    last = pd.Timestamp(date_to) if date_to is not None else None
+    groups = []
+    for i in range(parquet.metadata.num_row_groups):
+        statistics = parquet.metadata.row_group(i).column(date).statistics
+        if statistics is not None and statistics.has_min_max and (
+                (first is not None and pd.Timestamp(statistics.max) < first) or
+                (last is not None and pd.Timestamp(statistics.min) > last)):
+            continue
+        groups.append(i)
+    return groups
+
+def _read_parquet(path, columns=None, date_from=None, date_to=None):
+    """Arrow table of a Parquet file, reading only `columns` (those it has) and the months within the dates."""
+    parquet = pq.ParquetFile(path)
+    names = parquet.schema_arrow.names
+    wanted = None if columns is None else [column for column in columns if column in names]
+    groups = _row_groups_within(parquet, date_from, date_to)
+    return parquet.read(columns=wanted) if groups is None else parquet.read_row_groups(groups, columns=wanted)
+
+def _write_parquet(df, path):
+    """Writes df to one Parquet file with a row group per run of same-month rows, so date reads can skip months."""
+    table = pa.Table.from_pandas(_with_binary_playids(df), preserve_index=False)
+    if 'Date' not in df.columns or len(df) == 0:
+        _atomic(path, lambda tmp: pq.write_table(table, tmp, compression='zstd'))
+        return
+    months = (df['Date'].dt.year * 12 + df['Date'].dt.month).to_numpy(dtype='float64', na_value=np.nan)
+    bounds = [0] + (np.flatnonzero(months[1:] != months[:-1]) + 1).tolist() + [len(df)]
+
+    def write(tmp):
+        with pq.ParquetWriter(tmp, table.schema, compression='zstd') as writer:
+            for start, stop in zip(bounds, bounds[1:]):
+                writer.write_table(table.slice(start, stop - start))
+    _atomic(path, write)
+
+def _load_partitions(path, columns, seasons, date_from, date_to):
+    """Reads the season files of `seasons`, and in them only the months within [date_from, date_to]."""
+    _require_pyarrow()
+    if not os.path.isdir(path):
+        raise FileNotFoundError(path)
+    first = pd.Timestamp(date_from).year if date_from is not None else None
+    last = pd.Timestamp(date_to).year if date_to is not None else None
+    seasons = {int(season) for season in seasons} if seasons else None
+    frames = []
+    for season, file in list_partitions(path).items():
+        if (seasons and season not in seasons) or (first is not None and season < first) or \
+                (last is not None and season > last):
+            continue
+        frames.append(_read_parquet(file, columns, date_from, date_to))
+    if not frames:
+        return pd.DataFrame(columns=columns or [])
+    # Seasons written at different times may hold different columns; permissive promotion aligns them
+    return _arrow_to_pandas(pa.concat_tables(frames, promote_options='permissive'))
+
+def _partition_digest(df):
+    digest = hashlib.sha1(json.dumps([list(df.columns), [str(t) for t in df.dtypes]]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def _month_digests(df):
+    return {f"{month:02d}": _partition_digest(rows.reset_index(drop=True))
+            for month, rows in df.groupby(df['Date'].dt.month, sort=True)}
+
+def _save_partitions(df, path):
+    """
+    Writes each season of df to its file, skipping seasons whose months all have unchanged digests.
+
+    A rewritten season keeps the months of its existing file that df has no rows for.
+    """
+    _require_pyarrow()
+    if df['Date'].isna().any():
+        raise ValueError("Rows without a Date cannot be stored in a partitioned table")
+    os.makedirs(path, exist_ok=True)
+    manifest = _load_partition_manifest(path)
+    changed = False
+    for season, part in df.groupby(df['Date'].dt.year, sort=True):
+        file = partition_path(path, season)
+        name = os.path.basename(file)
+        part = part.reset_index(drop=True)
+        digests = _month_digests(part)
+        stored = manifest.get(name, {})
+        if os.path.exists(file) and all(stored.get(month) == digest for month, digest in digests.items()):
+            continue
+        if os.path.exists(file):
+            old = apply_schema(_arrow_to_pandas(pq.read_table(file)))
+            old = old[~old['Date'].dt.month.isin([int(month) for month in digests])]
+            if len(old):
+                part = pd.concat([old, part], ignore_index=True).sort_values('Date', kind='stable', ignore_index=True)
+                part = apply_schema(part)
+                digests = _month_digests(part)
+        _write_parquet(part, file)
+        manifest[name] = digests
+        changed = True
+    if changed:
+        _atomic(os.path.join(path, PARTITION_MANIFEST), lambda tmp: _write_json(tmp, manifest))
+
+def _refresh_partition_manifest(file, df):
+    """Records the month digests of a season file written on its own (see season_table) in its root's manifest."""
+    root = os.path.dirname(file)
+    manifest = _load_partition_manifest(root)
+    manifest[os.path.basename(file)] = _month_digests(df)
+    _atomic(os.path.join(root, PARTITION_MANIFEST), lambda tmp: _write_json(tmp, manifest))
+
+def _load_partition_manifest(path):
+    try:
+        with open(os.path.join(path, PARTITION_MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+def _storage_kind(path):
+    ext = os.path.splitext(os.path.normpath(path))[1].lower()
+    if ext == '.parquet':
+        return 'parquet'
+    if ext in ('.sqlite', '.db'):
+        return 'sqlite'
+    if ext == '' or os.path.isdir(path):
+        return 'partitioned'
+    return 'csv'
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet storage requires pyarrow (pip install pyarrow).")
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+def _atomic(path, write):
+    tmp = f"{path}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+def describe_storage(path):
+    """Prints file size, load time and in-memory size for a stored home run table."""
+    started = time.perf_counter()
+    df = load_homeruns(path)
+    elapsed = time.perf_counter() - started
+    files = list_partitions(path).values() if _storage_kind(path) == 'partitioned' else [path]
+    size_mb = sum(os.path.getsize(file) for file in files) / 1e6
+    memory_mb = df.memory_usage(deep=True).sum() / 1e6
+    print(f"{path}: {len(df)} rows, {size_mb:.2f} MB on disk, loaded in {elapsed * 1000:.0f} ms, {memory_mb:.2f} MB in memory")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the home run table between CSV, Parquet, SQLite and partitions.")
+    parser.add_argument("source", help="Existing table (.csv, .parquet, .sqlite or a partitioned directory)")
+    parser.add_argument("dest", help="Output table; format is taken from the extension (none: partitioned directory)")
+    args = parser.parse_args()
+
+    save_homeruns(load_homeruns(args.source), args.dest)
+    describe_storage(args.source)
+    describe_storage(args.dest)
@@ -0,0 +1,231 @@
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import get_logger, get_metrics
+
+log = get_logger(__name__)
+
+# Starting request rates (requests/sec) per host; the limiter adapts from here
+HOST_RATES = {
+    "baseballsavant.mlb.com": 2.0,
+    "statsapi.mlb.com": 10.0,
+}
+DEFAULT_RATE = 20.0
+
+# Statuses worth retrying; 429 and 503 also slow the host's limiter down
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request while a host's circuit breaker is open."""
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that adapts its rate to the server (AIMD).
+
+    Each throttling response halves the rate (down to min_rate) and can pause
+    the bucket until a Retry-After deadline; every success nudges the rate back
+    up towards max_rate.
+    """
+    def __init__(self, rate, burst=None, min_rate=0.2, max_rate=None, increase=0.05):
+        self.rate = rate
+        self.max_rate = max_rate or rate * 2
+        self.min_rate = min_rate
+        self.increase = increase
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes one token and returns how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def set_rate(self, rate):
+        """Resets the starting and maximum rate, e.g. from a --rps option."""
+        with self._lock:
+            self.rate = self.max_rate = rate
+            self.capacity = max(1.0, rate)
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def penalize(self, retry_after=None):
+        """Backs off after a 429/503: halve the rate and honour Retry-After if given."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def reward(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+class CircuitBreaker:
+    """
+    Stops traffic to a host after `failure_threshold` consecutive failures.
+
+    After `reset_timeout` seconds one trial request is let through (half-open);
+    success closes the circuit again, failure re-opens it.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()  # half-open: one trial, then wait again
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+def parse_retry_after(value):
+    """Retry-After as seconds, from either delta-seconds or an HTTP date; None if absent or malformed."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):  # not an HTTP date either: callers fall back to the computed backoff
+        return None
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class HttpClient:
+    """
+    Shared HTTP client for every pipeline stage.
+
+    Wraps one requests.Session with a keep-alive connection pool and adds, per
+    host, an adaptive TokenBucket and a CircuitBreaker. get() retries
+    connection errors and 429/5xx responses with jittered exponential backoff,
+    so request pacing follows what the server allows rather than fixed sleeps.
+    """
+    def __init__(self, host_rates=None, pool_size=32, max_retries=5, backoff_base=1.0, backoff_cap=60.0,
+                 timeout=10, headers=None):
+        self.host_rates = dict(HOST_RATES, **(host_rates or {}))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self._limiters = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def limiter_for(self, url):
+        host = urlsplit(url).hostname
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = TokenBucket(self.host_rates.get(host, DEFAULT_RATE))
+            return self._limiters[host]
+
+    def breaker_for(self, url):
+        host = urlsplit(url).hostname
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker()
+            return self._breakers[host]
+
+    def get(self, url, **kwargs):
+        """
+        GET with rate limiting, retries and circuit breaking.
+
+        Accepts the same keyword arguments as requests.get. Returns the response
+        for any non-retryable status after calling raise_for_status.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).hostname
+        limiter = self.limiter_for(url)
+        breaker = self.breaker_for(url)
+        metrics = get_metrics()
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {host}, not requesting {url}")
+            limiter.acquire()
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.record_request(host, time.perf_counter() - started, type(e).__name__, retry=attempt > 0)
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                log.warning("Attempt %d failed for %s: %s", attempt + 1, url, e)
+            else:
+                # Streamed bodies are not read yet; their readers count the bytes with add_bytes()
+                nbytes = 0 if kwargs.get("stream") else len(response.content)
+                metrics.record_request(host, time.perf_counter() - started, response.status_code, nbytes, retry=attempt > 0)
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    limiter.reward()
+                    response.raise_for_status()
+                    return response
+                if response.status_code in THROTTLE_STATUSES:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    limiter.penalize(retry_after)
+                else:
+                    breaker.record_failure()
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                log.debug("Attempt %d for %s returned %d, retrying", attempt + 1, url, response.status_code)
+                response.close()
+            if retry_after is None:
+                time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_cap))
+            # otherwise the limiter is paused until Retry-After and the next acquire() waits for it
+
+    def close(self):
+        self.session.close()
+
+_default_client = None
+_default_lock = threading.Lock()
+
+def get_client():
+    """Process-wide HttpClient, so every stage shares one connection pool and one set of host limiters."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,276 @@
+import atexit
+import cProfile
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Reports are written here when the process exits; override with HR_METRICS_DIR
+METRICS_DIR = os.environ.get("HR_METRICS_DIR", "metrics")
+# "cprofile" or "sample" turns on profiling of every stage; override with HR_PROFILE
+PROFILE_MODE = os.environ.get("HR_PROFILE", "")
+LOG_LEVEL = os.environ.get("HR_LOG_LEVEL", "INFO")
+
+# Request latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# How often the sampling profiler looks at the running stacks
+SAMPLE_INTERVAL = 0.005
+
+_logging_configured = False
+
+def configure_logging(level=None):
+    """Sets the verbosity for every stage (DEBUG, INFO, WARNING, ...); defaults to HR_LOG_LEVEL."""
+    global _logging_configured
+    logging.basicConfig(format="%(asctime)s %(levelname)-7s %(name)s: %(message)s", datefmt="%H:%M:%S")
+    logging.getLogger().setLevel((level or LOG_LEVEL).upper())
+    _logging_configured = True
+
+def get_logger(name):
+    if not _logging_configured:
+        configure_logging()
+    return logging.getLogger(name)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout, plus count and sum."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """[(upper bound, observations <= bound)], ending with +Inf."""
+        total, result = 0, []
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None when empty)."""
+        if not self.count:
+            return None
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound
+        return float("inf")
+
+class StageTimer:
+    """Wall and CPU time for one stage run; the stage adds to rows (and bytes) as it goes."""
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.bytes = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def as_dict(self):
+        return {"wall_seconds": round(self.wall, 3), "cpu_seconds": round(self.cpu, 3), "rows": self.rows,
+                "rows_per_sec": round(self.rows / self.wall, 2) if self.wall else None, "bytes": self.bytes}
+
+class Metrics:
+    """
+    Process-wide counters shared by every stage.
+
+    Per host: request latency histogram, status codes, bytes received and
+    retries. Per stage: wall time, CPU time and rows handled. Everything is
+    guarded by one lock, since the stages record from worker threads.
+    """
+    def __init__(self):
+        self.latency = defaultdict(Histogram)
+        self.statuses = defaultdict(Counter)
+        self.bytes = Counter()
+        self.retries = Counter()
+        self.stages = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record_request(self, host, seconds, status, nbytes=0, retry=False):
+        """status is the HTTP status code, or an exception class name for requests that got no response."""
+        with self._lock:
+            self.latency[host].observe(seconds)
+            self.statuses[host][str(status)] += 1
+            self.bytes[host] += nbytes
+            if retry:
+                self.retries[host] += 1
+
+    def add_bytes(self, host, nbytes):
+        """Counts body bytes read after record_request, e.g. from a streamed download."""
+        with self._lock:
+            self.bytes[host] += nbytes
+
+    def count(self, stage, rows=0, nbytes=0):
+        """Adds rows (and bytes) handled to a stage's totals."""
+        with self._lock:
+            timer = self.stages.setdefault(stage, StageTimer(stage))
+            timer.rows += rows
+            timer.bytes += nbytes
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a stage (wall and CPU) and profiles it when HR_PROFILE is set.
+
+        Yields the StageTimer so the stage can count rows as it goes. Runs of
+        the same stage within one process accumulate.
+        """
+        with self._lock:
+            timer = self.stages.setdefault(name, StageTimer(name))
+        wall, cpu = time.perf_counter(), time.process_time()
+        with profiled(name):
+            try:
+                yield timer
+            finally:
+                timer.wall += time.perf_counter() - wall
+                timer.cpu += time.process_time() - cpu
+
+    def report(self):
+        with self._lock:
+            hosts = {}
+            for host, histogram in self.latency.items():
+                hosts[host] = {
+                    "requests": histogram.count,
+                    "latency_seconds": {"sum": round(histogram.sum, 3), "p50": histogram.quantile(0.5),
+                                        "p95": histogram.quantile(0.95), "p99": histogram.quantile(0.99),
+                                        "buckets": {str(bound): total for bound, total in histogram.cumulative()}},
+                    "statuses": dict(self.statuses[host]),
+                    "bytes": self.bytes[host],
+                    "retries": self.retries[host],
+                }
+            return {"started": self.started, "hosts": hosts,
+                    "stages": {name: timer.as_dict() for name, timer in self.stages.items()}}
+
+    def prometheus(self):
+        """The counters in the Prometheus text exposition format."""
+        report = self.report()
+        lines = ["# TYPE hr_http_request_duration_seconds histogram"]
+        with self._lock:
+            for host, histogram in self.latency.items():
+                for bound, total in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else bound
+                    lines.append(f'hr_http_request_duration_seconds_bucket{{host="{host}",le="{le}"}} {total}')
+                lines.append(f'hr_http_request_duration_seconds_sum{{host="{host}"}} {histogram.sum:.6f}')
+                lines.append(f'hr_http_request_duration_seconds_count{{host="{host}"}} {histogram.count}')
+        lines.append("# TYPE hr_http_responses_total counter")
+        for host, data in report["hosts"].items():
+            for status, count in data["statuses"].items():
+                lines.append(f'hr_http_responses_total{{host="{host}",status="{status}"}} {count}')
+        lines.append("# TYPE hr_http_bytes_total counter")
+        lines.extend(f'hr_http_bytes_total{{host="{host}"}} {data["bytes"]}' for host, data in report["hosts"].items())
+        lines.append("# TYPE hr_http_retries_total counter")
+        lines.extend(f'hr_http_retries_total{{host="{host}"}} {data["retries"]}' for host, data in report["hosts"].items())
+        for metric, key in (("hr_stage_wall_seconds", "wall_seconds"), ("hr_stage_cpu_seconds", "cpu_seconds"),
+                            ("hr_stage_rows", "rows"), ("hr_stage_bytes", "bytes")):
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(f'{metric}{{stage="{name}"}} {data[key]}' for name, data in report["stages"].items())
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory=None):
+        """Writes metrics.json and metrics.prom into directory (default METRICS_DIR; skipped when nothing was recorded)."""
+        if not self.latency and not self.stages:
+            return
+        directory = directory or METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "metrics.json"), "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=1)
+        with open(os.path.join(directory, "metrics.prom"), "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+
+class SamplingProfiler:
+    """
+    Low-overhead wall-clock profiler: a thread samples the target thread's stack every `interval` seconds.
+
+    Unlike cProfile it also sees time spent waiting on the network. Stacks are
+    written in the collapsed format ("a;b;c count") read by flamegraph tools.
+    """
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profiled(name, mode=None, directory=None):
+    """Profiles the block with cProfile (<name>.prof) or the sampling profiler (<name>.folded) when mode/HR_PROFILE asks for it."""
+    mode = mode or PROFILE_MODE
+    if mode not in ("cprofile", "sample"):
+        yield
+        return
+    directory = directory or os.path.join(METRICS_DIR, "profiles")
+    os.makedirs(directory, exist_ok=True)
+    profiler = cProfile.Profile() if mode == "cprofile" else SamplingProfiler()
+    if mode == "cprofile":
+        profiler.enable()
+    else:
+        profiler.start()
+    try:
+        yield
+    finally:
+        if mode == "cprofile":
+            profiler.disable()
+            path = os.path.join(directory, f"{name}.prof")
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            path = os.path.join(directory, f"{name}.folded")
+            profiler.write(path)
+        get_logger(__name__).info("Profile for %s written to %s", name, path)
+
+def timed_stage(name):
+    """Decorator running the whole function inside get_metrics().stage(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+_default_metrics = None
+_default_lock = threading.Lock()
+
+def get_metrics():
+    """Process-wide Metrics; its reports are written to METRICS_DIR when the process exits."""
+    global _default_metrics
+    with _default_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics()
+            atexit.register(_default_metrics.write)
+        return _default_metrics
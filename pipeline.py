@@ -0,0 +1,368 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import metrics
+from hr_store import HOMERUNS_PATH, apply_schema, load_homeruns, migrate_legacy_csv, save_homeruns, season_table
+from metrics import configure_logging, get_logger, get_metrics
+from progress_journal import ProgressJournal, SOURCE_KEY_COLUMNS, row_keys
+from seasons import DEFAULT_SEASON, clip_folder, fetch_schedule
+
+# One fingerprint store per season, so running one season never rewrites another's
+FINGERPRINTS_PATH = "progress/fingerprints_{season}.json"
+LEGACY_FINGERPRINTS_PATH = "progress/fingerprints.json"
+
+log = get_logger(__name__)
+
+class Stage:
+    """
+    One step of the pipeline.
+
+    Args:
+        name (str): Stage name used on the command line and in the fingerprint store.
+        run (callable): Called with the table path and the run's params (season, schedule,
+            start_date, end_date); loads, fills and saves the table itself.
+        inputs (list): Columns whose values decide a row's output.
+        outputs (list): Columns the stage fills.
+        deps (list): Names of the stages that must run first.
+        journal (str): The stage's ProgressJournal path, if it has one.
+        journal_key (str): 'row' if the journal is keyed by row_keys, otherwise the column it is keyed by.
+        salt_files (list): Files whose content every row depends on, formatted with the params
+            (e.g. "{schedule}").
+        invalidate (callable): Extra cleanup for stale rows, called with (df, stale_mask).
+    """
+    def __init__(self, name, run, inputs, outputs, deps=(), journal=None, journal_key="playId",
+                 salt_files=(), invalidate=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.journal = journal
+        self.journal_key = journal_key
+        self.salt_files = list(salt_files)
+        self.invalidate = invalidate
+
+    def salt(self, params=None):
+        digest = hashlib.sha1(self.name.encode("utf-8"))
+        for path in self.salt_files:
+            with open(path.format(**(params or {})), "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+def _run_scrape(path, params):
+    import building_database
+
+    building_database.main(homeruns_path=path, schedule_csv=params["schedule"], season=params["season"],
+                           start_date=params["start_date"], end_date=params["end_date"])
+
+def _run_feeds(path, params):
+    import feed_ingest
+
+    feed_ingest.main(params["schedule"], homeruns_path=path, start_date=params["start_date"],
+                     end_date=params["end_date"], season=params["season"])
+
+def _run_gamepks(path, params):
+    from adding_gamePks import populate_gamepk_if_empty_final
+
+    populate_gamepk_if_empty_final(path, params["schedule"])
+
+def _run_playids(path, params):
+    from adding_playIDs import add_playid_to_homeruns_v5
+
+    add_playid_to_homeruns_v5(path)
+
+def _run_x30(path, params):
+    from adding_x30 import model_x30
+    from sporty_videos import extract_sporty_videos
+
+    model_x30(path)
+    extract_sporty_videos(path, x30_only=True)
+
+def _run_download(path, params):
+    from downloading_videos import download_videos
+
+    download_videos(path, season=params["season"])
+
+def _run_transcode(path, params):
+    from transcode_videos import transcode_videos
+
+    transcode_videos(path, season=params["season"])
+
+def _forget_renditions(df, stale):
+    """Drops manifest renditions for stale rows so transcode_videos redoes them with the new trim window."""
+    from downloading_videos import load_manifest, save_manifest
+
+    rows = df.loc[stale, ["Date", "playId"]].dropna()
+    for season, play_ids in rows.groupby(rows["Date"].dt.year)["playId"]:
+        folder = clip_folder(season)
+        manifest = load_manifest(folder)
+        for play_id in play_ids:
+            entry = manifest.get(play_id)
+            if entry:
+                entry.pop("renditions", None)
+                entry.pop("poster", None)
+        save_manifest(folder, manifest)
+
+# The DAG, in a valid topological order. The x/30 stage fills what the fence
+# model is certain of (adding_x30.model_x30) and scrapes only the rest with
+# sporty_videos, which also stores the clip URL of the pages it reads.
+STAGES = [
+    Stage("scrape", _run_scrape, inputs=[], outputs=SOURCE_KEY_COLUMNS),
+    Stage("gamepks", _run_gamepks, inputs=["Date", "Team", "Vs."], outputs=["gamePk", "gamePkCandidates"],
+          deps=["scrape"], salt_files=["{schedule}"]),
+    Stage("playids", _run_playids, inputs=["Name", "Pitch (MPH)", "EV (MPH)", "Dist (ft)", "gamePk", "gamePkCandidates",
+                                           "atBatIndex"],
+          outputs=["playId"], deps=["gamepks"], journal="progress/playids.jsonl", journal_key="row"),
+    Stage("x30", _run_x30, inputs=["playId"], outputs=["x/30 ballparks", "x30_source", "video_url", "video_title"],
+          deps=["playids"], journal="progress/sporty_videos.jsonl"),
+    Stage("download", _run_download, inputs=["playId"], outputs=["video_path"],
+          deps=["x30"], journal="progress/videos.jsonl"),
+    Stage("transcode", _run_transcode, inputs=["playId", "video_path", "EV (MPH)", "LA (deg)"],
+          outputs=["rendition_path", "poster_path"], deps=["download"], journal="progress/transcode.jsonl",
+          invalidate=_forget_renditions),
+]
+
+# Stages feed-first ingestion makes redundant: its rows already carry gamePk and playId
+FEED_FIRST_SKIPS = {"gamepks", "playids"}
+
+def topological_order(stages):
+    """Orders stages so every stage comes after its deps; raises ValueError on a cycle or unknown dep."""
+    by_name = {stage.name: stage for stage in stages}
+    ordered, state = [], {}
+
+    def visit(stage):
+        if state.get(stage.name) == "done":
+            return
+        if state.get(stage.name) == "visiting":
+            raise ValueError(f"Stage cycle through {stage.name}")
+        state[stage.name] = "visiting"
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+            visit(by_name[dep])
+        state[stage.name] = "done"
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+def fingerprint(df, stage, salt=None):
+    """Per-row hash of the stage's input columns (plus its salt files), as hex strings aligned on df.index."""
+    columns = [column for column in stage.inputs if column in df.columns]
+    values = df[columns].astype("string").fillna("\x00")
+    values["__salt"] = salt or stage.salt()
+    return pd.util.hash_pandas_object(values, index=False).map("{:016x}".format)
+
+def fingerprints_path_for(season, path=FINGERPRINTS_PATH):
+    return path.format(season=season)
+
+def load_fingerprints(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_fingerprints(fingerprints, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(fingerprints, f)
+    os.replace(f"{path}.tmp", path)
+
+def _output_state(df, columns):
+    columns = [column for column in columns if column in df.columns]
+    return df[columns].astype("string").fillna("\x00")
+
+def stale_rows(df, keys, stage, stored, salt=None):
+    """
+    Rows whose stage outputs no longer match their inputs.
+
+    A row is stale when its stored fingerprint differs from the current one,
+    or when it has outputs but no stored fingerprint (its key changed, e.g. a
+    corrected Team). When the stage has never been fingerprinted, existing
+    outputs are adopted as they are.
+    """
+    if not stored:
+        return pd.Series(False, index=df.index)
+    current = fingerprint(df, stage, salt)
+    previous = keys.map(stored)
+    has_output = _output_state(df, stage.outputs).ne("\x00").any(axis=1)
+    return previous.ne(current) & (previous.notna() | has_output)
+
+def _merge_scrape(df_old, scraped_path, path, start_date=None, end_date=None):
+    """
+    Replaces the source columns with a fresh scrape, keeping later-stage columns for rows that did not change.
+
+    When the scrape only covered [start_date, end_date], the old rows dated
+    outside it are kept as they are.
+    """
+    df_new = load_homeruns(scraped_path)
+    if df_old is not None and len(df_old):
+        extra = [column for column in df_old.columns if column not in df_new.columns]
+        old = df_old[extra].set_axis(row_keys(df_old))
+        old = old[~old.index.duplicated()]
+        df_new = pd.concat([df_new, old.reindex(row_keys(df_new)).set_axis(df_new.index)], axis=1)
+        outside = pd.Series(False, index=df_old.index)
+        if start_date is not None:
+            outside |= df_old["Date"] < pd.Timestamp(start_date)
+        if end_date is not None:
+            outside |= df_old["Date"] > pd.Timestamp(end_date)
+        if outside.any():
+            df_new = pd.concat([df_old[outside], df_new], ignore_index=True)
+            df_new = df_new.sort_values("Date", kind="stable").reset_index(drop=True)
+    save_homeruns(apply_schema(df_new), path)
+
+def run_pipeline(homeruns_path=HOMERUNS_PATH, stages=None, fingerprints_path=FINGERPRINTS_PATH, dry_run=False,
+                 source="savant", season=DEFAULT_SEASON, start_date=None, end_date=None):
+    """
+    Runs the stage DAG for one season, recomputing only rows whose inputs changed since the last run.
+
+    Before each stage, rows whose input fingerprint differs from the stored one
+    have that stage's outputs (and journal records) cleared, so the stage's own
+    "fill what is missing" logic picks exactly those rows up. Changed outputs
+    then change the fingerprints of downstream stages, which cascades the
+    recomputation down the DAG. The scrape stage only runs when asked for or
+    when there is no table yet.
+
+    Only the season's part of the table is loaded and saved (its season=YYYY
+    directory when the table is partitioned), and its fingerprints are kept in
+    their own file, so seasons are run independently.
+
+    Args:
+        stages (list): Stage names to run (default: every stage except scrape).
+        dry_run (bool): Only report how many rows each stage would recompute.
+        source (str): 'savant' scrapes the search pages; 'feeds' builds the rows
+            from the schedule's game feeds (feed_ingest.py) and skips the
+            gamepks and playids stages.
+        season (int): The season to run; its schedule is fetched if not on disk.
+        start_date, end_date: Limit the scrape to this range of the season; rows
+            outside it are kept.
+
+    Returns:
+        list: One dict per stage with seconds, stale rows and rows touched.
+    """
+    migrate_legacy_csv(homeruns_path)
+    homeruns_path = season_table(homeruns_path, season)
+    df = load_homeruns(homeruns_path, seasons=[season]) if os.path.exists(homeruns_path) else None
+    if df is not None and df.empty:
+        df = None
+    wanted = set(stages or [stage.name for stage in STAGES if stage.name != "scrape"])
+    if df is None:
+        wanted.add("scrape")
+    unknown = wanted - {stage.name for stage in STAGES}
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+    if source == "feeds":
+        wanted -= FEED_FIRST_SKIPS
+    elif source != "savant":
+        raise ValueError(f"Unknown source {source!r}; expected 'savant' or 'feeds'")
+
+    params = {"season": season, "schedule": fetch_schedule(season), "start_date": start_date, "end_date": end_date}
+    fingerprints_path = fingerprints_path_for(season, fingerprints_path)
+    fingerprints = load_fingerprints(fingerprints_path) or load_fingerprints(LEGACY_FINGERPRINTS_PATH)
+    summary = []
+    for stage in topological_order(STAGES):
+        if stage.name not in wanted:
+            continue
+        started = time.perf_counter()
+
+        if stage.name == "scrape":
+            if dry_run:
+                summary.append({"stage": stage.name, "seconds": 0.0, "stale": None, "touched": None})
+                continue
+            with tempfile.TemporaryDirectory() as tmp:
+                scraped = os.path.join(tmp, os.path.basename(homeruns_path))
+                (_run_feeds if source == "feeds" else stage.run)(scraped, params)
+                if not os.path.exists(scraped):
+                    log.error("Scrape produced no table; stopping.")
+                    break
+                before = 0 if df is None else len(df)
+                _merge_scrape(df, scraped, homeruns_path, start_date, end_date)
+            df = load_homeruns(homeruns_path, seasons=[season])
+            summary.append({"stage": stage.name, "seconds": time.perf_counter() - started,
+                            "stale": None, "touched": abs(len(df) - before)})
+            continue
+
+        if df is None:  # a dry run before the season's first scrape: nothing to compare yet
+            summary.append({"stage": stage.name, "seconds": 0.0, "stale": None, "touched": None})
+            continue
+        keys = row_keys(df)
+        salt = stage.salt(params)
+        stale = stale_rows(df, keys, stage, fingerprints.get(stage.name), salt)
+        if dry_run:
+            summary.append({"stage": stage.name, "seconds": time.perf_counter() - started,
+                            "stale": int(stale.sum()), "touched": None})
+            continue
+
+        before = _output_state(df, stage.outputs)
+        if stale.any():
+            for column in stage.outputs:
+                if column in df.columns:
+                    df.loc[stale, column] = pd.NA
+            if stage.journal and os.path.exists(stage.journal):
+                journal = ProgressJournal(stage.journal)
+                journal.discard((keys if stage.journal_key == "row" else df[stage.journal_key])[stale].dropna())
+                journal.close()
+            if stage.invalidate:
+                stage.invalidate(df, stale)
+            save_homeruns(df, homeruns_path)
+
+        stage.run(homeruns_path, params)
+        df = load_homeruns(homeruns_path, seasons=[season])
+        after = _output_state(df, stage.outputs).reindex(columns=before.columns)
+        touched = int(after.ne(before.reindex(after.index)).any(axis=1).sum()) if len(after.columns) else 0
+
+        keys = row_keys(df)
+        fingerprints[stage.name] = dict(zip(keys, fingerprint(df, stage, salt)))
+        save_fingerprints(fingerprints, fingerprints_path)
+        summary.append({"stage": stage.name, "seconds": time.perf_counter() - started,
+                        "stale": int(stale.sum()), "touched": touched})
+
+    print_summary(summary)
+    return summary
+
+def print_summary(summary):
+    print(f"{'stage':<10} {'seconds':>9} {'stale':>7} {'touched':>8}")
+    for row in summary:
+        stale = "-" if row["stale"] is None else row["stale"]
+        touched = "-" if row["touched"] is None else row["touched"]
+        print(f"{row['stage']:<10} {row['seconds']:>9.2f} {stale:>7} {touched:>8}")
+    print(f"{'total':<10} {sum(row['seconds'] for row in summary):>9.2f}")
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import date
+
+    parser = argparse.ArgumentParser(description="Run the home run pipeline, recomputing only rows whose inputs changed.")
+    parser.add_argument("stages", nargs="*", help=f"Stages to run (default: all but scrape). "
+                                                  f"Order: {', '.join(stage.name for stage in STAGES)}.")
+    parser.add_argument("--path", default=HOMERUNS_PATH, help="Home run table (any hr_store format).")
+    parser.add_argument("--season", type=int, nargs="+", default=[DEFAULT_SEASON], help="Seasons to run, one after another.")
+    parser.add_argument("--from", dest="start_date", type=date.fromisoformat, default=None,
+                        help="First date to scrape, YYYY-MM-DD (default: the season's first game).")
+    parser.add_argument("--to", dest="end_date", type=date.fromisoformat, default=None,
+                        help="Last date to scrape, YYYY-MM-DD (default: the season's last game).")
+    parser.add_argument("--dry-run", action="store_true", help="Only report stale rows per stage.")
+    parser.add_argument("--source", choices=["savant", "feeds"], default="savant",
+                        help="Where scrape gets rows: Savant search pages, or game feeds (skips gamepks and playids).")
+    parser.add_argument("--log-level", default=None, help="DEBUG, INFO, WARNING or ERROR (default: HR_LOG_LEVEL or INFO).")
+    parser.add_argument("--profile", choices=["cprofile", "sample"], default=None,
+                        help="Profile every stage into <metrics-dir>/profiles.")
+    parser.add_argument("--metrics-dir", default=metrics.METRICS_DIR, help="Where metrics.json and metrics.prom go.")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level)
+    metrics.METRICS_DIR = args.metrics_dir
+    if args.profile:
+        metrics.PROFILE_MODE = args.profile
+    for season in args.season:
+        run_pipeline(args.path, args.stages or None, dry_run=args.dry_run, source=args.source, season=season,
+                     start_date=args.start_date, end_date=args.end_date)
+    get_metrics().write(args.metrics_dir)
+    print(f"Metrics written to {args.metrics_dir}/metrics.json and metrics.prom")
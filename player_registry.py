@@ -0,0 +1,180 @@
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+from fuzzywuzzy import fuzz
+
+from metrics import get_logger
+
+try:
+    from rapidfuzz import fuzz as rapid_fuzz, process as rapid_process
+except ImportError:  # optional: without it the batch pass scores pairs one at a time
+    rapid_process = None
+
+log = get_logger(__name__)
+
+REGISTRY_PATH = "player_registry.json"
+
+@lru_cache(maxsize=None)
+def normalize_and_split_name_v5(name):
+    """Handles 'Jr.', multi-word names, and normalizes, attempts to fix last name first with comma."""
+    name = name.strip().lower()
+    is_jr = False
+    if name.endswith(' jr'):
+        name = name[:-3].strip()
+        is_jr = True
+    elif name.endswith(', jr'):
+        name = name[:-4].strip()
+        is_jr = True
+
+    # Check if the name has a comma followed by a space, suggesting Last, First format
+    if ', ' in name:
+        parts = name.split(', ')
+        if len(parts) == 2:
+            last_name_part = parts[0].strip()
+            first_name_part = parts[1].strip()
+            normalized_first = "".join(c for c in unicodedata.normalize('NFD', first_name_part.lower()) if unicodedata.category(c) != 'Mn' and c.isalnum() or c.isspace())
+            normalized_last = "".join(c for c in unicodedata.normalize('NFD', last_name_part.lower()) if unicodedata.category(c) != 'Mn' and c.isalnum() or c.isspace())
+            return normalized_first, normalized_last, is_jr
+
+    name = unicodedata.normalize('NFD', name)
+    name = ''.join(c for c in name if unicodedata.category(c) != 'Mn')
+    name = re.sub(r'[^a-z\s]', '', name)
+    parts = name.strip().split()
+    first_name = parts[0] if parts else ""
+    last_name = " ".join(parts[1:]) if len(parts) > 1 else ""
+    return first_name, last_name, is_jr
+
+@lru_cache(maxsize=None)
+def batter_key(name):
+    """Order-insensitive normalized name key, so 'Last, First' and 'First Last' collide."""
+    first, last, is_jr = normalize_and_split_name_v5(name)
+    return " ".join(sorted([first, last])), is_jr
+
+def similarity_matrix(queries, choices):
+    """
+    fuzz.ratio score (0-100) of every query against every choice, as a list of rows.
+
+    Uses rapidfuzz's vectorized cdist (all cores) when it is installed and
+    falls back to fuzzywuzzy pair by pair otherwise.
+    """
+    if not queries or not choices:
+        return [[] for _ in queries]
+    if rapid_process is not None:
+        return rapid_process.cdist(queries, choices, scorer=rapid_fuzz.ratio, workers=-1).tolist()
+    return [[fuzz.ratio(query, choice) for choice in choices] for query in queries]
+
+class PlayerRegistry:
+    """
+    Persistent map from Savant "Last, First" display names to MLBAM player IDs.
+
+    Feed batters are recorded by ID as feeds are read (observe). Names not in
+    the registry are resolved in one batch against the batters of the games
+    they appear in: exact normalized-key matches first, then one vectorized
+    similarity pass for the rest (resolve). Fuzzy resolutions stay tentative
+    until a row is matched on them (learn), so a wrong guess is never saved.
+    Once a name has an ID, matching a row is a dict lookup and an ID
+    comparison, with no string work.
+    """
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self.ids = {}    # Savant display name -> MLBAM id
+        self.names = {}  # MLBAM id -> feed fullName
+        self.tentative = {}  # fuzzy resolutions awaiting a confirmed match
+        self._dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.ids = data.get("ids", {})
+            self.names = {int(player_id): name for player_id, name in data.get("names", {}).items()}
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            log.warning("%s is corrupt, starting with an empty player registry.", path)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def id_for(self, name):
+        return self.ids.get(name, self.tentative.get(name))
+
+    def observe(self, events):
+        """Records the batter ID and feed name of each extract_hr_events event."""
+        for event in events:
+            player_id = event.get('batterId')
+            if player_id is not None and self.names.get(player_id) != event['batterName']:
+                self.names[player_id] = event['batterName']
+                self._dirty = True
+
+    def learn(self, name, player_id):
+        """Records a confirmed name -> ID pair (e.g. from a row matched on name and metrics)."""
+        self.tentative.pop(name, None)
+        if player_id is not None and self.ids.get(name) != player_id:
+            self.ids[name] = player_id
+            self._dirty = True
+
+    def resolve(self, candidates, fuzzy_threshold=80):
+        """
+        Resolves the display names that are not in the registry yet.
+
+        Args:
+            candidates (dict): Savant display name -> set of batter IDs it could be
+                (the home run batters of the games the name's rows belong to).
+            fuzzy_threshold (int): Minimum fuzz.ratio score for a fuzzy resolution.
+
+        A name is resolved only when exactly one allowed batter has the best
+        admissible score, and fuzzy candidates must agree on the Jr. suffix.
+
+        Returns:
+            dict: {'exact': n, 'fuzzy': n, 'unresolved': n} for the new names.
+        """
+        counts = {'exact': 0, 'fuzzy': 0, 'unresolved': 0}
+        unknown = [name for name in candidates if name not in self.ids]
+        keys_by_id = {player_id: batter_key(name) for player_id, name in self.names.items()}
+
+        rest = []
+        for name in unknown:
+            key = batter_key(name)
+            exact = [player_id for player_id in candidates[name] if keys_by_id.get(player_id) == key]
+            if len(exact) == 1:
+                self.learn(name, exact[0])
+                counts['exact'] += 1
+            else:
+                rest.append(name)
+
+        choice_ids = sorted({player_id for name in rest for player_id in candidates[name] if player_id in self.names})
+        choices = [" ".join(normalize_and_split_name_v5(self.names[player_id])[:2]) for player_id in choice_ids]
+        queries = []
+        for name in rest:
+            first, last, _ = normalize_and_split_name_v5(name)
+            queries.extend([f"{first} {last}", f"{last} {first}"])
+        scores = similarity_matrix(queries, choices)
+        column = {player_id: i for i, player_id in enumerate(choice_ids)}
+
+        for n, name in enumerate(rest):
+            is_jr = batter_key(name)[1]
+            scored = []
+            for player_id in candidates[name]:
+                if player_id not in column or keys_by_id[player_id][1] != is_jr:
+                    continue
+                score = max(scores[2 * n][column[player_id]], scores[2 * n + 1][column[player_id]])
+                if score >= fuzzy_threshold:
+                    scored.append((score, player_id))
+            scored.sort(reverse=True)
+            if scored and (len(scored) == 1 or scored[0][0] > scored[1][0]):
+                self.tentative[name] = scored[0][1]
+                counts['fuzzy'] += 1
+            else:
+                counts['unresolved'] += 1
+        return counts
+
+    def save(self):
+        if not self._dirty:
+            return
+        data = {"ids": dict(sorted(self.ids.items())), "names": {str(k): v for k, v in sorted(self.names.items())}}
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+        os.replace(f"{self.path}.tmp", self.path)
+        self._dirty = False
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Columns that come straight from the Savant search and never change afterwards
+SOURCE_KEY_COLUMNS = ['Date', 'Name', 'Team', 'Vs.', 'Pitch (MPH)', 'EV (MPH)', 'LA (deg)', 'Dist (ft)']
+
+def row_keys(df):
+    """
+    Stable per-row keys built from the Savant source columns.
+
+    Unlike the DataFrame index these survive re-sorting the CSV, and unlike
+    playId they exist before the playId stage has run.
+    """
+    dates = df['Date'] if pd.api.types.is_datetime64_any_dtype(df['Date']) else pd.to_datetime(df['Date'], format='mixed')
+    dates = dates.dt.strftime('%Y-%m-%d').astype(object)
+    parts = [dates.where(dates.notna(), '').tolist()]
+    for column in SOURCE_KEY_COLUMNS[1:]:
+        # Each distinct value is formatted once; a season has a few hundred distinct speeds and names
+        codes, uniques = pd.factorize(df[column], use_na_sentinel=False)
+        formatted = pd.Series(uniques).astype(str).astype(object)
+        parts.append(np.asarray(formatted.where(formatted.notna(), ''), dtype=object)[codes].tolist())
+    keys = [hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest()[:16] for values in zip(*parts)]
+    return pd.Series(keys, index=df.index)
+
+def _record_key(line):
+    try:
+        return json.loads(line)['key']
+    except (json.JSONDecodeError, KeyError):
+        return None
+
+class ProgressJournal:
+    """
+    Append-only JSON-lines log of per-row results for a long-running stage.
+
+    Each completed row is written (and flushed) as soon as it is resolved, so
+    an interrupted run loses at most the row in flight. On restart the stage
+    replays the journal onto the master table with apply() and skips what is
+    already done. Every `compact_every` records the on_compact callback is run
+    to fold the journal into the master table, after which the journal is
+    truncated.
+    """
+    def __init__(self, path, compact_every=100, on_compact=None):
+        self.path = path
+        self.compact_every = compact_every
+        self.on_compact = on_compact
+        self._since_compact = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def load(self):
+        """Returns {key: {column: value}} with later records overriding earlier ones."""
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final line from a crash mid-write
+                    entries.setdefault(record['key'], {}).update(record['values'])
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def done_keys(self, column):
+        """Keys that already have a non-null value for column."""
+        return {key for key, values in self.load().items() if values.get(column) is not None}
+
+    def apply(self, df, keys):
+        """
+        Writes journaled values into df in place.
+
+        Args:
+            df (DataFrame): The master table.
+            keys (Series): Journal key for each row of df, aligned on its index.
+
+        Returns:
+            int: Number of rows that received at least one value.
+        """
+        entries = self.load()
+        if not entries:
+            return 0
+        hits = keys[keys.isin(entries.keys())]
+        for index, key in hits.items():
+            for column, value in entries[key].items():
+                if column not in df.columns:
+                    df[column] = None
+                    df[column] = df[column].astype(object)
+                df.at[index, column] = value
+        return len(hits)
+
+    def record(self, key, **values):
+        """Appends one resolved row and compacts if the threshold is reached."""
+        self._file.write(json.dumps({'key': key, 'values': values}) + '\n')
+        self._file.flush()
+        self._since_compact += 1
+        if self.compact_every and self._since_compact >= self.compact_every:
+            self.compact()
+
+    def discard(self, keys):
+        """Drops every record for keys, e.g. rows whose inputs changed since they were journaled."""
+        keys = set(keys)
+        self._file.flush()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            kept = [line for line in f if _record_key(line) not in keys]
+        self._file.close()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(kept)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def compact(self):
+        """Folds the journal into the master table via on_compact, then truncates it."""
+        if self.on_compact is None:
+            return
+        self._file.flush()
+        self.on_compact()
+        self._file.close()
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._since_compact = 0
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,193 @@
+import csv
+import io
+import time
+from datetime import date
+from urllib.parse import urlsplit
+
+import pandas as pd
+import requests
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+
+from http_client import get_client
+from metrics import get_logger, get_metrics
+from x30_model import spray_angle
+
+log = get_logger(__name__)
+
+# Savant's CSV export of the home run search: one line per pitch, the same query as SAVANT_SEARCH_URL
+SAVANT_CSV_URL = (
+    "https://baseballsavant.mlb.com/statcast_search/csv?all=true&hfAB=home%5C.%5C.run%7C&hfGT=R%7C&hfSea={season}%7C"
+    "&player_type=batter&game_date_gt={start}&game_date_lt={end}&type=details"
+)
+
+def _text(value):
+    return value or None
+
+def _float(value):
+    return float(value) if value else None
+
+def _int(value):
+    return int(float(value)) if value else None
+
+def _date(value):
+    return date.fromisoformat(value[:10]) if value else None
+
+# The export columns read, with their parsers. The export has ~90 more, which are skipped
+# without being parsed; a response missing any of these is rejected.
+CSV_SCHEMA = {
+    'game_date': _date,
+    'game_pk': _int,
+    'at_bat_number': _int,
+    'events': _text,
+    'player_name': _text,        # batter, "Last, First"
+    'batter': _int,
+    'pitcher': _int,
+    'home_team': _text,
+    'away_team': _text,
+    'inning': _int,
+    'inning_topbot': _text,
+    'balls': _int,
+    'strikes': _int,
+    'outs_when_up': _int,
+    'stand': _text,
+    'p_throws': _text,
+    'pitch_type': _text,
+    'release_speed': _float,
+    'release_spin_rate': _float,
+    'plate_x': _float,
+    'plate_z': _float,
+    'launch_speed': _float,
+    'launch_angle': _float,
+    'hit_distance_sc': _float,
+    'hc_x': _float,
+    'hc_y': _float,
+}
+
+# Columns of an export-built row: the Savant search table layout, the IDs the export
+# carries and the pitch-level fields the search table does not show
+CSV_COLUMNS = ['Rk', 'Name', 'Team', 'Result', 'Date', 'Vs.', 'Pitch (MPH)', 'EV (MPH)', 'LA (deg)', 'Dist (ft)',
+               'gamePk', 'batterId', 'atBatIndex', 'Spray (deg)', 'pitcherId', 'Pitch Type', 'Spin (RPM)',
+               'Plate X (ft)', 'Plate Z (ft)', 'Inning', 'Balls', 'Strikes', 'Outs', 'Stands', 'Throws']
+
+def build_csv_url(start_date, end_date=None):
+    """Builds the Savant CSV export URL for a date (or inclusive date window) of the season start_date falls in."""
+    end_date = end_date or start_date
+    return SAVANT_CSV_URL.format(season=start_date.year, start=start_date.strftime("%Y-%m-%d"),
+                                 end=end_date.strftime("%Y-%m-%d"))
+
+def to_row(record):
+    """Maps one parsed export line (CSV_SCHEMA keys) to a home run table row (CSV_COLUMNS keys)."""
+    top = record['inning_topbot'] == 'Top'
+    hc_x, hc_y = record['hc_x'], record['hc_y']
+    return {
+        'Name': record['player_name'],
+        'Team': record['away_team'] if top else record['home_team'],
+        'Result': 'Home Run',
+        'Date': record['game_date'],
+        'Vs.': record['home_team'] if top else record['away_team'],
+        'Pitch (MPH)': record['release_speed'],
+        'EV (MPH)': record['launch_speed'],
+        'LA (deg)': record['launch_angle'],
+        'Dist (ft)': record['hit_distance_sc'],
+        'gamePk': record['game_pk'],
+        'batterId': record['batter'],
+        'atBatIndex': record['at_bat_number'] - 1 if record['at_bat_number'] else None,  # the feed's index is 0-based
+        'Spray (deg)': round(float(spray_angle(hc_x, hc_y)), 1) if hc_x is not None and hc_y is not None else None,
+        'pitcherId': record['pitcher'],
+        'Pitch Type': record['pitch_type'],
+        'Spin (RPM)': record['release_spin_rate'],
+        'Plate X (ft)': record['plate_x'],
+        'Plate Z (ft)': record['plate_z'],
+        'Inning': record['inning'],
+        'Balls': record['balls'],
+        'Strikes': record['strikes'],
+        'Outs': record['outs_when_up'],
+        'Stands': record['stand'],
+        'Throws': record['p_throws'],
+    }
+
+def parse_csv_rows(lines):
+    """
+    Yields a table row (see to_row) for every home run line of a Savant CSV export.
+
+    Args:
+        lines: Iterable of text lines (a file object or a streamed response), header first.
+
+    Only the CSV_SCHEMA columns are parsed, located by name in the header, so
+    the export may add or reorder columns. Repeated header lines and lines of
+    the wrong length are skipped. Raises ValueError if a schema column is missing.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if not header:
+        return
+    header[0] = header[0].lstrip('\ufeff')
+    missing = [column for column in CSV_SCHEMA if column not in header]
+    if missing:
+        raise ValueError(f"Savant CSV export is missing columns: {', '.join(missing)}")
+    fields = [(column, header.index(column), parse) for column, parse in CSV_SCHEMA.items()]
+    events = header.index('events')
+    skipped = 0
+    for values in reader:
+        if len(values) != len(header) or values == header:
+            skipped += 1
+            continue
+        if values[events] != 'home_run':
+            continue
+        try:
+            yield to_row({column: parse(values[position]) for column, position, parse in fields})
+        except ValueError:
+            skipped += 1
+    if skipped:
+        log.warning("Skipped %d malformed lines in a Savant CSV export", skipped)
+
+def stream_search_csv(start_date, end_date=None, headers=None, timeout=30):
+    """
+    Streams the CSV export for a date window and yields its home run rows as they arrive.
+
+    The response body is decoded incrementally and handed to the csv reader, so
+    memory does not grow with the size of the export.
+    """
+    url = build_csv_url(start_date, end_date)
+    host = urlsplit(url).hostname
+    response = get_client().get(url, headers=headers, stream=True, timeout=timeout)
+    with response:
+        response.raw.decode_content = True
+        response.raw.auto_close = False  # the text wrapper reads past the end, which must not find a closed stream
+        try:
+            yield from parse_csv_rows(io.TextIOWrapper(response.raw, encoding='utf-8-sig', newline=''))
+        finally:
+            get_metrics().add_bytes(host, response.raw.tell())
+
+def scrape_csv_window(start_date, end_date, headers):
+    """
+    All home run rows of a date window, read from the CSV export.
+
+    Returns an empty list (after logging) if the request or the stream fails, like
+    building_database.scrape_baseball_savant_table does for the HTML search.
+    """
+    started = time.perf_counter()
+    try:
+        rows = list(stream_search_csv(start_date, end_date, headers))
+    except (requests.exceptions.RequestException, Urllib3HTTPError) as e:
+        log.error("Failed to read the Savant CSV export for %s..%s: %s", start_date, end_date, e)
+        return []
+    except (ValueError, csv.Error) as e:
+        log.error("Unreadable Savant CSV export for %s..%s: %s", start_date, end_date, e)
+        return []
+    log.debug("Read %d home runs for %s..%s in %.2fs", len(rows), start_date, end_date, time.perf_counter() - started)
+    return rows
+
+def rows_to_table(rows):
+    """
+    Home run table of export rows, ordered like the Savant search (by date, hardest hit first).
+
+    Rk counts within each date. Rows repeated by overlapping windows are dropped.
+    """
+    df = pd.DataFrame(rows, columns=CSV_COLUMNS)
+    df = df.drop_duplicates(['gamePk', 'atBatIndex']) if len(df) else df
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values(['Date', 'EV (MPH)', 'gamePk', 'atBatIndex'], ascending=[True, False, True, True],
+                        na_position='last').reset_index(drop=True)
+    df['Rk'] = df.groupby('Date').cumcount() + 1
+    return df
@@ -0,0 +1,111 @@
+import os
+
+import pandas as pd
+
+from http_client import get_client
+from metrics import get_logger
+
+log = get_logger(__name__)
+
+# Season the stages work on when none is given
+DEFAULT_SEASON = int(os.environ.get("HR_SEASON", "2025"))
+
+# Regular season schedule with each team's name and abbreviation as of that season
+SCHEDULE_URL = "https://statsapi.mlb.com/api/v1/schedule?sportId=1&season={season}&gameType=R&hydrate=team"
+SCHEDULE_COLUMNS = ['gamePk', 'date', 'awayTeam', 'homeTeam', 'awayAbbrev', 'homeAbbrev']
+
+def schedule_path(season):
+    """Where a season's schedule CSV is kept."""
+    return f"mlb_schedule_{season}.csv"
+
+def clip_folder(season):
+    """Folder a season's downloaded clips (and their renditions and posters) are kept in."""
+    return f"{season}_homeruns"
+
+def parse_schedule(data):
+    """
+    One row per regular season game of a statsapi schedule response.
+
+    Postponed games appear once per scheduled date with the same gamePk; the
+    last (rescheduled) date is kept. Cancelled games are dropped.
+    """
+    rows = []
+    for day in data.get('dates', []):
+        for game in day.get('games', []):
+            if game.get('status', {}).get('detailedState') == 'Cancelled':
+                continue
+            away = game['teams']['away']['team']
+            home = game['teams']['home']['team']
+            rows.append({
+                'gamePk': game['gamePk'],
+                'date': game.get('officialDate') or day.get('date'),
+                'awayTeam': away.get('name'),
+                'homeTeam': home.get('name'),
+                'awayAbbrev': away.get('abbreviation'),
+                'homeAbbrev': home.get('abbreviation'),
+            })
+    schedule = pd.DataFrame(rows, columns=SCHEDULE_COLUMNS)
+    return schedule.drop_duplicates('gamePk', keep='last').sort_values(['date', 'gamePk']).reset_index(drop=True)
+
+def fetch_schedule(season, path=None, refresh=False):
+    """Path of the season's schedule CSV, downloading it from statsapi first when it is missing (or refresh)."""
+    path = path or schedule_path(season)
+    if os.path.exists(path) and not refresh:
+        return path
+    response = get_client().get(SCHEDULE_URL.format(season=season), timeout=30)
+    schedule = parse_schedule(response.json())
+    if schedule.empty:
+        raise ValueError(f"statsapi has no regular season schedule for {season}")
+    schedule.to_csv(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+    log.info("Saved the %d schedule (%d games, %s to %s) to %s", season, len(schedule),
+             schedule['date'].min(), schedule['date'].max(), path)
+    return path
+
+def load_schedule(season=None, path=None):
+    """A season's schedule (fetched if needed), or the schedule CSV at path."""
+    path = path or fetch_schedule(season)
+    schedule = pd.read_csv(path)
+    if not {'awayAbbrev', 'homeAbbrev'} <= set(schedule.columns):
+        raise ValueError(f"{path} has no team abbreviations; fetch it again with "
+                         f"python seasons.py {season or ''} --refresh")
+    return schedule
+
+def load_schedules(seasons):
+    """The schedules of several seasons in one frame."""
+    seasons = sorted(set(seasons))
+    if not seasons:
+        return pd.DataFrame(columns=SCHEDULE_COLUMNS)
+    return pd.concat([load_schedule(season) for season in seasons], ignore_index=True)
+
+def season_dates(season, schedule_csv=None):
+    """(first, last) scheduled game date of the season."""
+    dates = pd.to_datetime(pd.read_csv(schedule_csv or fetch_schedule(season), usecols=['date'])['date']).dt.date
+    return dates.min(), dates.max()
+
+def team_names(schedule):
+    """{abbreviation: full name} of the teams in a schedule, as they were named that season."""
+    names = dict(zip(schedule['awayAbbrev'], schedule['awayTeam']))
+    names.update(zip(schedule['homeAbbrev'], schedule['homeTeam']))
+    return names
+
+def seasons_in(df):
+    """The seasons (years) the rows of a home run table fall in."""
+    return sorted(int(year) for year in pd.to_datetime(df['Date']).dt.year.dropna().unique())
+
+if __name__ == "__main__":
+    import argparse
+
+    from metrics import configure_logging
+
+    parser = argparse.ArgumentParser(description="Fetch regular season schedules from statsapi.")
+    parser.add_argument("seasons", nargs="*", type=int, default=[DEFAULT_SEASON])
+    parser.add_argument("--refresh", action="store_true", help="Download again even if the CSV exists.")
+    args = parser.parse_args()
+
+    configure_logging()
+    for season in args.seasons:
+        path = fetch_schedule(season, refresh=args.refresh)
+        first, last = season_dates(season, path)
+        schedule = load_schedule(season, path)
+        print(f"{season}: {len(schedule)} games from {first} to {last}, {len(team_names(schedule))} teams ({path})")
@@ -0,0 +1,156 @@
+import html
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+
+from http_client import get_client
+from hr_store import HOMERUNS_PATH, load_homeruns, save_homeruns
+from progress_journal import ProgressJournal
+from metrics import get_logger, get_metrics, timed_stage
+
+log = get_logger(__name__)
+
+# Baseball Savant video page for a single play
+SPORTY_VIDEOS_URL = "https://baseballsavant.mlb.com/sporty-videos?playId={}"
+
+# Headers to mimic a real browser request
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+}
+
+# Table columns filled from the page
+PAGE_COLUMNS = {"x30": "x/30 ballparks", "video_url": "video_url", "title": "video_title"}
+
+_X30_SPAN_RE = re.compile(r'<span\b[^>]*\bid\s*=\s*["\']hr-x-parks-listener["\'][^>]*>(.*?)</span>', re.S | re.I)
+_SOURCE_SRC_RE = re.compile(r'<source\b[^>]*?\bsrc\s*=\s*["\']([^"\']+)["\']', re.I)
+_TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.S | re.I)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+def parse_sporty_page(page):
+    """
+    Pulls x/30, the clip URL and the page title out of a sporty-videos page without building a DOM.
+
+    Only the three fragments we need are located (by regex and str.find), so
+    this runs in a small fraction of the time of a full html.parser pass.
+
+    Returns:
+        dict: {'x30': int or None, 'video_url': str or None, 'title': str or None}
+    """
+    result = {"x30": None, "video_url": None, "title": None}
+
+    match = _X30_SPAN_RE.search(page)
+    if match:
+        text = html.unescape(_TAG_RE.sub("", match.group(1)))
+        try:
+            result["x30"] = int(text.split("/")[0].strip())  # Extract 'x' from 'x/30 parks'
+        except ValueError:
+            pass
+
+    video_at = page.find("<video")
+    if video_at == -1:
+        video_at = page.find("<VIDEO")
+    if video_at != -1:
+        match = _SOURCE_SRC_RE.search(page, video_at)
+        if match:
+            result["video_url"] = html.unescape(match.group(1))
+
+    match = _TITLE_RE.search(page)
+    if match:
+        result["title"] = html.unescape(match.group(1)).strip() or None
+    return result
+
+def parse_sporty_page_bs4(page):
+    """Reference BeautifulSoup/html.parser implementation (the original scraping path), kept for benchmarks."""
+    soup = BeautifulSoup(page, "html.parser")
+    result = {"x30": None, "video_url": None, "title": None}
+
+    hr_span = soup.find("span", id="hr-x-parks-listener")
+    if hr_span:
+        try:
+            result["x30"] = int(hr_span.text.split("/")[0].strip())
+        except ValueError:
+            pass
+
+    video_tag = soup.find("video")
+    if video_tag and video_tag.find("source"):
+        result["video_url"] = video_tag.find("source")["src"]
+
+    if soup.title and soup.title.string:
+        result["title"] = soup.title.string.strip() or None
+    return result
+
+def fetch_sporty_page(play_id, fixture_dir=None):
+    """Downloads the sporty-videos page for play_id, optionally saving it as a benchmark fixture."""
+    page = get_client().get(SPORTY_VIDEOS_URL.format(play_id), headers=HEADERS, timeout=10).text
+    if fixture_dir:
+        os.makedirs(fixture_dir, exist_ok=True)
+        with open(os.path.join(fixture_dir, f"{play_id}.html"), "w", encoding="utf-8") as f:
+            f.write(page)
+    return page
+
+@timed_stage("sporty_videos")
+def extract_sporty_videos(homeruns_csv=HOMERUNS_PATH, journal_path="progress/sporty_videos.jsonl", compact_every=100,
+                          max_workers=4, fixture_dir=None, refresh=False, x30_only=False):
+    """
+    Fetches each home run's sporty-videos page once and fills x/30, video_url and video_title together.
+
+    Rows are skipped when both x/30 and video_url are already known (unless
+    refresh=True). With x30_only, rows are skipped once x/30 is known (e.g.
+    filled by adding_x30.model_x30); their clip URL is looked up at download. Pages are fetched by a small worker pool paced by the shared
+    client's Savant rate limiter. Results are journaled keyed by playId and
+    folded into the table periodically and on exit.
+    """
+    df = load_homeruns(homeruns_csv)
+    for column in PAGE_COLUMNS.values():
+        if column not in df.columns:
+            df[column] = pd.Series(pd.NA, index=df.index, dtype="UInt8" if column == "x/30 ballparks" else "string")
+
+    columns = list(PAGE_COLUMNS.values())
+    journal = ProgressJournal(journal_path, compact_every, on_compact=lambda: save_homeruns(df, homeruns_csv, columns=columns))
+    resumed = journal.apply(df, df["playId"])
+    if resumed:
+        log.info("Resumed %d pages from %s", resumed, journal_path)
+
+    todo = df["playId"].notna()
+    if not refresh:
+        todo &= df["x/30 ballparks"].isna() if x30_only else df["x/30 ballparks"].isna() | df["video_url"].isna()
+    rows = df.loc[todo, "playId"]
+    log.info("Extracting %d sporty-videos pages with %d workers", len(rows), max_workers)
+
+    def work(play_id):
+        return parse_sporty_page(fetch_sporty_page(play_id, fixture_dir))
+
+    started = time.perf_counter()
+    done = 0
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {pool.submit(work, play_id): index for index, play_id in rows.items()}
+        for future in as_completed(futures):
+            index = futures[future]
+            play_id = rows[index]
+            try:
+                page = future.result()
+            except requests.exceptions.RequestException as e:
+                log.warning("Error scraping %s: %s", play_id, e)
+                continue
+            values = {PAGE_COLUMNS[key]: value for key, value in page.items() if value is not None}
+            for column, value in values.items():
+                df.at[index, column] = value
+            journal.record(play_id, **values)
+            done += 1
+            get_metrics().count("sporty_videos", rows=1)
+            if done % 100 == 0:
+                log.info("Processed %d/%d pages, %.2f pages/sec", done, len(rows), done / (time.perf_counter() - started))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        journal.compact()
+        journal.close()
+    log.info("Extracted %d pages in %.1fs", done, time.perf_counter() - started)
+
+if __name__ == "__main__":
+    extract_sporty_videos()
@@ -0,0 +1,193 @@
+import math
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from downloading_videos import load_manifest, save_manifest
+from hr_store import HOMERUNS_PATH, load_homeruns, save_homeruns
+from progress_journal import ProgressJournal
+from metrics import get_logger, get_metrics, timed_stage
+from seasons import DEFAULT_SEASON, clip_folder
+
+log = get_logger(__name__)
+
+# ffmpeg binary; override with FFMPEG=/path/to/ffmpeg
+FFMPEG = os.environ.get("FFMPEG", "ffmpeg")
+
+# Low-bitrate renditions, best first. The first one is what the game plays.
+RENDITIONS = [
+    {"name": "480p", "height": 480, "video_bitrate": "600k", "audio_bitrate": "64k"},
+    {"name": "270p", "height": 270, "video_bitrate": "250k", "audio_bitrate": "48k"},
+]
+
+# Savant clips open on the pitcher's delivery; the swing comes a few seconds in
+DEFAULT_LEAD_IN = 3.0
+# Seconds kept after the ball lands (or after the estimated hang time)
+LANDING_PADDING = 2.0
+GRAVITY_FT_S2 = 32.17
+MPH_TO_FT_S = 1.46667
+# Drag shortens flight well below the vacuum estimate for batted balls
+DRAG_FACTOR = 0.75
+
+def trim_window(ev_mph, la_deg, lead_in=DEFAULT_LEAD_IN):
+    """
+    Estimates the swing-to-landing window (start, duration) in seconds for a clip.
+
+    Hang time comes from exit velocity and launch angle (vacuum flight time
+    scaled by DRAG_FACTOR); without metrics a fixed 7s window is used.
+    """
+    if pd.isna(ev_mph) or pd.isna(la_deg):
+        return lead_in, 7.0
+    vertical = ev_mph * MPH_TO_FT_S * math.sin(math.radians(la_deg))
+    hang_time = max(2.0, DRAG_FACTOR * 2 * vertical / GRAVITY_FT_S2)
+    return lead_in, hang_time + LANDING_PADDING
+
+def rendition_path(folder, name, play_id):
+    return os.path.join(folder, "renditions", name, f"{play_id}.mp4")
+
+def poster_path(folder, play_id):
+    return os.path.join(folder, "posters", f"{play_id}.jpg")
+
+def transcode_clip(play_id, source, folder, start, duration):
+    """
+    Trims one clip, writes every rendition plus a poster frame, and returns their paths and sizes.
+
+    Runs in a worker process; each ffmpeg call is single-threaded so the pool
+    size decides how many cores are used.
+    """
+    outputs = {}
+    for rendition in RENDITIONS:
+        dest = rendition_path(folder, rendition["name"], play_id)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.tmp.mp4"
+        subprocess.run([
+            FFMPEG, "-nostdin", "-loglevel", "error", "-y", "-threads", "1",
+            "-ss", f"{start:.2f}", "-i", source, "-t", f"{duration:.2f}",
+            "-vf", f"scale=-2:{rendition['height']}",
+            "-c:v", "libx264", "-preset", "veryfast", "-b:v", rendition["video_bitrate"],
+            "-maxrate", rendition["video_bitrate"], "-bufsize", rendition["video_bitrate"],
+            "-c:a", "aac", "-b:a", rendition["audio_bitrate"],
+            "-movflags", "+faststart", tmp,
+        ], check=True)
+        os.replace(tmp, dest)
+        outputs[rendition["name"]] = {"path": dest, "bytes": os.path.getsize(dest)}
+
+    poster = poster_path(folder, play_id)
+    os.makedirs(os.path.dirname(poster), exist_ok=True)
+    subprocess.run([
+        FFMPEG, "-nostdin", "-loglevel", "error", "-y", "-threads", "1",
+        "-ss", f"{start + 0.5:.2f}", "-i", source, "-frames:v", "1",
+        "-vf", f"scale=-2:{RENDITIONS[0]['height']}", "-q:v", "4", poster,
+    ], check=True)
+    return {"renditions": outputs, "poster": {"path": poster, "bytes": os.path.getsize(poster)}}
+
+def _table_paths(outputs):
+    """rendition_path and poster_path for the table: the default rendition and the poster."""
+    return {"rendition_path": outputs["renditions"][RENDITIONS[0]["name"]]["path"], "poster_path": outputs["poster"]["path"]}
+
+def _is_done(entry):
+    renditions = entry.get("renditions", {})
+    files = [renditions.get(r["name"]) for r in RENDITIONS] + [entry.get("poster")]
+    return all(f and os.path.exists(f["path"]) and os.path.getsize(f["path"]) == f["bytes"] for f in files)
+
+@timed_stage("transcode")
+def transcode_videos(homeruns_csv=HOMERUNS_PATH, folder=None, season=DEFAULT_SEASON, journal_path="progress/transcode.jsonl",
+                     compact_every=50, max_workers=None, lead_in=DEFAULT_LEAD_IN):
+    """
+    Trims and transcodes every downloaded clip into the RENDITIONS with a process pool over ffmpeg.
+
+    Rendition and poster paths and sizes are added to the download manifest,
+    and the default rendition and poster are recorded in the table as
+    rendition_path and poster_path. Clips whose outputs already exist are
+    skipped. Prints total library size before and after. The folder defaults
+    to the season's clip_folder.
+    """
+    folder = folder or clip_folder(season)
+    if shutil.which(FFMPEG) is None:
+        log.error("ffmpeg not found (%s). Install it or set FFMPEG.", FFMPEG)
+        return
+
+    df = load_homeruns(homeruns_csv)
+    for column in ("rendition_path", "poster_path"):
+        if column not in df.columns:
+            df[column] = pd.Series(pd.NA, index=df.index, dtype="string")
+
+    journal = ProgressJournal(journal_path, compact_every,
+                              on_compact=lambda: save_homeruns(df, homeruns_csv, columns=["rendition_path", "poster_path"]))
+    journal.apply(df, df["playId"])
+    manifest = load_manifest(folder)
+    rows = df.set_index("playId", drop=False)
+    rows = rows[~rows.index.duplicated()]
+
+    todo = [play_id for play_id, entry in manifest.items() if os.path.exists(entry["path"]) and not _is_done(entry)]
+    # Clips transcoded earlier whose paths are missing from the table (rebuilt, or a column update was lost)
+    done_paths = {play_id: _table_paths(entry) for play_id, entry in manifest.items() if _is_done(entry)}
+    missing = df["playId"].isin(done_paths.keys()) & (df["rendition_path"].isna() | df["poster_path"].isna())
+    for index, play_id in df.loc[missing, "playId"].items():
+        for column, value in done_paths[play_id].items():
+            df.at[index, column] = value
+        journal.record(play_id, **done_paths[play_id])
+    if missing.any():
+        log.info("Filled rendition and poster paths for %d already transcoded clips", int(missing.sum()))
+    workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+    log.info("%d clips already transcoded, %d to go with %d processes", len(manifest) - len(todo), len(todo), workers)
+
+    started = time.perf_counter()
+    done = 0
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {}
+        for play_id in todo:
+            row = rows.loc[play_id] if play_id in rows.index else {}
+            start, duration = trim_window(row.get("EV (MPH)"), row.get("LA (deg)"), lead_in)
+            futures[pool.submit(transcode_clip, play_id, manifest[play_id]["path"], folder, start, duration)] = play_id
+        for future in as_completed(futures):
+            play_id = futures[future]
+            try:
+                outputs = future.result()
+            except subprocess.CalledProcessError as e:
+                log.warning("ffmpeg failed for playId %s: %s", play_id, e)
+                continue
+            manifest[play_id].update(outputs)
+            values = _table_paths(outputs)
+            for index in df.index[df["playId"] == play_id]:
+                for column, value in values.items():
+                    df.at[index, column] = value
+            journal.record(play_id, **values)
+            done += 1
+            get_metrics().count("transcode", rows=1)
+            if done % compact_every == 0:
+                save_manifest(folder, manifest)
+                log.info("%d/%d clips, %.2f clips/sec", done, len(todo), done / (time.perf_counter() - started))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        save_manifest(folder, manifest)
+        journal.compact()
+        journal.close()
+
+    log.info("Transcoded %d clips in %.1fs", done, time.perf_counter() - started)
+    print_savings_report(manifest)
+
+def print_savings_report(manifest):
+    """Compares original clip bytes with each rendition over the clips that have been transcoded."""
+    entries = [entry for entry in manifest.values() if entry.get("renditions")]
+    if not entries:
+        print("No transcoded clips yet.")
+        return
+    original = sum(entry["bytes"] for entry in entries)
+    print(f"Savings over {len(entries)} clips (original {original / 1e6:.1f} MB, "
+          f"{original / len(entries) / 1e6:.2f} MB/clip):")
+    for rendition in RENDITIONS:
+        sizes = [entry["renditions"][rendition["name"]]["bytes"] for entry in entries if rendition["name"] in entry["renditions"]]
+        total = sum(sizes)
+        print(f"  {rendition['name']:>5}: {total / 1e6:8.1f} MB, {total / max(len(sizes), 1) / 1e6:.2f} MB/clip, "
+              f"{original / max(total, 1):.1f}x smaller")
+    posters = sum(entry["poster"]["bytes"] for entry in entries if entry.get("poster"))
+    print(f"  posters: {posters / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    transcode_videos()
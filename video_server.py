@@ -0,0 +1,187 @@
+import email.utils
+import os
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+
+from seasons import DEFAULT_SEASON, clip_folder
+
+# Clips never change once downloaded, so browsers may keep them for a day
+CACHE_CONTROL = "public, max-age=86400, immutable"
+CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+class ClipCache:
+    """Thread-safe LRU of whole clip files, bounded by total bytes."""
+    def __init__(self, max_bytes=512 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            data = self._items.get(path)
+            if data is not None:
+                self._items.move_to_end(path)
+            return data
+
+    def load(self, path):
+        """Returns the clip bytes, reading the file into the cache if needed (None if it is too big to cache)."""
+        data = self.get(path)
+        if data is not None:
+            return data
+        if os.path.getsize(path) > self.max_bytes:
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        with self._lock:
+            if path not in self._items:
+                self._items[path] = data
+                self.size += len(data)
+                while self.size > self.max_bytes:
+                    _, evicted = self._items.popitem(last=False)
+                    self.size -= len(evicted)
+        return data
+
+class VideoRequestHandler(BaseHTTPRequestHandler):
+    """Serves clips from server.root with Range, ETag and caching headers."""
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def log_message(self, format, *args):
+        pass  # one line per Range request would drown the Streamlit log
+
+    def _serve(self, send_body):
+        path = self.server.resolve(unquote(urlsplit(self.path).path))
+        if path is None or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            match = _RANGE_RE.match(range_header.strip())
+            if match and (match.group(1) or match.group(2)):
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                else:  # suffix range: last N bytes
+                    start = max(0, size - int(match.group(2)))
+                if start > end or start >= size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+        self.send_header("Cache-Control", CACHE_CONTROL)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not send_body:
+            return
+
+        try:
+            data = self.server.cache.load(path)
+            if data is not None:
+                self.wfile.write(memoryview(data)[start:end + 1])
+                return
+            with open(path, "rb") as f:  # larger than the whole cache: stream from disk
+                f.seek(start)
+                remaining = length
+                while remaining:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the player cancelled the request (seek or next round)
+
+class VideoServer(ThreadingHTTPServer):
+    """
+    Local HTTP server for the downloaded clips, for the guessing game.
+
+    Each connection is handled on its own thread and hot clips are served from
+    an in-memory LRU, so one host can feed many concurrent players. prefetch()
+    warms the cache in the background, so the next round's clip is already in
+    memory when it is requested. With folders, only those subfolders of root
+    (one clip folder per season) are served.
+    """
+    daemon_threads = True
+
+    def __init__(self, root=clip_folder(DEFAULT_SEASON), host="127.0.0.1", port=0, cache_bytes=512 * 1024 ** 2,
+                 public_url=None, folders=None):
+        super().__init__((host, port), VideoRequestHandler)
+        self.root = os.path.abspath(root)
+        self.folders = [os.path.join(self.root, folder) for folder in folders] if folders is not None else [self.root]
+        self.cache = ClipCache(cache_bytes)
+        self.public_url = (public_url or f"http://{host}:{self.server_address[1]}").rstrip("/")
+        self._thread = None
+
+    def start(self):
+        """Serves forever on a daemon thread and returns self."""
+        self._thread = threading.Thread(target=self.serve_forever, name="video-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def resolve(self, url_path):
+        """Maps a URL path to a file under root (or its served folders), refusing anything that escapes them."""
+        path = os.path.abspath(os.path.join(self.root, url_path.lstrip("/")))
+        return path if any(path.startswith(folder + os.sep) for folder in self.folders) else None
+
+    def serves(self, path):
+        return isinstance(path, str) and os.path.isfile(path) and self.resolve(os.path.relpath(os.path.abspath(path), self.root)) is not None
+
+    def url_for(self, path):
+        """URL for a clip file under root."""
+        relative = os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+        return f"{self.public_url}/{quote(relative)}"
+
+    def prefetch(self, path):
+        """Loads a clip into the cache on a background thread."""
+        if self.serves(path):
+            threading.Thread(target=self.cache.load, args=(os.path.abspath(path),), daemon=True).start()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the downloaded home run clips with Range support.")
+    parser.add_argument("--root", default=clip_folder(DEFAULT_SEASON))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--cache-mb", type=int, default=512)
+    args = parser.parse_args()
+
+    server = VideoServer(args.root, args.host, args.port, args.cache_mb * 1024 ** 2)
+    print(f"Serving {server.root} on port {args.port}")
+    server.serve_forever()
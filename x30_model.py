@@ -0,0 +1,268 @@
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from metrics import get_logger
+
+log = get_logger(__name__)
+
+MODEL_PATH = "x30_model.json"
+
+# Fence geometry per park (home team), sampled at the spray angles in FENCE_ANGLES:
+# left-field line, left-center, center, right-center, right-field line.
+# Distances in feet from home plate, wall heights in feet. Between samples the
+# fence is interpolated linearly.
+FENCE_ANGLES = np.array([-45.0, -25.0, 0.0, 25.0, 45.0])
+PARK_FENCES = {
+    #       distance (LF, LCF, CF, RCF, RF)    height (LF, LCF, CF, RCF, RF)
+    "AZ":  ((330, 374, 407, 374, 335),         (7.5, 7.5, 25, 7.5, 7.5)),
+    "ATL": ((335, 385, 400, 375, 325),         (6, 6, 8, 16, 16)),
+    "BAL": ((333, 376, 400, 373, 318),         (7, 13, 7, 7, 25)),
+    "BOS": ((310, 379, 390, 380, 302),         (37, 37, 17, 5, 3)),
+    "CHC": ((355, 368, 400, 368, 353),         (15, 11.5, 11.5, 11.5, 15)),
+    "CWS": ((330, 375, 400, 375, 335),         (8, 8, 8, 8, 8)),
+    "CIN": ((328, 379, 404, 370, 325),         (12, 12, 8, 8, 8)),
+    "CLE": ((325, 370, 400, 375, 325),         (19, 19, 9, 9, 9)),
+    "COL": ((347, 390, 415, 375, 350),         (8, 8, 8, 14, 14)),
+    "DET": ((345, 370, 412, 365, 330),         (7, 7, 7, 7, 8)),
+    "HOU": ((315, 362, 409, 373, 326),         (19, 19, 10, 7, 7)),
+    "KC":  ((330, 387, 410, 387, 330),         (8.5, 8.5, 8.5, 8.5, 8.5)),
+    "LAA": ((347, 390, 396, 370, 350),         (5, 5, 8, 18, 18)),
+    "LAD": ((330, 375, 395, 375, 330),         (4, 8, 8, 8, 4)),
+    "MIA": ((344, 384, 400, 387, 335),         (7, 10, 11, 10, 8)),
+    "MIL": ((344, 371, 400, 374, 345),         (8, 8, 8, 8, 8)),
+    "MIN": ((339, 377, 404, 367, 328),         (8, 8, 8, 23, 23)),
+    "NYM": ((335, 370, 408, 375, 330),         (8, 8, 8, 8, 8)),
+    "NYY": ((318, 399, 408, 385, 314),         (8, 8, 8, 8, 8)),
+    "ATH": ((330, 388, 403, 388, 325),         (8, 8, 8, 8, 8)),
+    "PHI": ((329, 374, 401, 369, 330),         (11, 11, 6, 13, 13)),
+    "PIT": ((325, 389, 399, 375, 320),         (6, 6, 10, 21, 21)),
+    "SD":  ((334, 390, 396, 391, 322),         (8, 8, 8, 8, 8)),
+    "SF":  ((339, 364, 391, 415, 309),         (8, 8, 8, 20, 25)),
+    "SEA": ((331, 378, 401, 381, 326),         (8, 8, 8, 8, 8)),
+    "STL": ((336, 375, 400, 375, 335),         (8, 8, 8, 8, 8)),
+    "TB":  ((318, 399, 408, 385, 314),         (8, 8, 8, 8, 8)),
+    "TEX": ((329, 372, 407, 374, 326),         (8, 8, 8, 8, 8)),
+    "TOR": ((328, 368, 400, 359, 328),         (8, 14, 8, 12, 8)),
+    "WSH": ((337, 377, 402, 370, 335),         (8, 8, 12, 14, 14)),
+}
+PARKS = sorted(PARK_FENCES)
+
+# 1-degree spray grid the fences are tabulated on: (91, 30) arrays
+SPRAY_GRID = np.arange(-45, 46, dtype=np.float64)
+FENCE_DISTANCE = np.stack([np.interp(SPRAY_GRID, FENCE_ANGLES, PARK_FENCES[park][0]) for park in PARKS], axis=1)
+FENCE_HEIGHT = np.stack([np.interp(SPRAY_GRID, FENCE_ANGLES, PARK_FENCES[park][1]) for park in PARKS], axis=1)
+
+# Trajectory parameters, replaced by x30_model.json once calibrate() has been run
+DEFAULT_PARAMS = {
+    "contact_height": 3.0,     # ft above the ground at contact
+    "descent": 2.0,            # exponent of the descent term; larger means a steeper fall into the landing point
+    "descent_per_10mph": 0.0,  # change of the exponent per 10 mph of exit velocity above 100
+    "distance_bias": -4.0,     # ft added to the projected distance
+    "unknown_spray_quantile": 0.9,  # without a direction, the estimate is this quantile over all directions
+}
+# Perturbations that decide whether an estimate is certain enough to skip scraping
+DISTANCE_SIGMA = 4.0  # ft
+SPRAY_SIGMA = 3.0     # degrees
+TOLERANCE = 2         # widest parks-cleared band still accepted
+
+def spray_angle(coord_x, coord_y):
+    """Spray angle in degrees (negative toward left field) from Statcast hit coordinates (hc_x/hc_y, coordX/coordY)."""
+    return np.degrees(np.arctan2(np.asarray(coord_x, dtype=np.float64) - 125.42, 198.27 - np.asarray(coord_y, dtype=np.float64)))
+
+def load_params(path=MODEL_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return dict(DEFAULT_PARAMS, **json.load(f))
+    except FileNotFoundError:
+        return dict(DEFAULT_PARAMS)
+
+def _height_at_fence(distance, launch_angle, exit_velocity, params):
+    """
+    Ball height (n, 91, 30) over each park's fence at each grid spray angle.
+
+    The flight path is y(x) = (h0 + x tan(LA)) (1 - (x / D)^k): it leaves the
+    bat at h0 with the launch angle and comes down at the projected distance D,
+    falling more steeply than it rose for k > 2, as real drag-affected
+    trajectories do.
+    """
+    landing = (distance + params["distance_bias"])[:, None, None]
+    slope = np.tan(np.radians(launch_angle))[:, None, None]
+    k = (params["descent"] + params["descent_per_10mph"] * (exit_velocity - 100) / 10)[:, None, None]
+    x = np.minimum(FENCE_DISTANCE[None] / landing, 1.0)
+    return (params["contact_height"] + FENCE_DISTANCE[None] * slope) * (1 - x ** k)
+
+def parks_cleared(distance, launch_angle, exit_velocity, spray=None, params=None):
+    """
+    Estimated number of parks (0-30) each batted ball leaves, with an uncertainty band.
+
+    All inputs are equal-length arrays; spray may be None or hold NaN when the
+    direction is unknown, in which case every direction is considered.
+
+    Returns:
+        tuple: (estimate, low, high) uint8 arrays. low and high are the counts
+        under DISTANCE_SIGMA and SPRAY_SIGMA perturbations (or over all
+        directions when spray is unknown).
+    """
+    params = params or load_params()
+    distance = np.asarray(distance, dtype=np.float64)
+    launch_angle = np.asarray(launch_angle, dtype=np.float64)
+    exit_velocity = np.nan_to_num(np.asarray(exit_velocity, dtype=np.float64), nan=100.0)
+    spray = np.full(len(distance), np.nan) if spray is None else np.asarray(spray, dtype=np.float64)
+
+    def counts(distance):
+        cleared = _height_at_fence(distance, launch_angle, exit_velocity, params) > FENCE_HEIGHT[None]
+        return cleared.sum(axis=2)  # (n, 91): parks cleared at every grid direction
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        central, short, long = counts(distance), counts(distance - DISTANCE_SIGMA), counts(distance + DISTANCE_SIGMA)
+    known = ~np.isnan(spray)
+    column = np.clip(np.rint(np.nan_to_num(spray) + 45), 0, 90).astype(np.intp)
+    in_window = np.abs(np.arange(91)[None] - column[:, None]) <= SPRAY_SIGMA
+
+    # A home run is usually hit where it leaves the park, so an upper quantile beats the mean over directions
+    undirected = np.rint(np.quantile(central, params["unknown_spray_quantile"], axis=1))
+    estimate = np.where(known, central[np.arange(len(distance)), column], undirected)
+    low = np.where(known, np.where(in_window, short, 99).min(axis=1), short.min(axis=1))
+    high = np.where(known, np.where(in_window, long, -1).max(axis=1), long.max(axis=1))
+    invalid = np.isnan(distance) | np.isnan(launch_angle)
+    return (np.where(invalid, 0, estimate).astype(np.uint8), np.where(invalid, 0, low).astype(np.uint8),
+            np.where(invalid, 30, high).astype(np.uint8))
+
+def estimate_x30(df, params=None, tolerance=TOLERANCE):
+    """
+    Model estimates for a home run table.
+
+    Returns:
+        DataFrame: estimate, low, high and certain (band no wider than tolerance) per row.
+    """
+    spray = df["Spray (deg)"].to_numpy(dtype=np.float64, na_value=np.nan) if "Spray (deg)" in df.columns else None
+    estimate, low, high = parks_cleared(
+        df["Dist (ft)"].to_numpy(dtype=np.float64, na_value=np.nan),
+        df["LA (deg)"].to_numpy(dtype=np.float64, na_value=np.nan),
+        df["EV (MPH)"].to_numpy(dtype=np.float64, na_value=np.nan),
+        spray, params)
+    result = pd.DataFrame({"estimate": estimate, "low": low, "high": high}, index=df.index)
+    result["certain"] = (result["high"].astype(int) - result["low"].astype(int)) <= tolerance
+    return result
+
+def fill_spray_angles(df, feed_cache_dir="feed_cache", offline=True):
+    """
+    Fills the 'Spray (deg)' column from the hit coordinates in the game feeds.
+
+    Feeds come through the FeedCache the playId stage already filled, so by
+    default nothing is downloaded. Returns the number of rows filled.
+    """
+    from adding_playIDs import extract_hr_events
+    from feed_cache import FeedCache
+
+    if "Spray (deg)" not in df.columns:
+        df["Spray (deg)"] = pd.Series(np.nan, index=df.index, dtype="float32")
+    todo = df[df["Spray (deg)"].isna() & df["playId"].notna() & df["gamePk"].notna()]
+    if todo.empty:
+        return 0
+    feed_cache = FeedCache(feed_cache_dir, offline=offline)
+    spray_by_play = {}
+    for game_pk in todo["gamePk"].unique():
+        feed = feed_cache.fetch(int(game_pk))
+        if feed is not None:
+            spray_by_play.update({event["playId"]: event["sprayAngle"] for event in extract_hr_events(feed)})
+    feed_cache.flush()
+    spray = todo["playId"].map(spray_by_play).astype("float32")
+    df.loc[todo.index, "Spray (deg)"] = spray
+    return int(spray.notna().sum())
+
+def calibration_report(df, params=None, tolerance=TOLERANCE):
+    """
+    Compares model estimates with the scraped 'x/30 ballparks' values.
+
+    Only rows whose value came from Savant are used (x30_source is not 'model').
+    """
+    scraped = df["x/30 ballparks"].notna()
+    if "x30_source" in df.columns:
+        scraped &= df["x30_source"].astype("string").fillna("savant") != "model"
+    df = df[scraped]
+    if df.empty:
+        return {"rows": 0}
+    model = estimate_x30(df, params, tolerance)
+    actual = df["x/30 ballparks"].astype(int)
+    error = model["estimate"].astype(int) - actual
+    certain = model["certain"]
+    has_spray = df["Spray (deg)"].notna() if "Spray (deg)" in df.columns else pd.Series(False, index=df.index)
+
+    def summarize(mask):
+        e = error[mask]
+        if e.empty:
+            return None
+        return {"rows": int(mask.sum()), "mae": round(float(e.abs().mean()), 3), "bias": round(float(e.mean()), 3),
+                "exact": round(float((e == 0).mean()), 3), "within_1": round(float((e.abs() <= 1).mean()), 3),
+                "within_2": round(float((e.abs() <= 2).mean()), 3)}
+
+    buckets = pd.cut(actual, [-1, 5, 15, 25, 29, 30], labels=["0-5", "6-15", "16-25", "26-29", "30"])
+    return {
+        "rows": len(df),
+        "with_spray": int(has_spray.sum()),
+        "all": summarize(pd.Series(True, index=df.index)),
+        "with_spray_only": summarize(has_spray),
+        "certain": summarize(certain),
+        "certain_share": round(float(certain.mean()), 3),
+        "certain_in_band": round(float(((actual >= model["low"]) & (actual <= model["high"]))[certain].mean()), 3) if certain.any() else None,
+        "by_actual": {str(bucket): summarize(buckets == bucket) for bucket in buckets.cat.categories},
+    }
+
+def calibrate(df, path=MODEL_PATH, grid=None, sample_rows=1500):
+    """
+    Grid-searches the trajectory parameters for the lowest mean absolute error
+    against the scraped values (on up to sample_rows rows), saves them to path
+    and returns them.
+    """
+    grid = grid or {
+        "descent": (2.0, 2.6, 3.2, 4.0, 5.0),
+        "descent_per_10mph": (-0.4, 0.0, 0.4),
+        "distance_bias": (-8.0, -4.0, 0.0, 4.0, 8.0),
+        "unknown_spray_quantile": (0.75, 0.9, 1.0),
+    }
+    sample = df[df["x/30 ballparks"].notna() & df["Dist (ft)"].notna() & df["LA (deg)"].notna()]
+    if "x30_source" in sample.columns:
+        sample = sample[sample["x30_source"].astype("string").fillna("savant") != "model"]
+    if "Spray (deg)" in sample.columns and sample["Spray (deg)"].notna().sum() >= 200:
+        sample = sample[sample["Spray (deg)"].notna()]  # fit on rows with a known direction when there are enough
+    sample = sample.sample(min(len(sample), sample_rows), random_state=0)
+    actual = sample["x/30 ballparks"].to_numpy(dtype=np.float64)
+    best = (np.inf, dict(DEFAULT_PARAMS))
+    for values in itertools.product(*grid.values()):
+        params = dict(DEFAULT_PARAMS, **{name: float(value) for name, value in zip(grid, values)})
+        mae = np.abs(estimate_x30(sample, params)["estimate"].to_numpy(dtype=np.float64) - actual).mean()
+        if mae < best[0]:
+            best = (mae, params)
+    log.info("Calibrated on %d rows: MAE %.3f with %s", len(sample), best[0], best[1])
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(best[1], f, indent=1)
+    os.replace(f"{path}.tmp", path)
+    return best[1]
+
+if __name__ == "__main__":
+    import argparse
+
+    from hr_store import HOMERUNS_PATH, load_homeruns, save_homeruns
+    from metrics import configure_logging
+
+    parser = argparse.ArgumentParser(description="Estimate X/30 locally and check the model against the scraped values.")
+    parser.add_argument("--path", default=HOMERUNS_PATH)
+    parser.add_argument("--feed-cache", default="feed_cache", help="FeedCache directory the spray angles are read from.")
+    parser.add_argument("--calibrate", action="store_true", help="Fit the trajectory parameters and save them to x30_model.json.")
+    parser.add_argument("--tolerance", type=int, default=TOLERANCE, help="Widest parks-cleared band accepted as certain.")
+    parser.add_argument("--log-level", default=None)
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    df = load_homeruns(args.path)
+    filled = fill_spray_angles(df, args.feed_cache)
+    if filled:
+        save_homeruns(df, args.path, columns=["Spray (deg)"])
+        log.info("Filled %d spray angles from cached feeds", filled)
+    params = calibrate(df) if args.calibrate else load_params()
+    print(json.dumps(calibration_report(df, params, args.tolerance), indent=1))